@@ -20,7 +20,7 @@
 import logging
 import sys
 
-from dciqueue import lib
+from dciqueue import backend, lib
 
 log = logging.getLogger(__name__)
 
@@ -29,18 +29,31 @@ COMMAND = "add-crontab"
 
 def register_command(subparsers):
     parser = subparsers.add_parser(COMMAND, help="Install dci-queue crontab")
+    parser.add_argument(
+        "-s",
+        "--serve",
+        action="store_true",
+        help="Dispatch commands with a dci-queue serve daemon started at boot",
+    )
     parser.add_argument("pool", help="Name of the pool")
     parser.add_argument("file", help="crontab filename to edit")
     return COMMAND
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
+    suffix = "-podman" if args.podman else ""
+    # install is also called from add-pool which has no --serve option
+    if getattr(args, "serve", False):
+        run_line_fmt = lib.CRONTAB_SERVE_LINE_FMT
+    else:
+        run_line_fmt = lib.CRONTAB_LINE_FMT
     CRONLINES = [
-        lib.CRONTAB_LINE_FMT % ("-podman" if args.podman else "", args.pool),
-        lib.CRONTAB_CLEAN_LINE_FMT % ("-podman" if args.podman else "", args.pool),
+        run_line_fmt % (suffix, args.pool),
+        lib.CRONTAB_CLEAN_LINE_FMT % (suffix, args.pool),
     ]
 
     if args.podman:
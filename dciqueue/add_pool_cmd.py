@@ -16,9 +16,8 @@
 """ """
 
 import logging
-import os
 
-from dciqueue import install_cmd, lib
+from dciqueue import backend, install_cmd
 
 log = logging.getLogger(__name__)
 
@@ -38,20 +37,8 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    for key in lib.DIRS:
-        d = os.path.join(args.top_dir, key, args.pool)
-        log.debug("Creating %s %s" % (key, d))
-        if not os.path.exists(d):
-            os.makedirs(d)
-
-    seq = lib.Seq(args)
-    seq.lock()
-
-    if not seq.exists():
-        log.debug("Creating seq file %s" % seq.seqfile)
-        seq.set(1, 1)
-
-    seq.unlock()
+    store = backend.get(args)
+    store.add_pool(args.pool)
 
     if args.no_install:
         return 0
@@ -15,12 +15,10 @@
 
 """ """
 
-import json
+import argparse
 import logging
-import os
 
-from dciqueue import lib
-from dciqueue.run_cmd import EXT
+from dciqueue import backend, lib
 
 log = logging.getLogger(__name__)
 
@@ -29,42 +27,37 @@ COMMAND = "add-resource"
 
 def register_command(subparsers):
     parser = subparsers.add_parser(COMMAND, help="Create a new resource in a pool")
+    parser.add_argument(
+        "-l",
+        "--label",
+        help="Labels of the resource as key=value[,key=value] (can be repeated)."
+        " They replace the labels of an existing resource.",
+        type=labels,
+        action="append",
+    )
     parser.add_argument("pool", help="Name of the pool")
     parser.add_argument("name", help="Name of the resource")
     return COMMAND
 
 
-def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
-        return 1
-
-    f = os.path.join(args.top_dir, "pool", args.pool, args.name)
-    if not os.path.exists(f):
-        log.debug("Creating %s" % f)
-        open(f, "w").close()
+def labels(value):
+    try:
+        return lib.parse_labels(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
-    make_available = True
-    for cmd in [
-        f
-        for f in os.listdir(os.path.join(args.top_dir, "queue", args.pool))
-        if f.endswith(EXT)
-    ]:
-        with open(os.path.join(args.top_dir, "queue", args.pool, cmd)) as fd:
-            data = json.load(fd)
-            if data["resource"] == args.name:
-                make_available = False
-                break
 
-    if make_available:
-        link = os.path.join(args.top_dir, "available", args.pool, args.name)
-        if not os.path.islink(link):
-            log.debug("Creating symlink %s" % link)
-            os.symlink(f, link)
+def execute_command(args):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
+        return 1
 
-    reason = os.path.join(args.top_dir, "reason", args.pool, args.name)
-    if os.path.exists(reason):
-        log.debug("Removing reason file %s" % reason)
-        os.unlink(reason)
+    resource_labels = None
+    if args.label is not None:
+        resource_labels = {}
+        for label in args.label:
+            resource_labels.update(label)
+    store.add_resource(args.pool, args.name, resource_labels)
 
     return 0
 
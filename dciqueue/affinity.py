@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Soft affinity between the commands and the resources they last ran on.
+
+The last command and working directory started on each resource are
+kept in the affinity state of its pool. When booking, the free resources
+that last ran the same command are preferred, then the ones that last
+ran a command from the same working directory.
+"""
+
+import logging
+import time
+
+from dciqueue import policy
+
+log = logging.getLogger(__name__)
+
+
+class Affinity(object):
+    """Affinity states of the pools loaded once per dispatch pass."""
+
+    def __init__(self, store):
+        self.store = store
+        self.states = {}
+
+    def state(self, pool):
+        if pool not in self.states:
+            self.states[pool] = self.store.state(pool, "affinity")
+        return self.states[pool]
+
+    def prefer(self, wanted, data):
+        """Return the resources to book first for data, by pool."""
+        key = policy.duration_key(data)
+        prefer = {}
+        for pool, count in wanted:
+            ranks = []
+            for res, last in self.state(pool).items():
+                if last["key"] == key:
+                    ranks.append((0, -last["time"], res))
+                elif last["wd"] == data["wd"]:
+                    ranks.append((1, -last["time"], res))
+            if ranks:
+                prefer[pool] = [res for rank, since, res in sorted(ranks)]
+        return prefer
+
+    def record(self, booked, data):
+        """Remember that data is started on the booked (resource, pool)."""
+        entry = {
+            "key": policy.duration_key(data),
+            "wd": data["wd"],
+            "time": time.time(),
+        }
+        pools = {}
+        for res, pool in booked:
+            pools.setdefault(pool, []).append(res)
+        for pool, names in pools.items():
+
+            def update(affinity):
+                for res in names:
+                    affinity[res] = entry
+                return affinity
+
+            self.store.update_state(pool, "affinity", update)
+            if pool in self.states:
+                update(self.states[pool])
+
+
+# affinity.py ends here
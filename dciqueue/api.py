@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Python API of dci-queue.
+
+A Queue gives access to the pools of a top directory with the operations
+of the dci-queue commands, returning Python data instead of printing
+it. The commands are built on top of it. Many operations can be done
+with the same Queue without starting a dci-queue process for each one:
+
+    from dciqueue import api
+
+    queue = api.connect()
+    idx = queue.schedule("8nodes", ["dci-pipeline", "@RESOURCE"], wd="/tmp")
+    result = queue.wait("8nodes", idx)
+
+Invalid operations raise QueueError.
+"""
+
+import argparse
+import getpass
+import logging
+import os
+import signal
+import time
+
+from dciqueue import backend, lib, policy, run_cmd
+
+log = logging.getLogger(__name__)
+
+# seconds to wait for an unscheduled command to stop
+UNSCHEDULE_TIMEOUT = 300
+# seconds between the checks of a result stored by a coordinator
+REMOTE_INTERVAL = 1
+
+
+class QueueError(Exception):
+    pass
+
+
+def connect(top_dir=None, backend_name=None, coordinator=None):
+    """Return a Queue on the pools of top_dir (the default one if None).
+
+    The backend is selected as with the --backend and --coordinator
+    options of dci-queue.
+    """
+    if top_dir is None:
+        from dciqueue import main
+
+        top_dir = main.get_default_top_dir()
+    if not os.path.exists(top_dir):
+        os.makedirs(top_dir)
+    return Queue(
+        backend.get(
+            argparse.Namespace(
+                top_dir=top_dir, backend=backend_name, coordinator=coordinator
+            )
+        )
+    )
+
+
+def new_entry(
+    cmd,
+    wd=None,
+    priority=0,
+    extra_pools=(),
+    count=1,
+    remove=False,
+    user=None,
+    timeout=None,
+    preemptible=False,
+    selector=None,
+):
+    """Return the data of a command to schedule (see Queue.schedule).
+
+    selector is a dict of the labels the resources of the pool must have.
+    """
+    return {
+        "cmd": list(cmd),
+        "wd": os.getcwd() if wd is None else wd,
+        "remove": remove,
+        "priority": priority,
+        "extra_pools": list(extra_pools),
+        "count": count,
+        "user": getpass.getuser() if user is None else user,
+        "queued_at": time.time(),
+        "timeout": timeout,
+        "preemptible": preemptible,
+        "selector": dict(selector or {}),
+    }
+
+
+class Queue(object):
+    """Operations on the pools of a backend."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def check(self, pool):
+        msg = self.store.missing_pool(pool)
+        if msg:
+            raise QueueError(msg)
+
+    def pools(self):
+        return self.store.pools()
+
+    def check_entry(self, entry):
+        """Validate the data of a command to schedule.
+
+        The timeout is converted to seconds.
+        """
+        if not any("@RESOURCE" in c for c in entry["cmd"]):
+            raise QueueError("no @RESOURCE in command: %s" % " ".join(entry["cmd"]))
+        if not isinstance(entry["count"], int) or entry["count"] < 1:
+            raise QueueError("invalid number of resources: %s" % entry["count"])
+        if entry["timeout"] is not None:
+            try:
+                entry["timeout"] = lib.parse_duration(entry["timeout"])
+            except ValueError:
+                raise QueueError("invalid duration: %s" % entry["timeout"])
+        selector = entry.get("selector") or {}
+        if not isinstance(selector, dict) or not all(
+            isinstance(key, str) and isinstance(value, str)
+            for key, value in selector.items()
+        ):
+            raise QueueError("invalid selector: %s" % selector)
+
+    def schedule(self, pool, cmd, force=False, **kwargs):
+        """Queue a command on a pool.
+
+        The keyword arguments are the ones of new_entry(). Return the id
+        of the command or None if it is a duplicate of a queued command.
+        """
+        return self.schedule_many(pool, [new_entry(cmd, **kwargs)], force)[0]
+
+    def schedule_many(self, pool, entries, force=False):
+        """Queue a list of new_entry() at once.
+
+        Nothing is queued if one of the entries is invalid. Return the
+        list of the ids with None for the duplicates.
+        """
+        self.check(pool)
+        pools = set()
+        labels = None
+        for entry in entries:
+            self.check_entry(entry)
+            pools.update(entry["extra_pools"])
+            if entry.get("selector"):
+                # a command no resource can match would block the queue
+                if labels is None:
+                    labels = self.store.labels(pool)
+                matching = [
+                    res
+                    for res in labels
+                    if lib.match_labels(labels[res], entry["selector"])
+                ]
+                if len(matching) < entry["count"]:
+                    raise QueueError(
+                        "not enough resources with the labels %s in %s"
+                        % (lib.format_labels(entry["selector"]), pool)
+                    )
+        for extra in sorted(pools):
+            self.check(extra)
+        ids = self.store.schedule_many(pool, entries, force)
+        for entry, idx in zip(entries, ids):
+            if idx is None:
+                log.info("Not scheduling a duplicated command %s" % entry["cmd"])
+            else:
+                log.info(
+                    "Command %s (wd: %s) queued as %s.%d"
+                    % (entry["cmd"], entry["wd"], pool, idx)
+                )
+        return ids
+
+    def search(self, pool, cmd):
+        """Return the ids of the commands of a pool running cmd."""
+        self.check(pool)
+        return self.store.search(pool, cmd)
+
+    def searchdir(self, pool, wd):
+        """Return the id of a command scheduled from wd or None."""
+        self.check(pool)
+        return self.store.searchdir(pool, wd)
+
+    def list(self, pool):
+        """Return the resources and commands of a pool as a dict.
+
+        The commands have their estimated start and end times (see
+        policy.forecast).
+        """
+        self.check(pool)
+        times = policy.forecast(self.store, pool)
+
+        def commands(jobs):
+            return [
+                {
+                    "id": idx,
+                    "cmd": data.get("real_cmd", data["cmd"]),
+                    "wd": data["wd"],
+                    "priority": data.get("priority", 0),
+                    "user": data.get("user"),
+                    "resources": [res for res, p in data.get("booked", [])],
+                    "selector": data.get("selector") or {},
+                    "estimated_start": times.get(idx, (None, None))[0],
+                    "estimated_end": times.get(idx, (None, None))[1],
+                }
+                for idx, data in jobs
+            ]
+
+        return {
+            "pool": pool,
+            "resources": self.store.resources(pool),
+            "labels": self.store.labels(pool),
+            "available": self.store.available(pool),
+            "removed": self.store.reasons(pool),
+            "executing": commands(self.store.executing(pool)),
+            "queued": commands(self.store.queued(pool)),
+        }
+
+    def book(self, pool, count=1, extra_pools=(), selector=None):
+        """Book resources outside of any command.
+
+        The resources of pool must have the labels of selector. Return
+        the list of the booked (resource, pool) or None if they are not
+        all available.
+        """
+        self.check(pool)
+        data = {"count": count, "extra_pools": list(extra_pools), "selector": selector}
+        return self.store.book_set(
+            backend.requirements(pool, data), None, backend.selectors(pool, data)
+        )
+
+    def free(self, booked):
+        """Release the (resource, pool) returned by book()."""
+        self.store.free_resources(booked)
+
+    def result(self, pool, idx):
+        """Return the result of a finished command or None."""
+        return self.store.result(pool, idx)
+
+    def wait(self, pool, idx, timeout=None, interval=10):
+        """Wait for the result of a command.
+
+        The result directory is watched with inotify so the caller wakes up
+        as soon as the result is stored. The command is still checked every
+        interval seconds in case it disappears without a result. The results
+        stored by a coordinator can't be watched: they are checked every
+        REMOTE_INTERVAL seconds instead. A command that was preempted and
+        requeued is followed under its new id. Return the result or None if
+        the command is unknown or on timeout.
+        """
+        store = self.store
+        dirs = []
+        if store.name in backend.LOCAL_BACKENDS:
+            d = os.path.dirname(store.result_path(pool, idx))
+            if not os.path.exists(d):
+                os.makedirs(d)
+            dirs.append(d)
+        else:
+            log.debug(
+                "Polling the result of %s.%d every %ds" % (pool, idx, REMOTE_INTERVAL)
+            )
+            interval = min(interval, REMOTE_INTERVAL)
+        watcher = lib.Watcher(dirs, (str(idx),))
+        deadline = None if timeout is None else time.time() + timeout
+        try:
+            while True:
+                result = store.result(pool, idx)
+                if result is not None and result.get("requeued"):
+                    log.info(
+                        "Command %s.%d requeued as %d" % (pool, idx, result["requeued"])
+                    )
+                    idx = result["requeued"]
+                    watcher.close()
+                    watcher = lib.Watcher(dirs, (str(idx),))
+                    continue
+                if result is not None:
+                    log.info("Command %s.%d finished: %s" % (pool, idx, result))
+                    return result
+                if store.job(pool, idx)[0] is None:
+                    # the result is stored before the command is removed
+                    result = store.result(pool, idx)
+                    if result is None:
+                        log.error("Command %s.%d not found" % (pool, idx))
+                    return result
+                delay = interval
+                if deadline is not None:
+                    delay = min(delay, deadline - time.time())
+                    if delay <= 0:
+                        log.error("Timeout waiting for command %s.%d" % (pool, idx))
+                        return None
+                log.debug("Waiting for command %s.%d" % (pool, idx))
+                watcher.wait(delay)
+        finally:
+            watcher.close()
+
+    def unschedule(self, pool, idx, timeout=UNSCHEDULE_TIMEOUT):
+        """Remove a command from a pool, stopping it if it is executing.
+
+        Return the state of the command before it was removed or None if
+        it was not found.
+        """
+        self.check(pool)
+        store = self.store
+        log.info("Un-queuing command %s from %s" % (idx, pool))
+
+        state, data = store.unschedule(pool, idx)
+
+        if state == backend.EXECUTING:
+            if not run_cmd.local_lease(data.get("lease", {})):
+                # the dispatcher of the other host stops the command
+                run_cmd.terminate(store, pool, idx, data, "unscheduled")
+                deadline = time.time() + timeout
+                while store.job(pool, idx)[0] is not None:
+                    if time.time() >= deadline:
+                        raise QueueError("Unable to finish command %s" % idx)
+                    log.info("Waiting for command %s to finish" % idx)
+                    time.sleep(1)
+            elif "pid" in data:
+                log.info(
+                    "Un-queuing command %s from %s by killing %d"
+                    % (idx, pool, data["pid"])
+                )
+                os.kill(data["pid"], signal.SIGTERM)
+                # wait for the process to exit
+                deadline = time.time() + timeout
+                while lib.process_alive(data["pid"]):
+                    if time.time() >= deadline:
+                        raise QueueError("Unable to finish command %s" % idx)
+                    log.info("Waiting for process %d to finish" % data["pid"])
+                    time.sleep(1)
+                log.info(
+                    "Process %d is finished, removing command %s" % (data["pid"], idx)
+                )
+                if store.result(pool, idx) is None:
+                    # no run process was there to record it
+                    store.set_result(
+                        pool, idx, run_cmd.error_result("unscheduled", data)
+                    )
+                store.finish(pool, idx)
+            else:
+                raise QueueError("Unable to stop command %s" % idx)
+        elif state == backend.QUEUED:
+            store.set_result(pool, idx, run_cmd.error_result("unscheduled"))
+        elif state is None:
+            log.info("Command %s not found in %s" % (idx, pool))
+        return state
+
+
+# api.py ends here
@@ -0,0 +1,806 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Storage backends for the pools, resources and commands.
+
+The dir backend is the historical layout: one directory per pool under
+pool/, queue/, available/ and reason/. The sqlite backend keeps the same
+information in a single database. Logs and results are always stored
+under log/ and result/. The http backend is a client of a coordinator
+serving one of the other backends (see coordinator_cmd).
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sys
+
+from dciqueue import lib
+
+if sys.version_info[0] == 2:
+    FileNotFoundError = OSError
+
+log = logging.getLogger(__name__)
+
+# backends storing the pools on this host
+LOCAL_BACKENDS = ("dir", "sqlite")
+BACKENDS = LOCAL_BACKENDS + ("http",)
+DB_NAME = "dci-queue.db"
+
+QUEUED = "queued"
+EXECUTING = "executing"
+
+# directories used by all the backends
+FILE_DIRS = ("log", "result")
+# named states of the pools (see Backend.state)
+STATES = ("config", "durations", "health", "affinity")
+
+
+def get_default_backend(top_dir):
+    backend = os.getenv("DCI_QUEUE_BACKEND")
+    if backend:
+        return backend
+    if os.getenv("DCI_QUEUE_COORDINATOR"):
+        return "http"
+    if os.path.exists(os.path.join(top_dir, DB_NAME)):
+        return "sqlite"
+    return "dir"
+
+
+def requirements(pool, data):
+    """Return the [(pool, count)] resources needed by a command.
+
+    The pool of the command comes first, followed by the extra pools in
+    the order they were given.
+    """
+    wanted = {pool: data.get("count", 1)}
+    for extra in data.get("extra_pools", []):
+        wanted[extra] = wanted.get(extra, 0) + 1
+    return list(wanted.items())
+
+
+def selectors(pool, data):
+    """Return the labels the resources of a command must have, by pool."""
+    if data.get("selector"):
+        return {pool: data["selector"]}
+    return {}
+
+
+def get(args):
+    """Return the backend selected by the command line arguments."""
+    name = getattr(args, "backend", None)
+    if not name and getattr(args, "coordinator", None):
+        name = "http"
+    name = name or get_default_backend(args.top_dir)
+    if name == "sqlite":
+        from dciqueue import sqlite_backend
+
+        return sqlite_backend.SqliteBackend(args.top_dir)
+    if name == "http":
+        from dciqueue import http_backend
+
+        url = getattr(args, "coordinator", None) or os.getenv("DCI_QUEUE_COORDINATOR")
+        if not url:
+            raise ValueError("The http backend needs the URL of a coordinator")
+        return http_backend.HttpBackend(args.top_dir, url, os.getenv("DCI_QUEUE_TOKEN"))
+    if name != "dir":
+        raise ValueError("Unknown backend %s" % name)
+    return DirBackend(args.top_dir)
+
+
+class Backend(object):
+    """Operations shared by all the backends.
+
+    Commands are passed around as dictionaries (see schedule_cmd for the
+    keys) and identified by their pool and their integer id.
+    """
+
+    name = None
+
+    def __init__(self, top_dir):
+        self.top_dir = top_dir
+
+    def check_pool(self, pool):
+        msg = self.missing_pool(pool)
+        if msg:
+            log.error(msg)
+            print(msg, file=sys.stderr)
+            return False
+        return True
+
+    def missing_pool(self, pool):
+        """Return an error message if the pool doesn't exist."""
+        raise NotImplementedError()
+
+    def add_pool(self, pool):
+        for key in FILE_DIRS:
+            d = os.path.join(self.top_dir, key, pool)
+            if not os.path.exists(d):
+                os.makedirs(d)
+
+    def remove_pool(self, pool):
+        for key in FILE_DIRS:
+            d = os.path.join(self.top_dir, key, pool)
+            if os.path.exists(d):
+                shutil.rmtree(d)
+
+    def log_path(self, pool, idx):
+        return os.path.join(self.top_dir, "log", pool, str(idx))
+
+    def result_path(self, pool, idx):
+        return os.path.join(self.top_dir, "result", pool, str(idx))
+
+    def set_result(self, pool, idx, result):
+        """Store the result of a finished command.
+
+        The file is replaced atomically so readers never see a partial
+        record.
+        """
+        path = self.result_path(pool, idx)
+        d = os.path.dirname(path)
+        if not os.path.exists(d):
+            os.makedirs(d)
+        lib.write_json(path, result)
+        log.debug("Stored result of %s.%s: %s" % (pool, idx, result))
+
+    def result(self, pool, idx):
+        """Return the result of a finished command or None."""
+        try:
+            with open(self.result_path(pool, idx)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def watch(self, pools):
+        """Return the directories to watch and the names to filter on."""
+        return [], None
+
+    def schedule(self, pool, data, force=False):
+        """Queue a command and return its id or None if it's a duplicate."""
+        return self.schedule_many(pool, [data], force)[0]
+
+    def search(self, pool, cmd):
+        return [idx for idx, state, data in self.jobs(pool) if data["cmd"] == cmd]
+
+    def searchdir(self, pool, wd):
+        for idx, state, data in self.jobs(pool):
+            if data["wd"] == wd:
+                return idx
+        return None
+
+    def queued(self, pool):
+        """Return the queued commands ordered by priority."""
+        jobs = [(idx, data) for idx, state, data in self.jobs(pool) if state == QUEUED]
+        return sorted(jobs, key=lambda job: job[1].get("priority", 0), reverse=True)
+
+    def executing(self, pool):
+        return [
+            (idx, data) for idx, state, data in self.jobs(pool) if state == EXECUTING
+        ]
+
+    def replace_state(self, pool, name, old, new):
+        """Replace the named state of the pool by new if it is still old.
+
+        Return True if the state has been replaced.
+        """
+        replaced = []
+
+        def update(current):
+            if current != old:
+                return current
+            replaced.append(True)
+            return new
+
+        self.update_state(pool, name, update)
+        return replaced != []
+
+    def config(self, pool):
+        """Return the settings of the pool as a dict."""
+        return self.state(pool, "config")
+
+    def set_config(self, pool, config):
+        self.set_state(pool, "config", config)
+
+    def labels(self, pool):
+        """Return the labels of the resources of the pool by resource."""
+        raise NotImplementedError()
+
+    def matching(self, pool, selector):
+        """Return the resources of the pool having the labels of selector."""
+        labels = self.labels(pool)
+        return [res for res in labels if lib.match_labels(labels[res], selector)]
+
+    def book(self, pool):
+        """Book a resource from the pool and return its name or None."""
+        booked = self.book_set([(pool, 1)])
+        return booked[0][0] if booked else None
+
+    def recover(self, pool):
+        """Restore the commands of a pool after a crash of the host.
+
+        Nothing is needed by default: the backend is either transactional
+        or remote.
+        """
+
+    def recover_after_boot(self, pool):
+        """Recover the pool if the host rebooted since its last recovery.
+
+        Return True if the pool has been recovered.
+        """
+        return False
+
+    def free_resources(self, resources):
+        log.debug("Freeing resources: %s" % resources)
+        for res, pool in resources:
+            self.free(pool, res)
+
+
+class DirBackend(Backend):
+    name = "dir"
+
+    def path(self, key, pool, *names):
+        return os.path.join(self.top_dir, key, pool, *names)
+
+    def args(self, pool):
+        return argparse.Namespace(top_dir=self.top_dir, pool=pool)
+
+    # pools
+
+    def pools(self):
+        d = os.path.join(self.top_dir, "pool")
+        if not os.path.exists(d):
+            return []
+        return sorted(os.listdir(d))
+
+    def missing_pool(self, pool):
+        for key in ("pool", "queue", "available", "log"):
+            d = self.path(key, pool)
+            if not os.path.exists(d):
+                return "Directory %s doesn't exist. Use add-pool to create it." % (d,)
+        return None
+
+    def add_pool(self, pool):
+        for key in lib.DIRS:
+            d = self.path(key, pool)
+            log.debug("Creating %s %s" % (key, d))
+            if not os.path.exists(d):
+                os.makedirs(d)
+
+        seq = lib.Seq(self.args(pool))
+        seq.lock()
+
+        if not seq.exists():
+            log.debug("Creating seq file %s" % seq.seqfile)
+            seq.set(1, 1)
+
+        seq.unlock()
+
+    def remove_pool(self, pool):
+        for key in lib.DIRS:
+            d = self.path(key, pool)
+            log.debug(" Removing %s" % d)
+            if os.path.exists(d):
+                shutil.rmtree(d)
+
+    def watch(self, pools):
+        dirs = [self.path("queue", pool) for pool in pools]
+        # commands can also use resources from extra pools
+        dirs += [self.path("available", pool) for pool in self.pools()]
+        return dirs, None
+
+    # settings and state
+
+    def state(self, pool, name):
+        """Return the named state (a dict) of the pool."""
+        try:
+            with open(self.path("queue", pool, "." + name)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def set_state(self, pool, name, value):
+        lib.write_json(self.path("queue", pool, "." + name), value)
+
+    def update_state(self, pool, name, func):
+        """Atomically replace the named state of the pool by func(state)."""
+        seq = lib.Seq(self.args(pool))
+        seq.lock()
+        try:
+            self.set_state(pool, name, func(self.state(pool, name)))
+        finally:
+            seq.unlock()
+
+    # resources
+
+    def resources(self, pool):
+        # skip the temporary files of the labels being written
+        return [f for f in os.listdir(self.path("pool", pool)) if f[0] != "."]
+
+    def labels(self, pool):
+        return {
+            name: lib.read_labels(self.path("pool", pool, name))
+            for name in self.resources(pool)
+        }
+
+    def has_resource(self, pool, name):
+        return os.path.exists(self.path("pool", pool, name))
+
+    def available(self, pool):
+        available_dir = self.path("available", pool)
+        return [
+            f
+            for f in os.listdir(available_dir)
+            if os.path.islink(os.path.join(available_dir, f))
+        ]
+
+    def has_available(self, pool):
+        """Check if there's at least one available resource in the pool."""
+        if not os.path.exists(self.path("available", pool)):
+            return False
+        return lib.Availability(self.top_dir, pool).count() > 0
+
+    @contextlib.contextmanager
+    def availability(self, pool):
+        cache = lib.Availability(self.top_dir, pool)
+        cache.lock()
+        try:
+            yield cache
+        finally:
+            cache.unlock()
+
+    def add_resource(self, pool, name, labels=None):
+        f = self.path("pool", pool, name)
+        if labels:
+            log.debug("Setting labels of %s to %s" % (f, labels))
+            lib.write_json(f, labels)
+        elif labels is not None or not os.path.exists(f):
+            log.debug("Creating %s" % f)
+            open(f, "w").close()
+
+        make_available = True
+        for idx, data in self.executing(pool):
+            if data.get("resource") == name or [name, pool] in data.get("booked", []):
+                make_available = False
+                break
+
+        if make_available:
+            with self.availability(pool) as cache:
+                cache.add(name, f)
+
+        reason = self.path("reason", pool, name)
+        if os.path.exists(reason):
+            log.debug("Removing reason file %s" % reason)
+            os.unlink(reason)
+
+    def remove_resource(self, pool, name, reason=None):
+        """Remove a resource from a pool.
+
+        If reason is a dict, it is recorded as the reason of the removal.
+        Otherwise any recorded reason is removed.
+        """
+        with self.availability(pool) as cache:
+            cache.remove(name)
+        path = self.path("pool", pool, name)
+        if os.path.exists(path):
+            log.debug("Removing %s (%s)" % (path, reason))
+            os.unlink(path)
+
+        d = self.path("reason", pool)
+        if not os.path.exists(d):
+            os.makedirs(d)
+
+        path = self.path("reason", pool, name)
+        if reason is None:
+            if os.path.exists(path):
+                os.unlink(path)
+        else:
+            lib.write_json(path, reason)
+
+    def reasons(self, pool):
+        reasondir = self.path("reason", pool)
+        reasons = []
+        if os.path.exists(reasondir):
+            for fname in os.listdir(reasondir):
+                if fname[0] == ".":
+                    continue
+                reasonfile = os.path.join(reasondir, fname)
+                try:
+                    with open(reasonfile) as f:
+                        reasons.append(json.load(f))
+                except FileNotFoundError:
+                    continue
+        return reasons
+
+    def book_set(self, wanted, prefer=None, selectors=None):
+        """Book count resources from each (pool, count) of wanted.
+
+        Return the list of the booked (resource, pool) or None. Either
+        all the resources are booked or none of them. The pools are
+        locked in name order so concurrent runners can't deadlock or end
+        up each holding a part of what the other needs. prefer maps pools
+        to the resources to book first when they are free and selectors
+        maps pools to the labels the booked resources must have.
+        """
+        prefer = prefer or {}
+        selectors = selectors or {}
+        caches = {}
+        try:
+            for pool in sorted(set(pool for pool, count in wanted)):
+                if not os.path.exists(self.path("available", pool)):
+                    return None
+                caches[pool] = lib.Availability(self.top_dir, pool)
+                caches[pool].lock()
+                caches[pool].sync()
+            for pool, count in wanted:
+                if len(caches[pool].match(selectors.get(pool))) < count:
+                    return None
+            booked = []
+            for pool, count in wanted:
+                for _ in range(count):
+                    res = caches[pool].book(prefer.get(pool, ()), selectors.get(pool))
+                    if res is None:
+                        # symlinks removed behind the cache back
+                        for res, pool in booked:
+                            caches[pool].add(res, self.path("pool", pool, res))
+                        return None
+                    booked.append((res, pool))
+            return booked
+        finally:
+            for pool in sorted(caches, reverse=True):
+                caches[pool].unlock()
+
+    def free(self, pool, res):
+        path = self.path("pool", pool, res)
+        # do not symlink if the resource has been removed during run
+        if os.path.exists(path):
+            with self.availability(pool) as cache:
+                cache.add(res, path)
+
+    # commands
+
+    def recover(self, pool):
+        """Replay the journal of the pool (see lib.Journal).
+
+        The seq file is fixed to cover the recovered commands and the
+        indexes are rebuilt from the command files.
+        """
+        args = self.args(pool)
+        seq = lib.Seq(args)
+        seq.lock()
+        journal = lib.Journal(args)
+        journal.lock()
+        try:
+            ids = journal.replay()
+            queued = []
+            for name in os.listdir(self.path("queue", pool)):
+                if name.isdigit():
+                    queued.append(int(name))
+                elif name.endswith(lib.EXT) and name[: -len(lib.EXT)].isdigit():
+                    ids.add(int(name[: -len(lib.EXT)]))
+            try:
+                first, next = seq.get()
+            except (FileNotFoundError, ValueError, KeyError):
+                log.warning("Rebuilding seq file %s" % seq.seqfile)
+                first, next = 1, 1
+            next = max([next] + [idx + 1 for idx in ids.union(queued)])
+            first = min([first, next] + queued)
+            seq.set(first, next)
+            for name in (".idx", ".hash"):
+                try:
+                    os.unlink(self.path("queue", pool, name))
+                except FileNotFoundError:
+                    pass
+            journal.checkpoint()
+            boot = lib.boot_id()
+            if boot:
+                with open(self.path("queue", pool, ".boot"), "w") as f:
+                    f.write(boot)
+        finally:
+            journal.unlock()
+            seq.unlock()
+        log.info("Recovered pool %s: first=%d next=%d" % (pool, first, next))
+
+    def recover_after_boot(self, pool):
+        """Recover the pool if the host rebooted since its last recovery.
+
+        The boot id of the last recovery is kept in queue/<pool>/.boot.
+        Without /proc, the pool is only recovered by dci-queue clean.
+        """
+        boot = lib.boot_id()
+        if boot is None:
+            return False
+        try:
+            with open(self.path("queue", pool, ".boot")) as f:
+                if f.read() == boot:
+                    return False
+        except FileNotFoundError:
+            pass
+        self.recover(pool)
+        return True
+
+    def seq(self, pool):
+        return lib.get_seq(self.args(pool))
+
+    def schedule_many(self, pool, entries, force=False):
+        """Queue a list of commands under a single lock.
+
+        Return the list of the assigned ids with None for the duplicated
+        commands.
+        """
+        args = self.args(pool)
+        seq_obj = lib.Seq(args)
+        seq_obj.lock()
+        try:
+            first, next = seq_obj.get()
+
+            hashes = lib.HashIndex(args)
+            hashes.load(first, next)
+            index = lib.Index(args)
+            index.load(first, next)
+            ids = []
+            # the files are only written when the journal is committed
+            keys = set()
+            with lib.Journal(args) as journal:
+                for data in entries:
+                    key = hashes.key(data["cmd"], data["wd"])
+                    if not force and (
+                        key in keys
+                        or hashes.lookup(data["cmd"], data["wd"]) is not None
+                    ):
+                        ids.append(None)
+                        continue
+                    journal.append("queue", next, data)
+                    keys.add(key)
+                    index.add(next, data.get("priority", 0), save=False)
+                    hashes.add(next, data["cmd"], data["wd"], save=False)
+                    ids.append(next)
+                    next += 1
+            if next != seq_obj.get()[1]:
+                index.save()
+                hashes.save()
+                seq_obj.set(first, next)
+        finally:
+            seq_obj.unlock()
+        return ids
+
+    def jobs(self, pool):
+        """Return the (id, state, data) of all the commands of the pool."""
+        jobs = []
+        for name in os.listdir(self.path("queue", pool)):
+            if name[0] == ".":
+                continue
+            if name.endswith(lib.EXT):
+                state = EXECUTING
+                idx = name[: -len(lib.EXT)]
+            else:
+                state = QUEUED
+                idx = name
+            try:
+                with open(self.path("queue", pool, name)) as f:
+                    jobs.append((int(idx), state, json.load(f)))
+            except FileNotFoundError:
+                continue
+        return sorted(jobs, key=lambda job: job[0])
+
+    def executing(self, pool):
+        jobs = []
+        for name in os.listdir(self.path("queue", pool)):
+            if not name.endswith(lib.EXT) or name[0] == ".":
+                continue
+            try:
+                with open(self.path("queue", pool, name)) as f:
+                    jobs.append((int(name[: -len(lib.EXT)]), json.load(f)))
+            except FileNotFoundError:
+                continue
+        return sorted(jobs, key=lambda job: job[0])
+
+    def job(self, pool, idx):
+        """Return the state and data of a command or (None, None)."""
+        for state, name in ((QUEUED, str(idx)), (EXECUTING, str(idx) + lib.EXT)):
+            try:
+                with open(self.path("queue", pool, name)) as f:
+                    return state, json.load(f)
+            except FileNotFoundError:
+                continue
+        return None, None
+
+    def queued(self, pool):
+        args = self.args(pool)
+        seq = lib.Seq(args)
+        seq.lock()
+        first, next = seq.get()
+        index = lib.Index(args)
+        index.load(first, next)
+        seq.unlock()
+        jobs = []
+        for priority, idx in sorted(index.heap):
+            try:
+                with open(self.path("queue", pool, str(idx))) as f:
+                    jobs.append((idx, json.load(f)))
+            except FileNotFoundError:
+                continue
+        return jobs
+
+    def peek(self, pool):
+        """Return the id and data of the next command without consuming it."""
+        args = self.args(pool)
+        seq = lib.Seq(args)
+
+        seq.lock()
+        first, next = seq.get()
+
+        index = lib.Index(args)
+        index.load(first, next)
+        idx = index.top()
+
+        data = None
+        if idx is not None:
+            with open(self.path("queue", pool, str(idx))) as f:
+                data = json.load(f)
+
+        seq.unlock()
+        log.debug("peek %s %s" % (idx, data))
+        return idx, data
+
+    def take(self, pool, idx=None):
+        """Move a queued command (the next one by default) to the executing state.
+
+        Return its id and data or (None, None) if it's not queued anymore.
+        """
+        args = self.args(pool)
+        seq = lib.Seq(args)
+
+        seq.lock()
+        first, next = seq.get()
+
+        index = lib.Index(args)
+        index.load(first, next)
+        if idx is None:
+            idx = index.pop()
+        elif os.path.exists(self.path("queue", pool, str(idx))):
+            index.remove(idx)
+        else:
+            idx = None
+
+        data = None
+        if idx is not None:
+            with open(self.path("queue", pool, str(idx))) as f:
+                data = json.load(f)
+            with lib.Journal(args) as journal:
+                journal.append("take", idx, data)
+            if idx == first:
+                seq.set(idx + 1, next)
+
+        seq.unlock()
+        log.debug("take %s %s" % (idx, data))
+        return idx, data
+
+    def update(self, pool, idx, data):
+        with lib.Journal(self.args(pool)) as journal:
+            journal.append("update", idx, data)
+
+    def heartbeat(self, pool, idx, now):
+        """Renew the lease of an executing command.
+
+        Only the heartbeat is changed, under the journal lock, so the
+        concurrent updates of the command (like a stop request) are kept.
+        Return False if the command is not executing with a lease.
+        """
+        journal = lib.Journal(self.args(pool))
+        journal.lock()
+        try:
+            try:
+                with open(self.path("queue", pool, str(idx) + lib.EXT)) as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                return False
+            if "lease" not in data:
+                return False
+            data["lease"]["heartbeat"] = now
+            journal.append("update", idx, data)
+            journal.flush()
+        finally:
+            journal.unlock()
+        return True
+
+    def finish(self, pool, idx):
+        args = self.args(pool)
+        path = self.path("queue", pool, str(idx) + lib.EXT)
+        log.debug("Removing %s" % path)
+        if not os.path.exists(path):
+            return
+        seq = lib.Seq(args)
+        seq.lock()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = None
+        if data is not None:
+            with lib.Journal(args) as journal:
+                journal.append("finish", idx)
+            first, next = seq.get()
+            hashes = lib.HashIndex(args)
+            hashes.load(first, next)
+            hashes.remove(idx, data.get("cmd"), data.get("wd"))
+        seq.unlock()
+
+    def unschedule(self, pool, idx):
+        """Remove a queued command.
+
+        Return the state and data of the command. Executing commands are
+        not removed: the caller has to stop them.
+        """
+        args = self.args(pool)
+        queuefile = self.path("queue", pool, str(idx))
+        seq = lib.Seq(args)
+        seq.lock()
+        try:
+            with open(queuefile) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = None
+        if data is not None:
+            with lib.Journal(args) as journal:
+                journal.append("unschedule", idx)
+            first, next = seq.get()
+            index = lib.Index(args)
+            index.load(first, next)
+            index.remove(idx)
+            hashes = lib.HashIndex(args)
+            hashes.load(first, next)
+            hashes.remove(idx, data.get("cmd"), data.get("wd"))
+        seq.unlock()
+
+        if data is not None:
+            return QUEUED, data
+        state, data = self.job(pool, idx)
+        return state, data
+
+    def import_seq(self, pool, next):
+        """Make sure next ids are at least next (used by migrate)."""
+        seq = lib.Seq(self.args(pool))
+        seq.lock()
+        first, current = seq.get()
+        if current < next:
+            seq.set(first, next)
+        seq.unlock()
+
+    def import_job(self, pool, idx, state, data):
+        """Store a command with a given id (used by migrate)."""
+        args = self.args(pool)
+        seq = lib.Seq(args)
+        seq.lock()
+        first, next = seq.get()
+        with lib.Journal(args) as journal:
+            journal.append("queue" if state == QUEUED else "update", idx, data)
+        if next <= idx:
+            seq.set(first, idx + 1)
+        if state == QUEUED:
+            index = lib.Index(args)
+            index.load(first, max(next, idx + 1))
+            if idx not in [entry[1] for entry in index.heap]:
+                index.add(idx, data.get("priority", 0))
+        hashes = lib.HashIndex(args)
+        hashes.load(first, max(next, idx + 1))
+        if idx not in hashes.hashes.get(hashes.key(data["cmd"], data["wd"]), []):
+            hashes.add(idx, data["cmd"], data["wd"])
+        seq.unlock()
+
+
+# backend.py ends here
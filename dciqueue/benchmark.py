@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Benchmarks of dci-queue.
+
+Run with python -m dciqueue.benchmark. Each benchmark prints one JSON
+line with its name, its parameters and the median and minimum times in
+milliseconds so runs can be compared. With --compare, the lines also
+have the median of the same benchmark in a previous output and the
+change in percent.
+
+- startup: start of dci-queue commands in a new interpreter
+- commands: execute_command of schedule, list, search and searchdir and
+  a dispatch pass of run on synthetic pools of each backend, for each
+  number of queued commands and resources
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from dciqueue import backend, main as dciqueue_main
+
+# commands run by the startup benchmark on a pool with one queued command
+STARTUP_COMMANDS = (
+    ("list", "pool"),
+    ("searchdir", "pool", "/"),
+    ("schedule", "pool", "echo", "@RESOURCE"),
+    ("-h",),
+)
+QUEUED = (10, 100, 1000, 10000)
+RESOURCES = (1, 10, 200)
+POOL = "pool"
+# working directories of the synthetic commands
+WORK_DIRS = 100
+
+# medians of a previous output by benchmark (see --compare)
+baseline = {}
+
+
+def record_key(record):
+    return json.dumps([record["benchmark"], record["params"]], sort_keys=True)
+
+
+def report(name, times, **params):
+    """Print the result of a benchmark as a JSON line."""
+    record = {
+        "benchmark": name,
+        "params": params,
+        "runs": len(times),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+    }
+    previous = baseline.get(record_key(record))
+    if previous:
+        record["baseline_ms"] = previous
+        record["change_pct"] = round((record["median_ms"] / previous - 1) * 100, 1)
+    print(json.dumps(record, sort_keys=True))
+    sys.stdout.flush()
+    return record
+
+
+def load_baseline(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                baseline[record_key(record)] = record["median_ms"]
+
+
+def timed(cmd):
+    """Run cmd and return its duration."""
+    # keep the logs of the commands out of the measures
+    env = dict(os.environ, DCI_QUEUE_LOG_LEVEL="CRITICAL")
+    start = time.perf_counter()
+    subprocess.run(
+        cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, check=False
+    )
+    return time.perf_counter() - start
+
+
+def startup(args):
+    """Time the start of dci-queue commands against a bare interpreter."""
+    top_dir = tempfile.mkdtemp(prefix="dci-queue-bench-")
+    dci_queue = [sys.executable, "-m", "dciqueue.main", "-t", top_dir]
+    try:
+        timed(dci_queue + ["add-pool", "-n", POOL])
+        timed(dci_queue + ["add-resource", POOL, "res"])
+        times = [timed([sys.executable, "-c", "pass"]) for _ in range(args.runs)]
+        report("startup", times, command="python")
+        for cmd in STARTUP_COMMANDS:
+            times = [timed(dci_queue + list(cmd)) for _ in range(args.runs)]
+            report("startup", times, command=" ".join(cmd))
+    finally:
+        shutil.rmtree(top_dir)
+
+
+def entry(top_dir, num):
+    """Return a synthetic command, all of them being different."""
+    return {
+        "cmd": ["true", "@RESOURCE", str(num)],
+        "wd": os.path.join(top_dir, "wd", str(num % WORK_DIRS)),
+        "priority": num % 3,
+        "extra_pools": [],
+        "count": 1,
+        "remove": False,
+        "user": "bench",
+        "queued_at": time.time(),
+        "timeout": None,
+        "preemptible": False,
+    }
+
+
+def make_pool(top_dir, backend_name, queued, resources):
+    """Create a pool with queued commands and resources in top_dir."""
+    store = backend.get(argparse.Namespace(top_dir=top_dir, backend=backend_name))
+    store.add_pool(POOL)
+    for num in range(resources):
+        store.add_resource(POOL, "res%d" % num)
+    for num in range(WORK_DIRS):
+        os.makedirs(os.path.join(top_dir, "wd", str(num)))
+    store.schedule_many(POOL, [entry(top_dir, num) for num in range(queued)])
+    return store
+
+
+def command(top_dir, backend_name, argv):
+    """Parse a dci-queue command line and return its execute_command and args."""
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+    module = importlib.import_module("dciqueue." + dciqueue_main.COMMANDS[argv[0]])
+    module.register_command(subparsers)
+    args = parser.parse_args(argv)
+    args.top_dir = top_dir
+    args.backend = backend_name
+    args.coordinator = None
+    args.console_output = False
+    return module.execute_command, args
+
+
+def time_command(func, args):
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        func(args)
+    return time.perf_counter() - start
+
+
+def time_dispatch(store, args, num):
+    """Time a dispatch pass of run and refill the queue once the commands exit."""
+    from dciqueue import run_cmd
+
+    commands = []
+    start = time.perf_counter()
+    run_cmd.dispatch(args, commands)
+    duration = time.perf_counter() - start
+    started = len(commands)
+    while commands:
+        pid, status = os.wait()
+        run_cmd.reap(commands, pid, status)
+    store.schedule_many(POOL, [entry(store.top_dir, num + i) for i in range(started)])
+    return duration, num + started
+
+
+def bench_pool(runs, backend_name, queued, resources):
+    """Time the commands on a synthetic pool."""
+    params = {"backend": backend_name, "queued": queued, "resources": resources}
+    top_dir = tempfile.mkdtemp(prefix="dci-queue-bench-")
+    try:
+        store = make_pool(top_dir, backend_name, queued, resources)
+        middle = entry(top_dir, queued // 2)
+        for argv in (
+            ["list", POOL],
+            ["search", POOL] + middle["cmd"],
+            ["searchdir", POOL, middle["wd"]],
+        ):
+            func, args = command(top_dir, backend_name, argv)
+            report(argv[0], [time_command(func, args) for _ in range(runs)], **params)
+
+        times = []
+        num = queued
+        for _ in range(runs):
+            argv = ["schedule", POOL] + entry(top_dir, num)["cmd"]
+            times.append(time_command(*command(top_dir, backend_name, argv)))
+            num += 1
+        report("schedule", times, **params)
+
+        times = []
+        func, args = command(top_dir, backend_name, ["run", POOL])
+        for _ in range(runs):
+            duration, num = time_dispatch(store, args, num)
+            times.append(duration)
+        report("run", times, **params)
+    finally:
+        shutil.rmtree(top_dir)
+
+
+def commands(args):
+    """Time the commands on synthetic pools of each size and backend."""
+    for backend_name in args.backend:
+        for queued in args.queued:
+            for resources in args.resources:
+                bench_pool(args.runs, backend_name, queued, resources)
+
+
+BENCHMARKS = {"startup": startup, "commands": commands}
+
+
+def sizes(value):
+    return [int(size) for size in value.split(",")]
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        prog="python -m dciqueue.benchmark", description="Benchmarks of dci-queue"
+    )
+    parser.add_argument(
+        "-n", "--runs", type=int, default=10, help="Number of runs per benchmark"
+    )
+    parser.add_argument(
+        "-q",
+        "--queued",
+        type=sizes,
+        default=QUEUED,
+        help="Comma separated numbers of queued commands (default: %s)"
+        % ",".join(str(size) for size in QUEUED),
+    )
+    parser.add_argument(
+        "-r",
+        "--resources",
+        type=sizes,
+        default=RESOURCES,
+        help="Comma separated numbers of resources (default: %s)"
+        % ",".join(str(size) for size in RESOURCES),
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        type=lambda value: value.split(","),
+        default=list(backend.LOCAL_BACKENDS),
+        help="Comma separated backends (default: %s)"
+        % ",".join(backend.LOCAL_BACKENDS),
+    )
+    parser.add_argument(
+        "-c", "--compare", help="Previous output to compare the results with"
+    )
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        metavar="benchmark",
+        help="Benchmarks to run among %s (all by default)"
+        % ", ".join(sorted(BENCHMARKS)),
+    )
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark %s" % name)
+    for name in args.backend:
+        if name not in backend.LOCAL_BACKENDS:
+            parser.error("unknown backend %s" % name)
+    if args.compare:
+        load_baseline(args.compare)
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        BENCHMARKS[name](args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# benchmark.py ends here
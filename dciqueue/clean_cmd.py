@@ -15,15 +15,9 @@
 
 """ """
 
-import json
 import logging
-import os
-import sys
 
-from dciqueue import run_cmd
-
-if sys.version_info[0] == 2:
-    FileNotFoundError = OSError
+from dciqueue import backend, joblog, lib, run_cmd
 
 log = logging.getLogger(__name__)
 
@@ -37,39 +31,36 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    """Find EXT files in the queue and check if they are still in use."""
-    queue_dir = os.path.join(args.top_dir, "queue", args.pool)
-    execfiles = [f for f in os.listdir(queue_dir) if f.endswith(run_cmd.EXT)]
+    """Find executing commands and check if they are still in use."""
+    store = backend.get(args)
 
-    # Check if the pid is still running
-    for execfile in execfiles:
-        with open(os.path.join(queue_dir, execfile)) as f:
-            data = json.load(f)
-            res = data.get("resource")
-            pid = data.get("pid")
-            if pid and res:
-                try:
-                    os.kill(pid, 0)
-                except ProcessLookupError:
-                    log.info(
-                        "Stale PID %s found in pool %s under resource %s"
-                        % (pid, args.pool, res)
-                    )
-                    log.info("Deleting stale file %s.%s" % (pid, run_cmd.EXT))
-                    path = os.path.join(args.top_dir, "queue", args.pool, execfile)
-                    os.unlink(path)
-                    free_resource(res, args)
+    # restore the state of the commands after a crash of the host
+    store.recover(args.pool)
 
+    # Check if the pid is still running
+    for idx, data in store.executing(args.pool):
+        res = data.get("resource")
+        pid = data.get("pid")
+        # a recycled pid has a different start time
+        pid_start = data.get("lease", {}).get("pid_start")
+        if not run_cmd.local_lease(data.get("lease", {})):
+            log.debug("Command %s runs on %s" % (idx, data["lease"]["host"]))
+            continue
+        if pid and res:
+            if not lib.process_alive(pid, pid_start):
+                log.info(
+                    "Stale PID %s found in pool %s under resource %s"
+                    % (pid, args.pool, res)
+                )
+                log.info("Deleting stale command %s" % idx)
+                store.set_result(
+                    args.pool, idx, run_cmd.error_result("stale command", data)
+                )
+                store.finish(args.pool, idx)
+                store.free_resources(data.get("booked") or [(res, args.pool)])
+
+    joblog.prune(store, args.pool, store.config(args.pool))
     return 0
 
 
-def free_resource(res, args):
-    path = os.path.join(args.top_dir, "pool", args.pool, res)
-
-    if os.path.exists(path):
-        symlink = os.path.join(args.top_dir, "available", args.pool, res)
-        log.debug("Creating symlink %s" % symlink)
-        os.symlink(path, symlink)
-
-
 # clean_cmd.py ends here
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import json
+import logging
+import sys
+
+from dciqueue import backend, joblog, policy
+
+log = logging.getLogger(__name__)
+
+COMMAND = "config"
+
+# allowed values of the settings that are not free form
+CHOICES = {
+    "policy": tuple(sorted(policy.POLICIES)),
+    "fair_share_key": policy.FAIR_SHARE_KEYS,
+    "backfill": (True, False),
+    "affinity": (True, False),
+    "log_compress": (True, False),
+}
+# settings that must be positive numbers
+NUMBERS = (
+    "aging_interval",
+    "lease_ttl",
+    "kill_grace",
+    "health_ttl",
+    "health_failures",
+    "health_timeout",
+    "preempt_priority",
+)
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(COMMAND, help="Display or change pool settings")
+    parser.add_argument("pool", help="Name of the pool")
+    parser.add_argument(
+        "settings",
+        nargs="*",
+        help="Settings to change as name=value (name= to reset to the default)",
+    )
+    return COMMAND
+
+
+def parse_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def apply_setting(config, setting):
+    """Change config with a name=value setting.
+
+    Raise ValueError if the setting is invalid.
+    """
+    if "=" not in setting:
+        raise ValueError("invalid setting %s: expecting name=value" % setting)
+    name, value = setting.split("=", 1)
+    if value == "":
+        config.pop(name, None)
+        return
+    value = parse_value(value)
+    if name in CHOICES and value not in CHOICES[name]:
+        raise ValueError(
+            "invalid value %s for %s: expecting one of %s"
+            % (value, name, ", ".join(json.dumps(c) for c in CHOICES[name]))
+        )
+    if name in NUMBERS and (
+        isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0
+    ):
+        raise ValueError(
+            "invalid value %s for %s: expecting a positive number" % (value, name)
+        )
+    if name in joblog.SETTINGS:
+        try:
+            joblog.SETTINGS[name](value)
+        except ValueError as e:
+            raise ValueError("invalid value %s for %s: %s" % (value, name, e))
+    config[name] = value
+
+
+def execute_command(args):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
+        return 1
+
+    config = store.config(args.pool)
+
+    if args.settings:
+        for setting in args.settings:
+            try:
+                apply_setting(config, setting)
+            except ValueError as e:
+                sys.stderr.write("%s\n" % e)
+                return 1
+        log.info("Setting %s config to %s" % (args.pool, config))
+        store.set_config(args.pool, config)
+    else:
+        for name in sorted(config):
+            value = config[name]
+            print(
+                "%s=%s" % (name, value if isinstance(value, str) else json.dumps(value))
+            )
+    return 0
+
+
+# config_cmd.py ends here
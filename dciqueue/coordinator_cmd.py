@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import hmac
+import http.server
+import ipaddress
+import json
+import logging
+import os
+import sys
+
+from dciqueue import backend, http_backend
+
+log = logging.getLogger(__name__)
+
+COMMAND = "coordinator"
+
+DEFAULT_ADDRESS = "127.0.0.1"
+DEFAULT_PORT = 8427
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND, help="Serve the pools to the dci-queue commands of other hosts"
+    )
+    parser.add_argument(
+        "-a",
+        "--address",
+        help="Address to listen on",
+        default=DEFAULT_ADDRESS,
+    )
+    parser.add_argument(
+        "-P",
+        "--port",
+        help="Port to listen on",
+        type=int,
+        default=DEFAULT_PORT,
+    )
+    return COMMAND
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Run the backend operations posted by the http backend clients."""
+
+    def reply(self, code, value):
+        body = json.dumps(value).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        token = self.server.token
+        if token and not hmac.compare_digest(
+            self.headers.get("Authorization", ""), "Bearer " + token
+        ):
+            return self.reply(401, {"error": "invalid token"})
+        method = self.path.strip("/")
+        if method not in http_backend.METHODS:
+            return self.reply(404, {"error": "unknown operation %s" % method})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            args = json.loads(self.rfile.read(length))["args"]
+        except (ValueError, KeyError, TypeError):
+            return self.reply(400, {"error": "invalid request"})
+        try:
+            result = getattr(self.server.store, method)(*args)
+        except Exception as e:
+            log.exception("%s%s failed" % (method, args))
+            return self.reply(500, {"error": str(e)})
+        self.reply(200, {"result": result})
+
+    def log_message(self, format, *args):
+        log.debug("%s - %s" % (self.address_string(), format % args))
+
+
+def make_server(store, address=DEFAULT_ADDRESS, port=DEFAULT_PORT, token=None):
+    """Return an HTTP server running the operations on store.
+
+    Requests are handled one at a time so the locks of the backend (that
+    are per process) are never taken twice.
+    """
+    server = http.server.HTTPServer((address, port), Handler)
+    server.store = store
+    server.token = token
+    return server
+
+
+def is_loopback(address):
+    """Return True if address only accepts connections from the local host."""
+    if address == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def execute_command(args):
+    store = backend.get(args)
+    if store.name not in backend.LOCAL_BACKENDS:
+        sys.stderr.write("The coordinator needs a dir or sqlite backend\n")
+        return 1
+
+    token = os.getenv("DCI_QUEUE_TOKEN")
+    if not token and not is_loopback(args.address):
+        sys.stderr.write(
+            "Refusing to listen on %s without a DCI_QUEUE_TOKEN\n" % args.address
+        )
+        return 1
+
+    server = make_server(store, args.address, args.port, token)
+    log.info(
+        "Serving %s (%s backend) on %s:%d"
+        % (args.top_dir, store.name, args.address, args.port)
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+# coordinator_cmd.py ends here
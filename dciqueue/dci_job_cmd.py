@@ -20,7 +20,7 @@ import os
 import re
 import sys
 
-from dciqueue import lib
+from dciqueue import backend, joblog
 
 log = logging.getLogger(__name__)
 
@@ -38,10 +38,11 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
-    logfile = os.path.join(args.top_dir, "log", args.pool, args.id)
+    logfile = joblog.log_file(store.log_path(args.pool, args.id))
     if not os.path.exists(logfile):
         sys.stderr.write(
             ("No log file found in (pool/id): %s/%s\n" % (args.pool, args.id))
@@ -56,18 +57,16 @@ def execute_command(args):
         r'^changed: \[[\w-]+\] => (\{"changed": true, "job":.+\})$'
     )
 
-    with open(logfile, "r") as f:
-        lines = f.readlines()
-
     jobs = {}
-    for line in lines:
-        m = dci_pipeline_job_id_regex.search(line)
-        if m:
-            jobs[m.group(2)] = m.group(1)
-        m = dci_check_change_job_id_regex.search(line)
-        if m:
-            j = json.loads(m.group(1))
-            jobs[j["job"].get("id")] = j["job"].get("name")
+    with joblog.Reader(logfile) as reader:
+        for line in reader.lines():
+            m = dci_pipeline_job_id_regex.search(line)
+            if m:
+                jobs[m.group(2)] = m.group(1)
+            m = dci_check_change_job_id_regex.search(line)
+            if m:
+                j = json.loads(m.group(1))
+                jobs[j["job"].get("id")] = j["job"].get("name")
 
     if jobs:
         for job in jobs:
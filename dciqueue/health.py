@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Health probes of the resources run before starting a command.
+
+The probe is the health_check setting of the pool, a command where
+@RESOURCE is replaced by the name of the resource. Its result is cached
+in the health state of the pool for health_ttl seconds. A resource is
+removed from the pool after health_failures failed probes in a row with
+the same reason record as remove-resource.
+"""
+
+import logging
+import shlex
+import subprocess
+import time
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+DEFAULT_FAILURES = 3
+DEFAULT_TIMEOUT = 60
+
+
+def probe_cmd(config, res):
+    cmd = config["health_check"]
+    if isinstance(cmd, str):
+        cmd = shlex.split(cmd)
+    return [c.replace("@RESOURCE", res) for c in cmd]
+
+
+def probe(config, res):
+    """Run the health check of a resource and return True if it passed."""
+    cmd = probe_cmd(config, res)
+    try:
+        proc = subprocess.run(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=config.get("health_timeout", DEFAULT_TIMEOUT),
+        )
+    except subprocess.TimeoutExpired:
+        log.warning("Health check %s timed out" % cmd)
+        return False
+    except OSError as e:
+        log.warning("Unable to run health check %s: %s" % (cmd, e))
+        return False
+    log.debug("Health check %s returned %d" % (cmd, proc.returncode))
+    return proc.returncode == 0
+
+
+def check(store, pool, res, config, now=None):
+    """Return True if the resource res of pool is healthy.
+
+    The cached result is used if it is less than health_ttl seconds old.
+    Otherwise the probe is run and the resource is quarantined when it
+    failed health_failures times in a row.
+    """
+    if not config.get("health_check"):
+        return True
+    now = time.time() if now is None else now
+    entry = store.state(pool, "health").get(res)
+    if entry and now - entry["time"] < config.get("health_ttl", DEFAULT_TTL):
+        log.debug("Using cached health of %s: %s" % (res, entry))
+        return entry["ok"]
+
+    ok = probe(config, res)
+    threshold = config.get("health_failures", DEFAULT_FAILURES)
+    result = {}
+
+    def update(health):
+        entry = health.get(res, {"failures": 0})
+        entry = {
+            "ok": ok,
+            "time": now,
+            "failures": 0 if ok else entry["failures"] + 1,
+        }
+        if entry["failures"] >= threshold:
+            # start from scratch if the resource is added back
+            health.pop(res, None)
+        else:
+            health[res] = entry
+        result.update(entry)
+        return health
+
+    store.update_state(pool, "health", update)
+    if result["failures"] >= threshold:
+        log.warning(
+            "Removing resource %s from pool %s after %d failed health checks"
+            % (res, pool, result["failures"])
+        )
+        store.remove_resource(
+            pool,
+            res,
+            lib.get_reason(
+                pool,
+                res,
+                "health check %s failed %d times"
+                % (" ".join(probe_cmd(config, res)), result["failures"]),
+            ),
+        )
+    elif not ok:
+        log.warning(
+            "Health check of resource %s of pool %s failed (%d/%d)"
+            % (res, pool, result["failures"], threshold)
+        )
+    return ok
+
+
+# health.py ends here
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Client backend of a dci-queue coordinator.
+
+Each operation of the backend is a POST of its JSON encoded arguments
+to <url>/<operation> and the coordinator answers with the JSON encoded
+result of the operation on its own backend. Logs are kept on the host
+running the commands.
+"""
+
+import copy
+import json
+import logging
+import os
+import urllib.error
+import urllib.request
+
+from dciqueue.backend import Backend
+
+log = logging.getLogger(__name__)
+
+# operations served by the coordinator
+METHODS = (
+    "pools",
+    "missing_pool",
+    "add_pool",
+    "remove_pool",
+    "set_result",
+    "result",
+    "state",
+    "set_state",
+    "replace_state",
+    "resources",
+    "has_resource",
+    "labels",
+    "available",
+    "has_available",
+    "add_resource",
+    "remove_resource",
+    "reasons",
+    "book_set",
+    "free",
+    "seq",
+    "schedule_many",
+    "jobs",
+    "executing",
+    "job",
+    "queued",
+    "peek",
+    "take",
+    "update",
+    "heartbeat",
+    "finish",
+    "unschedule",
+    "import_seq",
+    "import_job",
+)
+# attempts to update a state modified concurrently
+MAX_RETRIES = 10
+TIMEOUT = 60
+
+
+class CoordinatorError(Exception):
+    pass
+
+
+def rpc(name, convert=None):
+    """Return a method running the operation name on the coordinator.
+
+    convert restores the tuples returned by the local backends that JSON
+    turned into lists.
+    """
+
+    def method(self, *args):
+        result = self.call(name, *args)
+        return result if convert is None else convert(result)
+
+    method.__name__ = name
+    return method
+
+
+def pair(result):
+    return tuple(result)
+
+
+def pairs(result):
+    return None if result is None else [tuple(entry) for entry in result]
+
+
+class HttpBackend(Backend):
+    name = "http"
+
+    def __init__(self, top_dir, url, token=None):
+        super(HttpBackend, self).__init__(top_dir)
+        self.url = url.rstrip("/")
+        self.token = token
+
+    def call(self, method, *args):
+        request = urllib.request.Request(
+            "%s/%s" % (self.url, method),
+            data=json.dumps({"args": args}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        if self.token:
+            request.add_header("Authorization", "Bearer " + self.token)
+        try:
+            with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                reply = json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.load(e).get("error")
+            except ValueError:
+                error = e.reason
+            raise CoordinatorError("%s failed: %s" % (method, error))
+        except urllib.error.URLError as e:
+            raise CoordinatorError(
+                "Unable to reach the coordinator %s: %s" % (self.url, e.reason)
+            )
+        log.debug("%s%s: %s" % (method, args, reply["result"]))
+        return reply["result"]
+
+    def log_path(self, pool, idx):
+        path = super(HttpBackend, self).log_path(pool, idx)
+        d = os.path.dirname(path)
+        if not os.path.exists(d):
+            os.makedirs(d)
+        return path
+
+    def update_state(self, pool, name, func):
+        """Replace the named state by func(state) if nobody changed it meanwhile."""
+        for _ in range(MAX_RETRIES):
+            old = self.state(pool, name)
+            if self.replace_state(pool, name, old, func(copy.deepcopy(old))):
+                return
+            log.debug("State %s of %s changed, retrying" % (name, pool))
+        raise CoordinatorError("Unable to update the state %s of %s" % (name, pool))
+
+    pools = rpc("pools")
+    missing_pool = rpc("missing_pool")
+    add_pool = rpc("add_pool")
+    remove_pool = rpc("remove_pool")
+    set_result = rpc("set_result")
+    result = rpc("result")
+    state = rpc("state")
+    set_state = rpc("set_state")
+    replace_state = rpc("replace_state")
+    resources = rpc("resources")
+    has_resource = rpc("has_resource")
+    labels = rpc("labels")
+    available = rpc("available")
+    has_available = rpc("has_available")
+    add_resource = rpc("add_resource")
+    remove_resource = rpc("remove_resource")
+    reasons = rpc("reasons")
+    book_set = rpc("book_set", pairs)
+    free = rpc("free")
+    seq = rpc("seq", pair)
+    schedule_many = rpc("schedule_many")
+    jobs = rpc("jobs", pairs)
+    executing = rpc("executing", pairs)
+    job = rpc("job", pair)
+    queued = rpc("queued", pairs)
+    peek = rpc("peek", pair)
+    take = rpc("take", pair)
+    update = rpc("update")
+    heartbeat = rpc("heartbeat")
+    finish = rpc("finish")
+    unschedule = rpc("unschedule", pair)
+    import_seq = rpc("import_seq")
+    import_job = rpc("import_job")
+
+
+# http_backend.py ends here
@@ -20,7 +20,7 @@
 import logging
 import os
 
-from dciqueue import add_crontab_cmd, lib
+from dciqueue import add_crontab_cmd, backend
 
 log = logging.getLogger(__name__)
 
@@ -29,18 +29,28 @@ COMMAND = "install"
 
 def register_command(subparsers):
     parser = subparsers.add_parser(COMMAND, help="Install dci-queue")
+    parser.add_argument(
+        "-s",
+        "--serve",
+        action="store_true",
+        help="Dispatch commands with a dci-queue serve daemon started at boot",
+    )
     parser.add_argument("pool", help="Name of the pool")
     return COMMAND
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
     if args.podman:
         add_crontab_cmd.execute_command(args)
     else:
-        cmd = "env EDITOR='dci-queue add-crontab %s' crontab -e" % args.pool
+        cmd = "env EDITOR='dci-queue add-crontab %s%s' crontab -e" % (
+            "-s " if getattr(args, "serve", False) else "",
+            args.pool,
+        )
         log.info("Editing crontab with: '%s'" % cmd)
         os.system(cmd)
 
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Logs of the commands.
+
+By default the output of a command goes straight to log/<pool>/<id>.
+With the log_compress or log_max_size settings of the pool, the command
+writes to a pipe copied to the log by a python -m dciqueue.joblog
+process that compresses it with gzip (log/<pool>/<id>.gz) and keeps
+only the first and last log_max_size / 2 bytes. The compressed stream
+is flushed every FLUSH_INTERVAL seconds so the log can be read while
+the command runs. The logs older than log_max_age or beyond
+log_max_total for the pool are deleted by prune(), with the results
+of their commands.
+"""
+
+import argparse
+import codecs
+import gzip
+import logging
+import os
+import select
+import subprocess
+import sys
+import time
+import zlib
+
+from dciqueue import lib
+
+log = logging.getLogger(__name__)
+
+SUFFIX = ".gz"
+CHUNK_SIZE = 65536
+# seconds between the flushes of the compressed stream
+FLUSH_INTERVAL = 1
+# seconds to wait for the end of the copy of a log when its command exits
+CLOSE_TIMEOUT = 10
+TRUNCATED = b"\n[dci-queue: %d bytes truncated]\n"
+# settings of the pools with their parser
+SETTINGS = {
+    "log_max_size": lib.parse_size,
+    "log_max_age": lib.parse_duration,
+    "log_max_total": lib.parse_size,
+}
+
+
+def setting(config, name):
+    """Return the parsed value of a log setting or None if unset or invalid."""
+    value = config.get(name)
+    if value is None:
+        return None
+    try:
+        return SETTINGS[name](value)
+    except ValueError:
+        log.warning("Ignoring invalid %s setting: %s" % (name, value))
+        return None
+
+
+def log_file(path):
+    """Return the compressed log of path if it exists or path."""
+    if os.path.exists(path + SUFFIX):
+        return path + SUFFIX
+    return path
+
+
+def open_log(path, config):
+    """Open the log of a command for writing according to the pool config."""
+    compress = config.get("log_compress", False)
+    max_size = setting(config, "log_max_size")
+    if not compress and not max_size:
+        return open(path, "w")
+    return Pipe(path + SUFFIX if compress else path, compress, max_size)
+
+
+class Pipe(object):
+    """Write end of a pipe copied to a log file by a separate process.
+
+    The process is in its own session so the log is written until the
+    command exits even if the dispatcher is stopped.
+    """
+
+    def __init__(self, path, compress=True, max_size=None):
+        cmd = [sys.executable, "-m", "dciqueue.joblog"]
+        if compress:
+            cmd.append("--compress")
+        if max_size:
+            cmd += ["--max-size", str(max_size)]
+        rfd, wfd = os.pipe()
+        try:
+            with open(path, "wb") as out:
+                self.proc = subprocess.Popen(
+                    cmd, stdin=rfd, stdout=out, start_new_session=True
+                )
+        except Exception:
+            os.close(wfd)
+            raise
+        finally:
+            os.close(rfd)
+        self.path = path
+        self.file = os.fdopen(wfd, "w")
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def write(self, text):
+        self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Close the pipe and wait for the log to be written.
+
+        Processes started in the background by the command keep the
+        pipe open: the log is then completed when they exit.
+        """
+        self.file.close()
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            log.warning(
+                "%s is still written by process %d" % (self.path, self.proc.pid)
+            )
+
+
+class Writer(object):
+    """Write a log to a binary file, keeping its first and last max_size / 2 bytes."""
+
+    def __init__(self, fileobj, compress=True, max_size=None):
+        self.compress = compress
+        self.out = fileobj
+        if compress:
+            self.file = gzip.GzipFile(filename="", mode="wb", fileobj=fileobj)
+        else:
+            self.file = fileobj
+        self.head = self.tail_size = None
+        if max_size:
+            self.head = max_size // 2
+            self.tail_size = max_size - self.head
+        self.written = 0
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def write(self, data):
+        if self.head is not None and self.written + len(data) > self.head:
+            room = max(self.head - self.written, 0)
+            self.file.write(data[:room])
+            self.written += room
+            self.tail += data[room:]
+            # trim once in a while to not move the buffer on each write
+            if len(self.tail) > 2 * self.tail_size:
+                self.trim()
+            return
+        self.file.write(data)
+        self.written += len(data)
+
+    def trim(self):
+        excess = len(self.tail) - self.tail_size
+        if excess > 0:
+            del self.tail[:excess]
+            self.dropped += excess
+
+    def flush(self):
+        if self.compress:
+            self.file.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            self.file.flush()
+
+    def close(self):
+        if self.tail_size is not None:
+            self.trim()
+            if self.dropped:
+                self.file.write(TRUNCATED % self.dropped)
+            self.file.write(self.tail)
+        if self.compress:
+            self.file.close()
+        self.out.flush()
+
+
+def copy(fd, writer):
+    """Copy fd to writer until EOF, flushing when the input is idle."""
+    flushed = time.monotonic()
+    dirty = False
+    while True:
+        ready = select.select([fd], [], [], FLUSH_INTERVAL)[0]
+        if ready:
+            data = os.read(fd, CHUNK_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            dirty = True
+        if dirty and (not ready or time.monotonic() - flushed >= FLUSH_INTERVAL):
+            writer.flush()
+            flushed = time.monotonic()
+            dirty = False
+    writer.close()
+
+
+class Reader(object):
+    """Read a log, compressed or not, while it is being written."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.decompressor = None
+        if path.endswith(SUFFIX):
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        # set at the end of a compressed log
+        self.eof = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def read(self):
+        """Return the text written since the last call or "" if none."""
+        while not self.eof:
+            data = self.file.read(CHUNK_SIZE)
+            if not data:
+                break
+            if self.decompressor:
+                data = self.decompressor.decompress(data)
+                self.eof = self.decompressor.eof
+            text = self.decoder.decode(data)
+            if text:
+                return text
+        return ""
+
+    def lines(self):
+        """Yield the lines written so far."""
+        pending = ""
+        text = self.read()
+        while text:
+            *lines, pending = (pending + text).split("\n")
+            for line in lines:
+                yield line + "\n"
+            text = self.read()
+        if pending:
+            yield pending
+
+
+def prune(store, pool, config, now=None):
+    """Delete the logs of a pool older than log_max_age or beyond log_max_total.
+
+    The most recent logs are kept first and the logs of the executing
+    commands are never deleted. The results of the commands are deleted
+    with their log or when they are older than log_max_age. Return the
+    deleted paths.
+    """
+    max_age = setting(config, "log_max_age")
+    max_total = setting(config, "log_max_total")
+    if max_age is None and max_total is None:
+        return []
+    if now is None:
+        now = time.time()
+    executing = set(str(idx) for idx, data in store.executing(pool))
+    logs = []
+    for entry in scan(os.path.dirname(store.log_path(pool, 0))):
+        name = entry.name
+        if name.endswith(SUFFIX):
+            name = name[: -len(SUFFIX)]
+        if not name.isdigit() or name in executing:
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        logs.append((stat.st_mtime, stat.st_size, name, entry.path))
+    logs.sort(reverse=True)
+    removed = []
+    removed_ids = set()
+    total = 0
+    full = False
+    for mtime, size, name, path in logs:
+        full = full or (max_total is not None and total + size > max_total)
+        if full or (max_age is not None and now - mtime > max_age):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            removed.append(path)
+            removed_ids.add(name)
+        else:
+            total += size
+    if removed:
+        log.info("Deleted %d logs of %s" % (len(removed), pool))
+    results = []
+    for entry in scan(os.path.dirname(store.result_path(pool, 0))):
+        if not entry.name.isdigit() or entry.name in executing:
+            continue
+        try:
+            if entry.name not in removed_ids and (
+                max_age is None or now - entry.stat().st_mtime <= max_age
+            ):
+                continue
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            continue
+        results.append(entry.path)
+    if results:
+        log.info("Deleted %d results of %s" % (len(results), pool))
+    return removed + results
+
+
+def scan(d):
+    """Return the entries of directory d or [] if it doesn't exist."""
+    try:
+        return list(os.scandir(d))
+    except FileNotFoundError:
+        return []
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        prog="python -m dciqueue.joblog",
+        description="Copy the standard input to the standard output as a log",
+    )
+    parser.add_argument("-z", "--compress", action="store_true")
+    parser.add_argument(
+        "-m", "--max-size", type=int, help="Keep the first and last max_size / 2 bytes"
+    )
+    args = parser.parse_args(argv)
+    copy(sys.stdin.fileno(), Writer(sys.stdout.buffer, args.compress, args.max_size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# joblog.py ends here
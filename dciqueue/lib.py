@@ -15,18 +15,60 @@
 
 """ """
 
+import ctypes
+import datetime
 import fcntl
+import hashlib
+import heapq
 import json
 import logging
 import os
-import sys
+import select
+import struct
 import time
+import zlib
 
 log = logging.getLogger(__name__)
 
-DIRS = ("pool", "queue", "available", "log", "reason")
+DIRS = ("pool", "queue", "available", "log", "reason", "result")
+EXT = ".exec"
 CRONTAB_LINE_FMT = "  *  *  *  *  *         dci-queue%s run %s"
 CRONTAB_CLEAN_LINE_FMT = "  @reboot               dci-queue%s clean %s"
+CRONTAB_SERVE_LINE_FMT = "  @reboot               dci-queue%s serve %s"
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# size of a journal triggering a checkpoint
+JOURNAL_SIZE = 1024 * 1024
+
+
+def write_json(path, data):
+    """Atomically replace path by data encoded in JSON.
+
+    Readers see either the old or the new content, never a partial one.
+    """
+    d, name = os.path.split(path)
+    tmpfile = os.path.join(d, ".%s.%d.tmp" % (name, os.getpid()))
+    with open(tmpfile, "w") as f:
+        json.dump(data, f)
+    os.replace(tmpfile, path)
+
+
+def fsync_path(path):
+    """Flush a file or a directory to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 class Seq(object):
@@ -57,11 +99,749 @@ class Seq(object):
         return seq["first"], seq["next"]
 
     def set(self, first, next):
-        with open(self.seqfile, "w") as f:
-            json.dump({"first": first, "next": next}, f)
+        write_json(self.seqfile, {"first": first, "next": next})
         log.debug("Updated seq file %s to %d, %d" % (self.seqfile, first, next))
 
 
+class Index(object):
+    """Priority index of the queued commands of a pool.
+
+    The index is a heap of [-priority, idx] entries stored next to the
+    seq file so the next command to run can be found without reading
+    every queued file. It must be used while holding the seq lock.
+    """
+
+    def __init__(self, args):
+        self.queue_dir = os.path.join(args.top_dir, "queue", args.pool)
+        self.idxfile = os.path.join(self.queue_dir, ".idx")
+        self.heap = []
+        self.next = None
+
+    def load(self, first, next):
+        try:
+            with open(self.idxfile) as f:
+                data = json.load(f)
+            self.heap = data["heap"]
+            self.next = data["next"]
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            log.info("Rebuilding index %s" % self.idxfile)
+            self.heap = []
+            self.next = first
+        # catch up with commands queued without updating the index
+        if self.next < next:
+            self.scan(max(self.next, first), next)
+            self.next = next
+            self.save()
+
+    def scan(self, first, next):
+        for idx in range(first, next):
+            cmdfile = os.path.join(self.queue_dir, str(idx))
+            try:
+                with open(cmdfile) as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                continue
+            heapq.heappush(self.heap, [-data.get("priority", 0), idx])
+
+    def save(self):
+        tmpfile = self.idxfile + ".tmp"
+        with open(tmpfile, "w") as f:
+            json.dump({"next": self.next, "heap": self.heap}, f)
+        os.replace(tmpfile, self.idxfile)
+        log.debug("Updated index %s (%d entries)" % (self.idxfile, len(self.heap)))
+
+    def add(self, idx, priority, save=True):
+        heapq.heappush(self.heap, [-priority, idx])
+        self.next = max(self.next, idx + 1)
+        if save:
+            self.save()
+
+    def remove(self, idx):
+        heap = [entry for entry in self.heap if entry[1] != idx]
+        if len(heap) != len(self.heap):
+            heapq.heapify(heap)
+            self.heap = heap
+            self.save()
+
+    def top(self):
+        """Return the index of the highest priority command or None."""
+        modified = False
+        while self.heap:
+            idx = self.heap[0][1]
+            if os.path.exists(os.path.join(self.queue_dir, str(idx))):
+                break
+            # lazily drop entries for commands removed behind our back
+            heapq.heappop(self.heap)
+            modified = True
+        if modified:
+            self.save()
+        return self.heap[0][1] if self.heap else None
+
+    def pop(self):
+        """Remove and return the index of the highest priority command."""
+        idx = self.top()
+        if idx is not None:
+            heapq.heappop(self.heap)
+            self.save()
+        return idx
+
+
+class HashIndex(object):
+    """Index of the queued and executing commands of a pool by (cmd, wd).
+
+    It maps a hash of the command and its working directory to the ids
+    using them so duplicates can be detected without reading every
+    command file. Entries are checked against the command files when
+    they are looked up so a command removed behind our back is not
+    considered. It must be used while holding the seq lock.
+    """
+
+    def __init__(self, args):
+        self.queue_dir = os.path.join(args.top_dir, "queue", args.pool)
+        self.hashfile = os.path.join(self.queue_dir, ".hash")
+        self.hashes = {}
+        self.next = None
+
+    @staticmethod
+    def key(cmd, wd):
+        return hashlib.sha1(json.dumps([cmd, wd]).encode("utf-8")).hexdigest()
+
+    def load(self, first, next):
+        try:
+            with open(self.hashfile) as f:
+                data = json.load(f)
+            self.hashes = data["hashes"]
+            self.next = data["next"]
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            log.info("Rebuilding hash index %s" % self.hashfile)
+            self.hashes = {}
+            self.next = first
+            self.scan(None)
+            self.next = next
+            self.save()
+        # catch up with commands queued without updating the index
+        if self.next < next:
+            self.scan(range(self.next, next))
+            self.next = next
+            self.save()
+
+    def read(self, idx):
+        for name in (str(idx), str(idx) + EXT):
+            try:
+                with open(os.path.join(self.queue_dir, name)) as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def scan(self, ids):
+        if ids is None:
+            ids = set()
+            for name in os.listdir(self.queue_dir):
+                if name[0] == ".":
+                    continue
+                if name.endswith(EXT):
+                    name = name[: -len(EXT)]
+                if name.isdigit():
+                    ids.add(int(name))
+        for idx in sorted(ids):
+            data = self.read(idx)
+            if data is not None:
+                self.add(idx, data.get("cmd"), data.get("wd"), save=False)
+
+    def save(self):
+        tmpfile = self.hashfile + ".tmp"
+        with open(tmpfile, "w") as f:
+            json.dump({"next": self.next, "hashes": self.hashes}, f)
+        os.replace(tmpfile, self.hashfile)
+        log.debug(
+            "Updated hash index %s (%d entries)" % (self.hashfile, len(self.hashes))
+        )
+
+    def lookup(self, cmd, wd):
+        """Return the id of a command with the same cmd and wd or None."""
+        key = self.key(cmd, wd)
+        ids = self.hashes.get(key, [])
+        found = None
+        for idx in list(ids):
+            data = self.read(idx)
+            if data is not None and data["cmd"] == cmd and data["wd"] == wd:
+                found = idx
+                break
+            # lazily drop entries for commands removed behind our back
+            if data is None:
+                ids.remove(idx)
+        if not ids:
+            self.hashes.pop(key, None)
+        return found
+
+    def add(self, idx, cmd, wd, save=True):
+        self.hashes.setdefault(self.key(cmd, wd), []).append(idx)
+        self.next = max(self.next, idx + 1)
+        if save:
+            self.save()
+
+    def remove(self, idx, cmd, wd):
+        key = self.key(cmd, wd)
+        ids = self.hashes.get(key, [])
+        if idx in ids:
+            ids.remove(idx)
+            if not ids:
+                del self.hashes[key]
+            self.save()
+
+
+class Journal(object):
+    """Write-ahead journal of the command files of a pool.
+
+    The changes are appended to .journal as JSON records prefixed by
+    their CRC and synced to disk before the command files are modified,
+    all the records of a with block at once. The command files are not
+    synced: after a crash, recover() replays the journal to restore
+    them (see DirBackend.recover). Once the journal is bigger than
+    JOURNAL_SIZE, the files it covers are synced and it is truncated.
+
+    The journal lock is held from the append of the records to the end
+    of their replay so a checkpoint never drops records not applied yet.
+    The records are:
+
+    - ["queue", idx, data]: write the queued command idx
+    - ["take", idx, data]: move the command idx to the executing state
+    - ["update", idx, data]: write the executing command idx
+    - ["finish", idx, null]: remove the executing command idx
+    - ["unschedule", idx, null]: remove the queued command idx
+    """
+
+    def __init__(self, args):
+        self.queue_dir = os.path.join(args.top_dir, "queue", args.pool)
+        self.journal_file = os.path.join(self.queue_dir, ".journal")
+        self.records = []
+        self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def append(self, op, idx, data=None):
+        self.records.append([op, idx, data])
+
+    def lock(self):
+        created = not os.path.exists(self.journal_file)
+        self.fd = os.open(self.journal_file, os.O_RDWR | os.O_APPEND | os.O_CREAT)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        if created:
+            fsync_path(self.queue_dir)
+
+    def unlock(self):
+        fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+    def commit(self):
+        """Write the records with a single sync and apply them."""
+        if not self.records:
+            return
+        self.lock()
+        try:
+            self.flush()
+        finally:
+            self.unlock()
+
+    def flush(self):
+        """Write the records with a single sync and apply them.
+
+        It must be called with the journal locked.
+        """
+        records, self.records = self.records, []
+        lines = []
+        for record in records:
+            payload = json.dumps(record).encode("utf-8")
+            lines.append(b"%08x %s\n" % (zlib.crc32(payload), payload))
+        data = b"".join(lines)
+        while data:
+            data = data[os.write(self.fd, data) :]
+        os.fsync(self.fd)
+        for record in records:
+            self.apply(*record)
+        if os.fstat(self.fd).st_size > JOURNAL_SIZE:
+            self.checkpoint()
+        log.debug("Committed %d records to %s" % (len(records), self.journal_file))
+
+    def path(self, idx, executing=False):
+        return os.path.join(self.queue_dir, str(idx) + (EXT if executing else ""))
+
+    def apply(self, op, idx, data):
+        """Apply a record. Records can be applied more than once."""
+        if op == "take":
+            try:
+                # the command is never seen in both states
+                os.rename(self.path(idx), self.path(idx, True))
+                return
+            except FileNotFoundError:
+                pass
+        if op in ("queue", "take", "update"):
+            write_json(self.path(idx, op != "queue"), data)
+        if op in ("take", "finish", "unschedule"):
+            try:
+                os.unlink(self.path(idx, op == "finish"))
+            except FileNotFoundError:
+                pass
+
+    def read(self):
+        """Return the valid records of the journal.
+
+        Records torn by a crash are skipped.
+        """
+        records = []
+        try:
+            with open(self.journal_file, "rb") as f:
+                for line in f:
+                    try:
+                        crc, payload = line.rstrip(b"\n").split(b" ", 1)
+                        if not line.endswith(b"\n") or int(crc, 16) != zlib.crc32(
+                            payload
+                        ):
+                            raise ValueError("invalid CRC")
+                        records.append(json.loads(payload.decode("utf-8")))
+                    except ValueError:
+                        log.warning("Skipping a torn record of %s" % self.journal_file)
+        except FileNotFoundError:
+            pass
+        return records
+
+    def checkpoint(self):
+        """Sync the files covered by the journal and truncate it.
+
+        It must be called with the journal locked.
+        """
+        for idx in set(record[1] for record in self.read()):
+            for executing in (False, True):
+                try:
+                    fsync_path(self.path(idx, executing))
+                except FileNotFoundError:
+                    pass
+        try:
+            fsync_path(os.path.join(self.queue_dir, ".seq"))
+        except FileNotFoundError:
+            pass
+        fsync_path(self.queue_dir)
+        os.ftruncate(self.fd, 0)
+        os.fsync(self.fd)
+        log.info("Checkpointed %s" % self.journal_file)
+
+    def replay(self):
+        """Apply the records of the journal again and return their ids.
+
+        It must be called with the journal locked.
+        """
+        records = self.read()
+        for record in records:
+            self.apply(*record)
+        log.info("Replayed %d records of %s" % (len(records), self.journal_file))
+        return set(record[1] for record in records)
+
+
+class Availability(object):
+    """Cache of the available resources of a pool.
+
+    The symlinks in available/<pool> stay the reference: booking a
+    resource is atomically removing its symlink. The cache keeps the
+    list of these symlinks with the modification time of the directory
+    so checking for a free resource doesn't need to list it. The cache
+    is rebuilt when the directory has been modified behind its back or
+    when it is older than MAX_AGE seconds. Modifications must be done
+    while holding the lock.
+
+    The cache also keeps the labels of the free resources and an
+    inverted index from each key=value label to the free resources
+    having it, so the resources matching a selector are found without
+    reading the resource files.
+    """
+
+    MAX_AGE = 60
+
+    def __init__(self, top_dir, pool):
+        self.available_dir = os.path.join(top_dir, "available", pool)
+        self.cachefile = os.path.join(top_dir, "queue", pool, ".avail")
+        self.lock_fd = None
+        self.free = []
+        self.labels = {}
+        self.index = {}
+
+    def lock(self):
+        self.lock_fd = open(self.cachefile + ".lck", "w")
+        fcntl.lockf(self.lock_fd, fcntl.LOCK_EX)
+
+    def unlock(self):
+        fcntl.lockf(self.lock_fd, fcntl.LOCK_UN)
+        self.lock_fd.close()
+        self.lock_fd = None
+
+    def mtime(self):
+        return os.stat(self.available_dir).st_mtime_ns
+
+    def load(self):
+        """Load the cache and return True if it matches the directory."""
+        try:
+            with open(self.cachefile) as f:
+                data = json.load(f)
+            self.free = data["free"]
+            self.labels = data["labels"]
+            self.index = data["index"]
+            return (
+                data["mtime"] == self.mtime()
+                and time.time() - data["checked"] < self.MAX_AGE
+            )
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return False
+
+    def rebuild(self):
+        self.free = sorted(
+            f
+            for f in os.listdir(self.available_dir)
+            if os.path.islink(os.path.join(self.available_dir, f))
+        )
+        self.labels = {}
+        self.index = {}
+        for name in self.free:
+            # the symlinks point to the resource files
+            self.add_labels(name, read_labels(os.path.join(self.available_dir, name)))
+        log.debug("Rebuilt availability cache %s: %s" % (self.cachefile, self.free))
+        self.save()
+
+    def save(self):
+        tmpfile = self.cachefile + ".tmp"
+        with open(tmpfile, "w") as f:
+            json.dump(
+                {
+                    "mtime": self.mtime(),
+                    "checked": time.time(),
+                    "free": self.free,
+                    "labels": self.labels,
+                    "index": self.index,
+                },
+                f,
+            )
+        os.replace(tmpfile, self.cachefile)
+
+    def sync(self):
+        """Make sure the cache matches the directory. Needs the lock."""
+        if not self.load():
+            self.rebuild()
+
+    def count(self):
+        """Return the number of free resources without locking if possible."""
+        if not self.load():
+            self.lock()
+            try:
+                self.sync()
+            finally:
+                self.unlock()
+        return len(self.free)
+
+    def add_labels(self, name, labels):
+        if labels:
+            self.labels[name] = labels
+        for label in sorted("%s=%s" % item for item in labels.items()):
+            self.index.setdefault(label, []).append(name)
+
+    def remove_labels(self, name):
+        for key, value in self.labels.pop(name, {}).items():
+            names = self.index.get("%s=%s" % (key, value), [])
+            if name in names:
+                names.remove(name)
+                if not names:
+                    del self.index["%s=%s" % (key, value)]
+
+    def match(self, selector=None):
+        """Return the free resources having all the labels of selector."""
+        if not selector:
+            return list(self.free)
+        sets = sorted(
+            (self.index.get("%s=%s" % item, []) for item in selector.items()), key=len
+        )
+        others = [set(names) for names in sets[1:]]
+        return [name for name in sets[0] if all(name in names for names in others)]
+
+    def book(self, prefer=(), selector=None):
+        """Remove the symlink of a free resource and return its name or None.
+
+        Only the resources matching selector are booked. The free
+        resources listed in prefer are booked first, in order.
+        """
+        self.sync()
+        res = None
+        names = self.match(selector)
+        preferred = [name for name in prefer if name in names]
+        for name in preferred + [name for name in names if name not in preferred]:
+            self.free.remove(name)
+            self.remove_labels(name)
+            try:
+                os.remove(os.path.join(self.available_dir, name))
+                log.debug("Removed symlink %s/%s" % (self.available_dir, name))
+                res = name
+                break
+            except FileNotFoundError:
+                continue
+        self.save()
+        return res
+
+    def add(self, name, target):
+        """Create the symlink of a resource if needed."""
+        self.sync()
+        link = os.path.join(self.available_dir, name)
+        if not os.path.islink(link):
+            log.debug("Creating symlink %s from pid %s" % (link, os.getpid()))
+            os.symlink(target, link)
+        if name not in self.free:
+            self.free.append(name)
+        # the labels may have changed since the resource was booked
+        self.remove_labels(name)
+        self.add_labels(name, read_labels(target))
+        self.save()
+
+    def remove(self, name):
+        """Remove the symlink of a resource if it exists."""
+        self.sync()
+        link = os.path.join(self.available_dir, name)
+        if os.path.islink(link):
+            log.debug("Removing %s" % link)
+            os.unlink(link)
+        if name in self.free:
+            self.free.remove(name)
+        self.remove_labels(name)
+        self.save()
+
+
+class Watcher(object):
+    """Wait for entries to be created or removed in a set of directories.
+
+    When names is set, only modifications of the files with these names
+    are reported. inotify is used when the C library provides it.
+    Otherwise wait() only sleeps and the caller has to rescan.
+    """
+
+    def __init__(self, dirs, names=None):
+        self.fd = None
+        self.wds = {}
+        self.names = names
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            fd = -1
+        if fd < 0:
+            log.info("inotify not available, falling back to polling")
+            return
+        self.fd = fd
+        mask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+        if names:
+            mask |= IN_MODIFY
+        for d in dirs:
+            wd = libc.inotify_add_watch(fd, d.encode("utf-8"), mask)
+            if wd < 0:
+                log.warning("Unable to watch %s" % d)
+            else:
+                self.wds[wd] = d
+
+    def wait(self, timeout, fds=()):
+        """Wait for a change or for one of the fds to be readable.
+
+        Return True if a watched directory has changed, False on timeout
+        or when one of the fds is readable.
+        """
+        rfds = list(fds)
+        if self.fd is not None:
+            rfds.append(self.fd)
+        try:
+            ready, _, _ = select.select(rfds, [], [], timeout)
+        except InterruptedError:
+            return False
+        if self.fd is None or self.fd not in ready:
+            return self.fd is None and ready == []
+        return self.read_events()
+
+    def read_events(self):
+        changed = False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(buf):
+                wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(buf, pos)
+                pos += INOTIFY_EVENT.size
+                name = buf[pos : pos + length].rstrip(b"\0").decode("utf-8")
+                pos += length
+                if self.names:
+                    if name not in self.names:
+                        continue
+                # ignore our own lock, seq and index files
+                elif name.startswith("."):
+                    continue
+                log.debug("%s changed in %s" % (name, self.wds.get(wd)))
+                changed = True
+        return changed
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def get_reason(pool, name, reason):
+    """Return the record of the removal of a resource from a pool."""
+    return {
+        "reason": reason,
+        "pool": pool,
+        "resource": name,
+        "date": str(datetime.datetime.now()),
+    }
+
+
+def boot_id():
+    """Return the identifier of the current boot of the host or None."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except (OSError, IOError):
+        return None
+
+
+def process_start_time(pid):
+    """Return the start time of a process in clock ticks since boot or None."""
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            stat = f.read()
+    except (OSError, IOError):
+        return None
+    # the command name can contain spaces and parentheses: the fields
+    # after it start with the state (3rd field) and starttime is the 22nd
+    return int(stat[stat.rindex(")") + 2 :].split()[19])
+
+
+def process_alive(pid, start_time=None):
+    """Check that pid is still the process that started at start_time.
+
+    A recycled pid has a different start time so it's not considered
+    alive. Without /proc, only the existence of the pid is checked.
+    """
+    if not pid:
+        return False
+    current = process_start_time(pid)
+    if current is not None:
+        return start_time is None or current == start_time
+    if os.path.exists("/proc/self/stat"):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value):
+    """Convert a duration like 90, 90s, 30m, 2h or 1d to seconds.
+
+    Raise ValueError if the duration is invalid.
+    """
+    value = str(value).strip()
+    factor = DURATION_UNITS.get(value[-1:].lower())
+    if factor is not None:
+        value = value[:-1]
+    seconds = float(value) * (factor or 1)
+    if seconds <= 0:
+        raise ValueError("duration must be positive: %s" % value)
+    return seconds
+
+
+SIZE_UNITS = {"k": 1024, "m": 1024**2, "g": 1024**3}
+
+
+def parse_size(value):
+    """Convert a size like 500000, 512k, 100M or 2G to bytes.
+
+    Raise ValueError if the size is invalid.
+    """
+    value = str(value).strip()
+    factor = SIZE_UNITS.get(value[-1:].lower())
+    if factor is not None:
+        value = value[:-1]
+    size = int(float(value) * (factor or 1))
+    if size <= 0:
+        raise ValueError("size must be positive: %s" % value)
+    return size
+
+
+def format_duration(seconds):
+    """Format a duration in seconds like 45s, 12m30s, 3h05m or 2d04h."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return "%ds" % seconds
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return "%dm%02ds" % (minutes, seconds)
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return "%dh%02dm" % (hours, minutes)
+    days, hours = divmod(hours, 24)
+    return "%dd%02dh" % (days, hours)
+
+
+def parse_labels(value):
+    """Convert labels like gpu=true,ocp=4.16 to a dict.
+
+    Raise ValueError if a label is invalid.
+    """
+    labels = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        key, sep, val = item.partition("=")
+        if not sep or not key.strip():
+            raise ValueError("invalid label %s: expecting key=value" % item)
+        labels[key.strip()] = val.strip()
+    return labels
+
+
+def format_labels(labels):
+    return ",".join("%s=%s" % item for item in sorted(labels.items()))
+
+
+def match_labels(labels, selector):
+    """Return True if labels have all the key=value of selector."""
+    return all(labels.get(key) == value for key, value in selector.items())
+
+
+def read_labels(path):
+    """Return the labels stored as JSON in a resource file.
+
+    Resources created without labels have an empty file.
+    """
+    try:
+        with open(path) as f:
+            content = f.read()
+    except FileNotFoundError:
+        return {}
+    if not content.strip():
+        return {}
+    try:
+        labels = json.loads(content)
+    except ValueError:
+        log.warning("Invalid labels in %s" % path)
+        return {}
+    return labels if isinstance(labels, dict) else {}
+
+
 def get_seq(args):
     seq_obj = Seq(args)
     seq_obj.lock()
@@ -70,15 +850,4 @@ def get_seq(args):
     return first, next
 
 
-def check_pool(top_dir, pool):
-    for key in ("pool", "queue", "available", "log"):
-        d = os.path.join(top_dir, key, pool)
-        if not os.path.exists(d):
-            msg = "Directory %s doesn't exist. Use add-pool to create it." % (d,)
-            log.error(msg)
-            print(msg, file=sys.stderr)
-            return False
-    return True
-
-
 # lib.py ends here
@@ -17,11 +17,10 @@
 
 import json
 import logging
-import os
 import sys
+import time
 
-from dciqueue import lib
-from dciqueue.run_cmd import EXT
+from dciqueue import api, backend, lib, policy
 
 log = logging.getLogger(__name__)
 
@@ -32,37 +31,46 @@ def register_command(subparsers):
     parser = subparsers.add_parser(
         COMMAND, help="List the commands scheduled on a pool of resources"
     )
+    parser.add_argument(
+        "-j",
+        "--json",
+        action="store_true",
+        help="Display the pool as JSON with the estimated start and end times",
+    )
     parser.add_argument("pool", help="Name of the pool", nargs="?", default=None)
     return COMMAND
 
 
 def execute_command(args):
+    store = backend.get(args)
     if args.pool is None:
-        d = os.path.join(args.top_dir, "pool")
-        if os.path.exists(d):
-            p = os.listdir(d)
-            if len(p) == 0:
-                print("No pool was found on the host.")
-            else:
-                print("The following pools were found:")
-                for pool in p:
-                    print("  " + pool)
-                print(
-                    "Run the command below for the list of commands scheduled on your target pool:"
-                )
-                print("  " + sys.argv[0] + " list <pool>")
+        p = store.pools()
+        if len(p) == 0:
+            print("No pool was found on the host.")
+        else:
+            print("The following pools were found:")
+            for pool in p:
+                print("  " + pool)
+            print(
+                "Run the command below for the list of commands scheduled on your target pool:"
+            )
+            print("  " + sys.argv[0] + " list <pool>")
         return 0
 
-    if not lib.check_pool(args.top_dir, args.pool):
+    if not store.check_pool(args.pool):
         return 1
 
-    first, next = lib.get_seq(args)
+    if args.json:
+        print(json.dumps(api.Queue(store).list(args.pool), indent=2))
+        return 0
+
+    times = policy.forecast(store, args.pool)
 
     print(
         "Resources on the %s pool: %s"
         % (
             args.pool,
-            " ".join(os.listdir(os.path.join(args.top_dir, "pool", args.pool))),
+            " ".join(store.resources(args.pool)),
         )
     )
 
@@ -70,37 +78,30 @@ def execute_command(args):
         "Available resources on the %s pool: %s"
         % (
             args.pool,
-            " ".join(os.listdir(os.path.join(args.top_dir, "available", args.pool))),
+            " ".join(store.available(args.pool)),
         )
     )
 
-    reasondir = os.path.join(args.top_dir, "reason", args.pool)
-    if os.path.exists(reasondir):
-        reasons = []
-        for fname in os.listdir(reasondir):
-            reasonfile = os.path.join(reasondir, fname)
-            if os.path.exists(reasonfile):
-                with open(reasonfile) as f:
-                    data = json.load(f)
-                    reasons.append(data)
-        if reasons != []:
-            print("Removed resources on the %s pool:" % args.pool)
-            for d in reasons:
-                print(" %s: %s [%s]" % (d["resource"], d["reason"], d["date"]))
+    labels = store.labels(args.pool)
+    if any(labels.values()):
+        print("Labels of the resources on the %s pool:" % args.pool)
+        for res in sorted(labels):
+            if labels[res]:
+                print(" %s: %s" % (res, lib.format_labels(labels[res])))
+
+    reasons = store.reasons(args.pool)
+    if reasons != []:
+        print("Removed resources on the %s pool:" % args.pool)
+        for d in reasons:
+            print(" %s: %s [%s]" % (d["resource"], d["reason"], d["date"]))
 
     print("Executing commands on the %s pool:" % args.pool)
-    for path in [
-        p
-        for p in os.listdir(os.path.join(args.top_dir, "queue", args.pool))
-        if p.endswith(EXT)
-    ]:
-        display_cmd(args, path, EXT)
+    for idx, data in store.executing(args.pool):
+        display_cmd(idx, data, times.get(idx))
 
     print("Queued commands on the %s pool:" % args.pool)
-    for fname in sorted(
-        range(first, next), key=lambda x: get_pri(args, x), reverse=True
-    ):
-        display_cmd(args, str(fname))
+    for idx, data in store.queued(args.pool):
+        display_cmd(idx, data, times.get(idx))
 
     return 0
 
@@ -113,39 +114,42 @@ def get_resources(data):
     return res
 
 
-def display_cmd(args, filename, ext=None):
-    cmdfile = os.path.join(args.top_dir, "queue", args.pool, filename)
-    if os.path.exists(cmdfile):
-        with open(cmdfile) as f:
-            data = json.load(f)
-            if "real_cmd" in data:
-                cmd = data["real_cmd"]
-            else:
-                cmd = data["cmd"]
-            print(
-                " %s%s%s: %s (wd: %s)%s"
-                % (
-                    filename[: -len(ext)] if ext else filename,
-                    (
-                        "(p%d)" % data["priority"]
-                        if "priority" in data and data["priority"] > 0
-                        else ""
-                    ),
-                    " [%s]" % ",".join(get_resources(data)),
-                    " ".join(cmd),
-                    data["wd"],
-                    " [REMOVE]" if "remove" in data and data["remove"] else "",
-                )
-            )
+def format_time(timestamp):
+    if timestamp is None:
+        return "unknown"
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
 
 
-def get_pri(args, filename):
-    cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(filename))
-    if os.path.exists(cmdfile):
-        with open(cmdfile) as f:
-            data = json.load(f)
-            return data["priority"] if "priority" in data else 0
-    return 0
+def display_cmd(idx, data, times=None):
+    if "real_cmd" in data:
+        cmd = data["real_cmd"]
+    else:
+        cmd = data["cmd"]
+    print(
+        " %s%s%s: %s (wd: %s)%s%s%s"
+        % (
+            idx,
+            (
+                "(p%d)" % data["priority"]
+                if "priority" in data and data["priority"] > 0
+                else ""
+            ),
+            " [%s]" % ",".join(get_resources(data)),
+            " ".join(cmd),
+            data["wd"],
+            " [REMOVE]" if "remove" in data and data["remove"] else "",
+            (
+                " (selector: %s)" % lib.format_labels(data["selector"])
+                if data.get("selector")
+                else ""
+            ),
+            (
+                " (start: %s, end: %s)" % tuple(format_time(t) for t in times)
+                if times
+                else ""
+            ),
+        )
+    )
 
 
-# list_pool_cmd.py ends here
+# list_cmd.py ends here
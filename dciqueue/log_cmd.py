@@ -15,12 +15,14 @@
 
 """ """
 
+import collections
 import logging
 import os
+import subprocess
 import sys
 import time
 
-from dciqueue import lib
+from dciqueue import backend, joblog
 
 log = logging.getLogger(__name__)
 
@@ -44,19 +46,24 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
-    logfile = os.path.join(args.top_dir, "log", args.pool, args.id)
+    path = store.log_path(args.pool, args.id)
+    logfile = joblog.log_file(path)
     if not os.path.exists(logfile):
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, args.id)
-        if not os.path.exists(cmdfile):
+        if not args.id.isdigit() or store.job(args.pool, int(args.id))[0] is None:
             sys.stderr.write(("No such file %s\n" % logfile))
             log.error("No such file %s" % logfile)
             return 1
         sys.stderr.write(("Waiting for command %s to start...\n" % args.id))
         while not os.path.exists(logfile):
             time.sleep(1)
+            logfile = joblog.log_file(path)
+
+    if logfile.endswith(joblog.SUFFIX):
+        return display(logfile, args)
 
     if args.follow or args.lines:
         cmd = "tail"
@@ -76,4 +83,45 @@ def execute_command(args):
     return 1
 
 
-# add_resource_cmd.py ends here
+def select_lines(lines, spec):
+    """Return the lines selected like tail -n: the last N lines or from line +N."""
+    if spec.startswith("+"):
+        return list(lines)[max(int(spec[1:]) - 1, 0) :]
+    return list(collections.deque(lines, maxlen=int(spec)))
+
+
+def display(logfile, args):
+    """Display a compressed log like tail or less."""
+    with joblog.Reader(logfile) as reader:
+        if not args.lines and not args.follow and sys.stdout.isatty():
+            pager = subprocess.Popen(["less"], stdin=subprocess.PIPE, text=True)
+            try:
+                for text in iter(reader.read, ""):
+                    pager.stdin.write(text)
+                pager.stdin.close()
+            except BrokenPipeError:
+                pass
+            return pager.wait()
+        spec = args.lines or ("10" if args.follow else None)
+        if spec:
+            try:
+                text = "".join(select_lines(reader.lines(), spec))
+            except ValueError:
+                sys.stderr.write("Invalid number of lines: %s\n" % spec)
+                return 1
+        else:
+            text = "".join(iter(reader.read, ""))
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        # stop at the end of the compressed stream when the command exits
+        while args.follow and not reader.eof:
+            text = reader.read()
+            if text:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            else:
+                time.sleep(1)
+    return 0
+
+
+# log_cmd.py ends here
@@ -20,18 +20,49 @@ import argparse
 import importlib
 import logging
 import os
-import pkgutil
 import sys
 
+from dciqueue import backend
+
 log = logging.getLogger(__name__)
 
 # Sub-command modules need to have the following constraints:
 # - be the same directory as dciqueue.main
 # - end in _cmd.py
+# - be listed in COMMANDS
 # - have the following entry points
 REGISTER_ENTRY_POINT = "register_command"  # register subparser and return command name
 EXECUTE_ENTRY_POINT = "execute_command"  # execute sub-command
 
+# only the module of the sub-command being run is imported
+COMMANDS = {
+    "add-crontab": "add_crontab_cmd",
+    "add-pool": "add_pool_cmd",
+    "add-resource": "add_resource_cmd",
+    "clean": "clean_cmd",
+    "config": "config_cmd",
+    "coordinator": "coordinator_cmd",
+    "dci-job": "dci_job_cmd",
+    "install": "install_cmd",
+    "list": "list_cmd",
+    "log": "log_cmd",
+    "migrate": "migrate_cmd",
+    "remove-crontab": "remove_crontab_cmd",
+    "remove-pool": "remove_pool_cmd",
+    "remove-resource": "remove_resource_cmd",
+    "run": "run_cmd",
+    "schedule": "schedule_cmd",
+    "search": "search_cmd",
+    "searchdir": "searchdir_cmd",
+    "serve": "serve_cmd",
+    "simulate": "simulate_cmd",
+    "uninstall": "uninstall_cmd",
+    "unschedule": "unschedule_cmd",
+    "wait": "wait_cmd",
+}
+# global options followed by a value
+VALUE_OPTIONS = ("-l", "--log-level", "-t", "--top-dir", "--backend", "--coordinator")
+
 LOG_FORMAT = "%(asctime)s - %(process)s - %(name)s - %(levelname)s - %(message)s"
 
 
@@ -48,11 +79,9 @@ def get_umask():
     except ValueError:
         pass
     if mask is None:
-        import subprocess
-
-        mask = int(
-            subprocess.check_output("umask", shell=True).decode("utf-8").strip(), 8
-        )
+        # the umask can only be read by changing it
+        mask = os.umask(0o022)
+        os.umask(mask)
     return mask
 
 
@@ -83,6 +112,23 @@ def get_default_top_dir():
     return os.path.expanduser("~/.dci-queue")
 
 
+def find_command(argv):
+    """Return the sub-command of the arguments or None if there is none.
+
+    All the sub-commands are loaded when there is none to display the
+    help or the usage message.
+    """
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in VALUE_OPTIONS:
+            skip = True
+        elif not arg.startswith("-"):
+            return arg if arg in COMMANDS else None
+    return None
+
+
 def main(cmdargs=sys.argv):
     parser = argparse.ArgumentParser(
         prog=os.path.basename(cmdargs[0]),
@@ -111,6 +157,18 @@ def main(cmdargs=sys.argv):
         help="Output logs to the console",
         default=default_console,
     )
+    parser.add_argument(
+        "--backend",
+        help="Storage backend (default: sqlite if the top directory has a"
+        " database, dir otherwise)",
+        default=os.getenv("DCI_QUEUE_BACKEND"),
+        choices=backend.BACKENDS,
+    )
+    parser.add_argument(
+        "--coordinator",
+        help="URL of the coordinator used by the http backend",
+        default=os.getenv("DCI_QUEUE_COORDINATOR"),
+    )
     parser.add_argument(
         "-p",
         "--podman",
@@ -123,19 +181,21 @@ def main(cmdargs=sys.argv):
         title="Subcommands", description="valid subcommands", dest="command"
     )
 
-    topdir = os.path.dirname(__file__)
-
+    command = find_command(cmdargs[1:])
     commands = {}
-    for _, name, _ in pkgutil.iter_modules([topdir]):
-        if name.endswith("_cmd"):
-            imported_module = importlib.import_module("dciqueue." + name)
+    for name in sorted(COMMANDS):
+        if command is None or name == command:
+            imported_module = importlib.import_module("dciqueue." + COMMANDS[name])
             if REGISTER_ENTRY_POINT not in dir(
                 imported_module
             ) and EXECUTE_ENTRY_POINT not in dir(imported_module):
-                sys.stderr.write("Invalid command file %s\n" % name)
+                sys.stderr.write("Invalid command file %s\n" % COMMANDS[name])
                 continue
             cmd = getattr(imported_module, REGISTER_ENTRY_POINT)(subparsers)
             commands[cmd] = getattr(imported_module, EXECUTE_ENTRY_POINT)
+        else:
+            # only needed to be listed by the usage messages
+            subparsers.add_parser(name)
 
     args = parser.parse_args(cmdargs[1:])
 
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import argparse
+import logging
+import os
+import sys
+
+from dciqueue import backend
+
+log = logging.getLogger(__name__)
+
+COMMAND = "migrate"
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND, help="Migrate all the pools to another storage backend"
+    )
+    parser.add_argument(
+        "--to",
+        help="Target backend",
+        default="sqlite",
+        choices=backend.LOCAL_BACKENDS,
+    )
+    return COMMAND
+
+
+def execute_command(args):
+    """Copy all the pools to the target backend and remove them from the source.
+
+    No dci-queue command must run during the migration.
+    """
+    src = backend.get(args)
+    if src.name not in backend.LOCAL_BACKENDS:
+        sys.stderr.write("Pools can only be migrated on the coordinator host\n")
+        return 1
+    if src.name == args.to:
+        sys.stderr.write("Pools are already stored in the %s backend\n" % args.to)
+        return 1
+
+    dst = backend.get(argparse.Namespace(top_dir=args.top_dir, backend=args.to))
+    if dst.pools() != []:
+        sys.stderr.write("The %s backend already has pools. Aborting.\n" % args.to)
+        return 1
+
+    for pool in src.pools():
+        log.info("Migrating pool %s to the %s backend" % (pool, args.to))
+        copy_pool(src, dst, pool)
+
+    for pool in src.pools():
+        remove_pool(src, pool)
+
+    if src.name == "sqlite":
+        # keep the database around for reference but stop auto-detecting it
+        os.rename(src.path, src.path + ".migrated")
+    return 0
+
+
+def copy_pool(src, dst, pool):
+    dst.add_pool(pool)
+    for name in backend.STATES:
+        dst.set_state(pool, name, src.state(pool, name))
+    # commands first so that booked resources are not made available
+    for idx, state, data in src.jobs(pool):
+        dst.import_job(pool, idx, state, data)
+    first, next = src.seq(pool)
+    dst.import_seq(pool, next)
+    labels = src.labels(pool)
+    for res in src.resources(pool):
+        dst.add_resource(pool, res, labels.get(res))
+    for reason in src.reasons(pool):
+        dst.remove_resource(pool, reason["resource"], reason)
+
+
+def remove_pool(src, pool):
+    # the log and result directories are shared by all the backends
+    saved = []
+    for key in backend.FILE_DIRS:
+        d = os.path.join(src.top_dir, key, pool)
+        if os.path.exists(d):
+            os.rename(d, d + ".migrating")
+            saved.append(d)
+    try:
+        src.remove_pool(pool)
+    finally:
+        for d in saved:
+            os.rename(d + ".migrating", d)
+
+
+# migrate_cmd.py ends here
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Scheduling policies deciding in which order queued commands run.
+
+A policy orders a snapshot of the queued and executing commands of a
+pool. The policy of a pool is selected with the policy setting of the
+pool (see config_cmd).
+"""
+
+import logging
+import time
+
+from dciqueue import backend, lib
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POLICY = "priority"
+DEFAULT_AGING_INTERVAL = 3600
+FAIR_SHARE_KEYS = ("user", "wd")
+# weight of the last run in the estimated duration of a command
+DURATION_WEIGHT = 0.5
+MAX_DURATIONS = 1000
+
+
+class Snapshot(object):
+    """Queued and executing commands of a pool at a given time."""
+
+    def __init__(self, queued, executing, now=None):
+        self.queued = queued
+        self.executing = executing
+        self.now = time.time() if now is None else now
+
+    @classmethod
+    def load(cls, store, pool, now=None):
+        return cls(store.queued(pool), store.executing(pool), now)
+
+
+class Policy(object):
+    """Base class of the policies.
+
+    indexed is True when the order is the one of the priority index of
+    the backends so the dispatcher doesn't need to load a snapshot.
+    """
+
+    name = None
+    indexed = False
+
+    def __init__(self, config):
+        self.config = config
+
+    def key(self, snapshot, idx, data):
+        raise NotImplementedError()
+
+    def order(self, snapshot):
+        """Return the queued (idx, data) of the snapshot in dispatch order."""
+        return sorted(
+            snapshot.queued, key=lambda job: self.key(snapshot, job[0], job[1])
+        )
+
+
+class StrictPriority(Policy):
+    """Highest priority first, oldest command first for the same priority."""
+
+    name = "priority"
+    indexed = True
+
+    def key(self, snapshot, idx, data):
+        return (-data.get("priority", 0), idx)
+
+
+class Aging(Policy):
+    """Priority increased by one every aging_interval seconds in the queue."""
+
+    name = "aging"
+
+    def __init__(self, config):
+        super(Aging, self).__init__(config)
+        self.interval = config.get("aging_interval", DEFAULT_AGING_INTERVAL)
+        if (
+            isinstance(self.interval, bool)
+            or not isinstance(self.interval, (int, float))
+            or self.interval <= 0
+        ):
+            log.warning(
+                "Invalid aging_interval %s, using %d"
+                % (self.interval, DEFAULT_AGING_INTERVAL)
+            )
+            self.interval = DEFAULT_AGING_INTERVAL
+
+    def key(self, snapshot, idx, data):
+        age = snapshot.now - data.get("queued_at", snapshot.now)
+        return (-(data.get("priority", 0) + max(age, 0) / self.interval), idx)
+
+
+class FairShare(Policy):
+    """Interleave the commands of the submitters (or working directories).
+
+    The commands of the group with the fewest executing and already
+    ordered commands go first. Priority only orders the commands of the
+    same group.
+    """
+
+    name = "fair-share"
+
+    def __init__(self, config):
+        super(FairShare, self).__init__(config)
+        self.group = config.get("fair_share_key", "user")
+
+    def order(self, snapshot):
+        usage = {}
+        for idx, data in snapshot.executing:
+            group = data.get(self.group)
+            usage[group] = usage.get(group, 0) + 1
+        shares = []
+        for idx, data in sorted(
+            snapshot.queued, key=lambda job: (-job[1].get("priority", 0), job[0])
+        ):
+            group = data.get(self.group)
+            shares.append((usage.get(group, 0), -data.get("priority", 0), idx, data))
+            usage[group] = usage.get(group, 0) + 1
+        return [(idx, data) for share, priority, idx, data in sorted(shares)]
+
+
+def usable_resources(store, wanted, selectors=None):
+    """Return a usable(res, pool) predicate for the resources matching selectors."""
+    selectors = selectors or {}
+    matching = {}
+    for pool, count in wanted:
+        if selectors.get(pool):
+            matching[pool] = set(store.matching(pool, selectors[pool]))
+
+    def usable(res, pool):
+        return pool not in matching or res in matching[pool]
+
+    return usable
+
+
+class Reservation(object):
+    """Resources kept for a blocked command while backfilling.
+
+    shadow is the time at which enough resources are expected to be
+    free for the blocked command, based on the estimated end of the
+    executing commands. Commands with an unknown duration are expected
+    to end at any time. spare is the number of resources per pool that
+    will still be free at the shadow time once the blocked command is
+    started. Another command can be started if it is expected to finish
+    before the shadow time or if it only uses spare resources.
+    """
+
+    def __init__(self, wanted, free, releases, now):
+        self.now = now
+        self.shadow = now
+        self.spare = {}
+        for pool, count in wanted:
+            ends = sorted(releases.get(pool, []))
+            missing = count - free.get(pool, 0)
+            if missing > len(ends):
+                self.shadow = float("inf")
+            elif missing > 0:
+                self.shadow = max(self.shadow, ends[missing - 1])
+        for pool, count in wanted:
+            released = len(
+                [end for end in releases.get(pool, []) if end <= self.shadow]
+            )
+            self.spare[pool] = max(free.get(pool, 0) + released - count, 0)
+
+    @classmethod
+    def load(cls, store, wanted, now=None, selectors=None):
+        """Compute the reservation of a blocked command from the executing ones.
+
+        Only the resources matching the selectors of the command are
+        counted.
+        """
+        now = time.time() if now is None else now
+        pools = set(pool for pool, count in wanted)
+        usable = usable_resources(store, wanted, selectors)
+        free = {
+            pool: len([res for res in store.available(pool) if usable(res, pool)])
+            for pool in pools
+        }
+        releases = {}
+        for job_pool in store.pools():
+            durations = store.state(job_pool, "durations")
+            for idx, data in store.executing(job_pool):
+                duration = estimate(durations, data)
+                if duration is None:
+                    end = now
+                else:
+                    end = max(data.get("start", now) + duration, now)
+                for res, pool in data.get("booked", []):
+                    if pool in pools and usable(res, pool):
+                        releases.setdefault(pool, []).append(end)
+        return cls(wanted, free, releases, now)
+
+    def fits(self, estimate):
+        return estimate is not None and self.now + estimate <= self.shadow
+
+    def allows(self, wanted, estimate):
+        if self.fits(estimate):
+            return True
+        return all(count <= self.spare.get(pool, count) for pool, count in wanted)
+
+    def consume(self, wanted, estimate):
+        if not self.fits(estimate):
+            for pool, count in wanted:
+                if pool in self.spare:
+                    self.spare[pool] -= count
+
+
+def forecast(store, pool, now=None):
+    """Predict when the commands of a pool start and finish.
+
+    Return a dict mapping the ids of the executing and queued commands
+    to their (start, end) times. The queued commands are started in the
+    order of the pool policy on the resources expected to be released
+    first, without backfilling. A command that never ran is expected to
+    last the average duration of the pool. The times are None when they
+    can't be estimated.
+    """
+    now = time.time() if now is None else now
+    config = store.config(pool)
+    durations = store.state(pool, "durations")
+    default = average(durations)
+    snapshot = Snapshot.load(store, pool)
+    snapshot.now = now
+    queued = get(config).order(snapshot)
+    pools = set([pool])
+    for idx, data in queued:
+        pools.update(p for p, count in backend.requirements(pool, data))
+    # times at which the resources of each pool are expected to be free
+    free_at = {p: [now] * len(store.available(p)) for p in pools}
+    times = {}
+    for job_pool in store.pools():
+        job_durations = durations if job_pool == pool else None
+        for idx, data in store.executing(job_pool):
+            booked = [p for res, p in data.get("booked", []) if p in pools]
+            if not booked and job_pool != pool:
+                continue
+            if job_durations is None:
+                job_durations = store.state(job_pool, "durations")
+            duration = estimate(job_durations, data)
+            if duration is None:
+                duration = average(job_durations)
+            start = data.get("start", now)
+            end = None if duration is None else max(start + duration, now)
+            if job_pool == pool:
+                times[idx] = (start, end)
+            for p in booked:
+                free_at[p].append(float("inf") if end is None else end)
+    previous = now
+    for idx, data in queued:
+        wanted = backend.requirements(pool, data)
+        start = previous
+        for p, count in wanted:
+            free_at[p].sort()
+            if len(free_at[p]) < count:
+                start = float("inf")
+            else:
+                start = max(start, free_at[p][count - 1])
+        duration = estimate(durations, data)
+        if duration is None:
+            duration = default
+        end = float("inf")
+        if start != float("inf") and duration is not None:
+            end = start + duration
+        for p, count in wanted:
+            free_at[p][:count] = [end] * min(count, len(free_at[p]))
+        # the dispatcher doesn't start a command before the previous ones
+        previous = start
+        times[idx] = tuple(None if t == float("inf") else t for t in (start, end))
+    return times
+
+
+def average(durations):
+    """Return the average duration of the commands of a pool or None."""
+    if not durations:
+        return None
+    return sum(entry[0] for entry in durations.values()) / len(durations)
+
+
+def duration_key(data):
+    return lib.HashIndex.key(data["cmd"], data["wd"])
+
+
+def estimate(durations, data):
+    """Return the estimated duration of a command or None if unknown.
+
+    The duration of a started command is the one of its previous runs on
+    the same resource when known.
+    """
+    entry = durations.get(duration_key(data))
+    if not entry:
+        return None
+    # entries recorded before the per-resource durations have 2 items
+    per_resource = entry[2] if len(entry) > 2 else {}
+    return per_resource.get(data.get("resource"), entry[0])
+
+
+def record_duration(store, pool, data, duration):
+    """Update the estimated duration of a command with a new run.
+
+    The durations are kept for the command and for each resource it ran
+    on.
+    """
+    key = duration_key(data)
+    res = data.get("resource")
+
+    def moving_average(previous):
+        if previous is None:
+            return duration
+        return previous + (duration - previous) * DURATION_WEIGHT
+
+    def update(durations):
+        entry = durations.get(key)
+        duration_avg = moving_average(entry[0] if entry else None)
+        per_resource = entry[2] if entry and len(entry) > 2 else {}
+        if res:
+            per_resource[res] = moving_average(per_resource.get(res))
+        durations[key] = [duration_avg, time.time(), per_resource]
+        if len(durations) > MAX_DURATIONS:
+            # forget the commands that didn't run for the longest time
+            for old in sorted(durations, key=lambda k: durations[k][1])[
+                : len(durations) - MAX_DURATIONS
+            ]:
+                del durations[old]
+        return durations
+
+    store.update_state(pool, "durations", update)
+
+
+POLICIES = {cls.name: cls for cls in (StrictPriority, Aging, FairShare)}
+
+
+def get(config):
+    """Return the policy configured for a pool."""
+    name = config.get("policy", DEFAULT_POLICY)
+    if name not in POLICIES:
+        log.warning("Unknown policy %s, using %s" % (name, DEFAULT_POLICY))
+        name = DEFAULT_POLICY
+    return POLICIES[name](config)
+
+
+# policy.py ends here
@@ -17,7 +17,7 @@
 
 import logging
 
-from dciqueue import lib
+from dciqueue import backend, lib
 
 log = logging.getLogger(__name__)
 
@@ -32,12 +32,15 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
+    suffix = "-podman" if args.podman else ""
     CRONLINES = [
-        lib.CRONTAB_LINE_FMT % ("-podman" if args.podman else "", args.pool),
-        lib.CRONTAB_CLEAN_LINE_FMT % ("-podman" if args.podman else "", args.pool),
+        lib.CRONTAB_LINE_FMT % (suffix, args.pool),
+        lib.CRONTAB_SERVE_LINE_FMT % (suffix, args.pool),
+        lib.CRONTAB_CLEAN_LINE_FMT % (suffix, args.pool),
     ]
 
     with open(args.file) as f:
@@ -16,10 +16,8 @@
 """ """
 
 import logging
-import os
-import shutil
 
-from dciqueue import lib, uninstall_cmd
+from dciqueue import backend, uninstall_cmd
 
 log = logging.getLogger(__name__)
 
@@ -42,11 +40,8 @@ def execute_command(args):
     if not args.no_uninstall:
         uninstall_cmd.execute_command(args)
 
-    for key in lib.DIRS:
-        d = os.path.join(args.top_dir, key, args.pool)
-        log.debug(" Removing %s" % d)
-        if os.path.exists(d):
-            shutil.rmtree(d)
+    store = backend.get(args)
+    store.remove_pool(args.pool)
 
     return 0
 
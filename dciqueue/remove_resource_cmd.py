@@ -15,15 +15,12 @@
 
 """ """
 
-import datetime
-import errno
-import json
 import logging
 import os
 import subprocess
 import sys
 
-from dciqueue import lib
+from dciqueue import backend, lib
 
 log = logging.getLogger(__name__)
 
@@ -45,41 +42,21 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
     # if we are trying to remove a resource that does not exist, but not forcing the
     # removal of the resource, then exit
-    path = os.path.join(args.top_dir, "pool", args.pool, args.name)
-    if not (os.path.exists(path) or args.force):
+    if not (store.has_resource(args.pool, args.name) or args.force):
         msg = "Trying to remove resource %s that does not exist." % (args.name,)
         sys.stderr.write(msg)
         return 1
 
-    # this step is common when forcing and not forcing the removal
-    for key in ("available", "pool"):
-        path = os.path.join(args.top_dir, key, args.pool, args.name)
-        if os.path.exists(path) or os.path.islink(path):
-            log.debug("Removing %s (%s)" % (path, args.reason))
-            os.unlink(path)
-
-    dir = os.path.join(args.top_dir, "reason", args.pool)
-    try:
-        os.makedirs(dir)
-    except OSError as e:
-        if e.errno == errno.EEXIST:
-            pass
-        else:
-            raise
-
-    path = os.path.join(args.top_dir, "reason", args.pool, args.name)
     if args.force:
-        # files under available and pool directories have already been removed
-        # if present
-        # now, just check if the resource is already blocked, to remove it from
-        # the blocked resources (reason directory), then finish the execution
-        if os.path.exists(path):
-            os.unlink(path)
+        # remove the resource from the pool and from the blocked resources
+        # (reason directory) if it was already blocked
+        store.remove_resource(args.pool, args.name)
         return 0
 
     # if we're not forcing the removal of the resource, just move it to the
@@ -94,16 +71,9 @@ def execute_command(args):
             universal_newlines=True,
         ).strip("\n")
 
-    with open(path, "w") as f:
-        json.dump(
-            {
-                "reason": prefix + args.reason,
-                "pool": args.pool,
-                "resource": args.name,
-                "date": str(datetime.datetime.now()),
-            },
-            f,
-        )
+    store.remove_resource(
+        args.pool, args.name, lib.get_reason(args.pool, args.name, prefix + args.reason)
+    )
 
     return 0
 
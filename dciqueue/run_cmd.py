@@ -15,24 +15,51 @@
 
 """ """
 
-import json
 import logging
 import os
+import signal
+import socket
 import subprocess
-import sys
+import time
 
-from dciqueue import lib
-
-if sys.version_info[0] == 2:
-    FileNotFoundError = OSError
+from dciqueue import affinity, backend, health, joblog, lib, policy
 
 log = logging.getLogger(__name__)
 
 COMMAND = "run"
 
-EXT = ".exec"
+EXT = lib.EXT
 RET_CODE = {}
 
+# leases of the executing commands are renewed every HEARTBEAT_INTERVAL
+# seconds and can be reclaimed LEASE_TTL seconds after the last renewal
+HEARTBEAT_INTERVAL = 60
+LEASE_TTL = 300
+# seconds between SIGTERM and SIGKILL when stopping a command
+KILL_GRACE = 30
+# keys of the commands copied to their result (see simulate_cmd)
+HISTORY_KEYS = (
+    "cmd",
+    "wd",
+    "priority",
+    "count",
+    "extra_pools",
+    "timeout",
+    "queued_at",
+    "selector",
+)
+# keys added to the commands when they are started
+RUN_KEYS = (
+    "real_cmd",
+    "resource",
+    "jobid",
+    "booked",
+    "start",
+    "pid",
+    "lease",
+    "killed",
+)
+
 
 def register_command(subparsers):
     parser = subparsers.add_parser(COMMAND, help="Run a command from a pool")
@@ -43,287 +70,567 @@ def register_command(subparsers):
         action="store_true",
         help="Command output to the console",
     )
+    parser.add_argument(
+        "-1",
+        "--once",
+        action="store_true",
+        help="Do not start new commands when the running ones finish",
+    )
     return COMMAND
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
+    # restore the commands if the host crashed since the last recovery
+    store.recover_after_boot(args.pool)
 
     commands = []
-    skipped_jobs = set()  # Track jobs that have been skipped to avoid infinite loop
+    dispatch(args, commands)
 
-    while True:
-        booked_resources = []
+    if commands != []:
+        log.info("Waiting for commands: %s" % commands)
+
+        while commands != []:
+            log.debug("Waiting %d commands" % len(commands))
+            pid, status = wait_child(commands)
+            if not reap(commands, pid, status) or getattr(args, "once", False):
+                continue
+            # start the next commands on the freed resources unless the
+            # pool has been removed in the meantime
+            if store.missing_pool(args.pool) is None:
+                dispatch(args, commands)
+    return 0
 
-        # First, peek at the next job to check resource requirements
-        to_exec, idx = peek_next_command(args)
 
-        if not to_exec:
-            log.debug("No command to run in pool %s" % args.pool)
+def dispatch(args, commands):
+    """Start the queued commands of a pool while resources are available.
+
+    Each started command is appended to the commands list. The caller is
+    responsible for calling reap() when the child processes exit.
+    """
+    store = backend.get(args)
+    config = store.config(args.pool)
+    reclaim(store, args.pool, config.get("lease_ttl", LEASE_TTL))
+    backfill = config.get("backfill", False)
+    jobs = candidates(store, args.pool, config, backfill)
+    # resources failing their health check are kept booked until the end
+    # of the pass so the next bookings pick other resources
+    unhealthy = []
+    try:
+        start_jobs(args, store, config, commands, jobs, backfill, unhealthy)
+    finally:
+        if unhealthy:
+            store.free_resources(unhealthy)
+
+
+def select(store, pool, config, jobs, backfill, unhealthy, now=None):
+    """Yield the (idx, data, booked) of the jobs of a pool to start now.
+
+    jobs are the candidates() of the pool. Each yielded job has its
+    resources booked and is taken from the queue. The booked resources
+    that are not healthy are appended to unhealthy and the job is retried
+    on other resources.
+    """
+    now = time.time() if now is None else now
+    durations = store.state(pool, "durations") if backfill else {}
+    reservation = None
+    retry = None
+    configs = {pool: config}
+    affinities = affinity.Affinity(store) if config.get("affinity", True) else None
+
+    while True:
+        # First, get the next job to check resource requirements
+        if retry:
+            idx, data = retry
+            retry = None
+        else:
+            idx, data = next(jobs, (None, None))
+
+        if idx is None:
+            log.debug("No command to run in pool %s" % pool)
             break
         else:
-            # Check if we've already skipped this job to avoid infinite loop
-            if idx in skipped_jobs:
-                log.debug("All remaining jobs have been skipped, breaking loop")
-                break
+            log.debug("Checking command %s" % data)
 
-            with open(to_exec) as f:
-                data = json.load(f)
+            wanted = backend.requirements(pool, data)
+            selectors = backend.selectors(pool, data)
+            duration = policy.estimate(durations, data)
+            if reservation and not reservation.allows(wanted, duration):
+                log.debug(
+                    "Job %d (estimated duration %s) would delay the blocked job"
+                    % (idx, duration)
+                )
+                continue
 
-            log.debug("Checking command %s" % data)
+            # Book all the resources of the job at once or none of them
+            # preferring the resources that ran the same command last
+            prefer = affinities.prefer(wanted, data) if affinities else None
+            booked_resources = store.book_set(wanted, prefer, selectors)
 
-            # Check if extra resources are available BEFORE booking any resources
-            extra_resources_available = True
-            for pool in data["extra_pools"]:
-                if not has_available_resource(args.top_dir, pool):
-                    log.debug("No available resource in pool %s" % pool)
-                    extra_resources_available = False
+            if booked_resources is None:
+                log.debug("Resources %s not available for job %d" % (wanted, idx))
+                # Evict lower priority commands for an urgent one and
+                # wait for their resources
+                if preempt(store, config, wanted, idx, data, selectors):
                     break
-
-            # If extra resources are not available, skip this job
-            if not extra_resources_available:
-                log.debug("Skipping job due to unavailable extra resources")
-                skipped_jobs.add(idx)
+                # Stop there to not delay the job by starting the next ones
+                if not backfill:
+                    break
+                # or keep its resources and only start the jobs that
+                # don't delay it
+                if reservation is None:
+                    reservation = policy.Reservation.load(store, wanted, now, selectors)
+                    log.info(
+                        "Reserving %s for job %d until %s"
+                        % (wanted, idx, reservation.shadow)
+                    )
                 continue
 
-            # Now book the primary resource
-            res = book_resource(args.top_dir, args.pool)
+            # compare (resource, pool) values: the entries can be lists
+            # when they come from JSON
+            bad = []
+            good = []
+            for r, p in booked_resources:
+                if p not in configs:
+                    configs[p] = store.config(p)
+                if health.check(store, p, r, configs[p], now):
+                    good.append((r, p))
+                else:
+                    bad.append((r, p))
+            if bad:
+                log.info("Unhealthy resources %s for job %d" % (bad, idx))
+                unhealthy.extend(bad)
+                store.free_resources(good)
+                retry = (idx, data)
+                continue
 
-            if res is None:
-                log.debug("No available resource anymore in pool %s" % args.pool)
-                break
-            log.debug("Booked resource %s in pool %s" % (res, args.pool))
-            booked_resources.append((res, args.pool))
+            if reservation:
+                log.info("Backfilling job %d" % idx)
+                reservation.consume(wanted, duration)
+            log.debug("Booked resources %s" % booked_resources)
 
             # Now consume the job from the queue
-            to_exec, idx = get_command(args)
-
-            # book extra resources if needed
-            extra_booking_failed = False
-            for pool in data["extra_pools"]:
-                extra_res = book_resource(args.top_dir, pool)
-                if extra_res is None:
-                    log.debug("No available resource anymore in pool %s" % pool)
-                    free_resources(booked_resources, args.top_dir)
-                    extra_booking_failed = True
-                    break
-                booked_resources.append((extra_res, pool))
-
-            # If extra resource booking failed, skip this job and continue to next
-            if extra_booking_failed:
-                log.debug("Skipping job due to failed extra resource booking")
+            idx, data = store.take(pool, idx)
+            if idx is None:
+                log.debug("Command already taken by another runner")
+                store.free_resources(booked_resources)
                 continue
 
-            data["real_cmd"] = [c.replace("@RESOURCE", res) for c in data["cmd"]]
-            data["resource"] = res
-            data["jobid"] = idx
-            data["booked"] = booked_resources
+            if affinities:
+                affinities.record(booked_resources, data)
 
-            if "remove" in data and data["remove"]:
-                log.info("Removing resource %s" % res)
-                path = os.path.join(args.top_dir, "pool", args.pool, res)
-                if os.path.exists(path):
-                    os.unlink(path)
+            yield idx, data, booked_resources
 
-            with open(to_exec, "w") as f:
-                json.dump(data, f)
 
-            try:
-                log.info("Running command %s (wd: %s)" % (data["cmd"], data["wd"]))
-                os.chdir(data["wd"])
-                os.environ["DCI_QUEUE"] = args.pool
-                os.environ["DCI_QUEUE_RES"] = res
-                os.environ["DCI_QUEUE_ID"] = str(idx)
-                os.environ["DCI_QUEUE_JOBID"] = "%s.%d" % (args.pool, idx)
-                num = 1
-                for r, p in booked_resources:
-                    os.environ[f"DCI_QUEUE{num}"] = p
-                    os.environ[f"DCI_QUEUE_RES{num}"] = r
-                    num += 1
-                if not args.command_output:
-                    out_fd = open(
-                        os.path.join(args.top_dir, "log", args.pool, str(idx)), "w"
-                    )
-                    # log environment variables
-                    out_fd.write(f'+ DCI_QUEUE={os.environ["DCI_QUEUE"]}\n')
-                    out_fd.write(f'+ DCI_QUEUE_RES={os.environ["DCI_QUEUE_RES"]}\n')
-                    out_fd.write(f'+ DCI_QUEUE_ID={os.environ["DCI_QUEUE_ID"]}\n')
-                    out_fd.write(f'+ DCI_QUEUE_JOBID={os.environ["DCI_QUEUE_JOBID"]}\n')
-                    for idx in range(1, num):
-                        out_fd.write(
-                            f'+ DCI_QUEUE{idx}={os.environ[f"DCI_QUEUE{idx}"]}\n'
-                        )
-                        out_fd.write(
-                            f'+ DCI_QUEUE_RES{idx}={os.environ[f"DCI_QUEUE_RES{idx}"]}\n'
-                        )
-                    out_fd.write("+ cd " + data["wd"] + "\n")
-                    out_fd.write("+ " + " ".join(data["real_cmd"]) + "\n")
-                    out_fd.flush()
-                    proc = subprocess.Popen(
-                        data["real_cmd"], stdout=out_fd, stderr=out_fd
-                    )
-                else:
-                    out_fd = None
-                    proc = subprocess.Popen(data["real_cmd"])
-                if proc:
-                    data["pid"] = proc.pid
-                    commands.append(
-                        [booked_resources, proc, out_fd, data["real_cmd"], idx, to_exec]
-                    )
-                with open(to_exec, "w") as f:
-                    json.dump(data, f)
-            except Exception:
-                log.exception("Unable to execute command")
-                free_resources(booked_resources, args.top_dir)
-                log.debug("Removing %s" % to_exec)
-                os.remove(to_exec)
+def start(store, pool, idx, data, booked_resources, now=None):
+    """Record the start of a job returned by select()."""
+    res = booked_resources[0][0]
+    data["real_cmd"] = [c.replace("@RESOURCE", res) for c in data["cmd"]]
+    data["resource"] = res
+    data["jobid"] = idx
+    data["booked"] = booked_resources
+    data["start"] = time.time() if now is None else now
 
-    if commands != []:
-        log.info("Waiting for commands: %s" % commands)
+    if "remove" in data and data["remove"]:
+        for r, p in booked_resources:
+            if p == pool:
+                log.info("Removing resource %s" % r)
+                store.remove_resource(pool, r)
 
-        number = len(commands)
-        while number > 0:
-            log.debug("Waiting %d commands" % number)
-            status = os.wait()
-            for booked, proc, fd, cmd, idx, to_exec in commands:
-                if proc and proc.pid == status[0]:
-                    number -= 1
-                    break
+    store.update(pool, idx, data)
+
+
+def start_jobs(args, store, config, commands, jobs, backfill, unhealthy):
+    """Start the jobs of the pool for dispatch()."""
+    for idx, data, booked_resources in select(
+        store, args.pool, config, jobs, backfill, unhealthy
+    ):
+        start(store, args.pool, idx, data, booked_resources)
+        res = data["resource"]
+        try:
+            log.info("Running command %s (wd: %s)" % (data["cmd"], data["wd"]))
+            # pass the environment explicitly to not leak variables
+            # from one command to the next one
+            env = dict(os.environ)
+            env["DCI_QUEUE"] = args.pool
+            env["DCI_QUEUE_RES"] = res
+            env["DCI_QUEUE_ID"] = str(idx)
+            env["DCI_QUEUE_JOBID"] = "%s.%d" % (args.pool, idx)
+            num = 1
+            for r, p in booked_resources:
+                env[f"DCI_QUEUE{num}"] = p
+                env[f"DCI_QUEUE_RES{num}"] = r
+                num += 1
+            if not args.command_output:
+                out_fd = joblog.open_log(store.log_path(args.pool, idx), config)
+                # log environment variables
+                out_fd.write(f'+ DCI_QUEUE={env["DCI_QUEUE"]}\n')
+                out_fd.write(f'+ DCI_QUEUE_RES={env["DCI_QUEUE_RES"]}\n')
+                out_fd.write(f'+ DCI_QUEUE_ID={env["DCI_QUEUE_ID"]}\n')
+                out_fd.write(f'+ DCI_QUEUE_JOBID={env["DCI_QUEUE_JOBID"]}\n')
+                for n in range(1, num):
+                    out_fd.write(f'+ DCI_QUEUE{n}={env[f"DCI_QUEUE{n}"]}\n')
+                    out_fd.write(f'+ DCI_QUEUE_RES{n}={env[f"DCI_QUEUE_RES{n}"]}\n')
+                out_fd.write("+ cd " + data["wd"] + "\n")
+                out_fd.write("+ " + " ".join(data["real_cmd"]) + "\n")
+                out_fd.flush()
+                proc = subprocess.Popen(
+                    data["real_cmd"],
+                    stdout=out_fd,
+                    stderr=out_fd,
+                    cwd=data["wd"],
+                    env=env,
+                )
             else:
-                continue
+                out_fd = None
+                proc = subprocess.Popen(data["real_cmd"], cwd=data["wd"], env=env)
             if proc:
-                proc.wait()
-                if fd:
-                    fd.close()
-                log.info("%s returned %d" % (cmd, os.WEXITSTATUS(status[1])))
-                RET_CODE[idx] = os.WEXITSTATUS(status[1])
-                log.debug("Removing %s" % to_exec)
-                try:
-                    os.remove(to_exec)
-                except FileNotFoundError:
-                    pass
-            if booked != [] and args:
-                free_resources(booked, args.top_dir)
-    return 0
+                data["pid"] = proc.pid
+                data["lease"] = new_lease(proc.pid)
+                commands.append(
+                    [
+                        booked_resources,
+                        proc,
+                        out_fd,
+                        data["real_cmd"],
+                        idx,
+                        args.pool,
+                        store,
+                    ]
+                )
+            store.update(args.pool, idx, data)
+        except Exception as e:
+            log.exception("Unable to execute command")
+            store.set_result(args.pool, idx, error_result(str(e), data))
+            store.free_resources(booked_resources)
+            store.finish(args.pool, idx)
+
+
+def candidates(store, pool, config=None, snapshot=False, now=None):
+    """Yield the queued (idx, data) of a pool in the order of its policy.
+
+    The jobs are read from a snapshot of the queue taken at now unless
+    the policy order is the one of the priority index and snapshot is
+    False.
+    """
+    pool_policy = policy.get(store.config(pool) if config is None else config)
+    log.debug("Using the %s policy for pool %s" % (pool_policy.name, pool))
+    if pool_policy.indexed and not snapshot:
+        while True:
+            yield store.peek(pool)
+    else:
+        for job in pool_policy.order(policy.Snapshot.load(store, pool, now)):
+            yield job
 
 
-def book_resource(top_dir, pool):
-    """Book a resource from the pool.
+def new_lease(pid):
+    """Return the lease of the resources booked for the command pid.
 
-    Removing the first symlink from the available directory.
+    The lease is owned by the current process that frees the resources
+    when the command exits.
     """
-    available_dir = os.path.join(top_dir, "available", pool)
-    resources = [
-        f
-        for f in os.listdir(available_dir)
-        if os.path.islink(os.path.join(available_dir, f))
-    ]
-
-    for res in resources:
+    return {
+        "host": socket.gethostname(),
+        "owner": os.getpid(),
+        "owner_start": lib.process_start_time(os.getpid()),
+        "pid": pid,
+        "pid_start": lib.process_start_time(pid),
+        "heartbeat": time.time(),
+    }
+
+
+def local_lease(lease):
+    """Check if the processes of a lease run on this host."""
+    return lease.get("host", socket.gethostname()) == socket.gethostname()
+
+
+def lease_expired(lease, ttl, now=None):
+    """Check if nobody is using the resources of a lease anymore.
+
+    The lease must not have been renewed for ttl seconds and neither
+    the command nor the process owning the lease must be alive. The
+    processes of another host can't be checked so only the heartbeat is
+    used for them.
+    """
+    now = time.time() if now is None else now
+    if now - lease["heartbeat"] < ttl:
+        return False
+    if not local_lease(lease):
+        return True
+    if lib.process_alive(lease["pid"], lease.get("pid_start")):
+        return False
+    return not lib.process_alive(lease["owner"], lease.get("owner_start"))
+
+
+def renew(commands):
+    """Update the heartbeat of the leases of the running commands."""
+    now = time.time()
+    for booked, proc, fd, cmd, idx, pool, store in commands:
+        store.heartbeat(pool, idx, now)
+    log.debug("Renewed %d leases" % len(commands))
+
+
+def reclaim(store, pool, ttl=LEASE_TTL):
+    """Free the resources of the expired leases of a pool."""
+    for idx, data in store.executing(pool):
+        lease = data.get("lease")
+        if lease is None or not lease_expired(lease, ttl):
+            continue
+        log.warning(
+            "Reclaiming the resources %s of the command %s.%d (lease owner %s)"
+            % (data.get("booked"), pool, idx, lease["owner"])
+        )
+        store.set_result(pool, idx, error_result("lease expired", data))
+        store.finish(pool, idx)
+        store.free_resources(data.get("booked") or [(data.get("resource"), pool)])
+
+
+def terminate(store, pool, idx, data, reason, grace=KILL_GRACE, requeue=False):
+    """Send SIGTERM to an executing command.
+
+    The dispatcher running the command sends SIGKILL if it is still
+    running after grace seconds (see enforce()) and requeues it when it
+    exits if requeue is True. The signal is sent by the dispatcher when
+    the command runs on another host.
+    """
+    log.warning("Stopping command %s.%d: %s" % (pool, idx, reason))
+    local = local_lease(data.get("lease", {}))
+    data["killed"] = {
+        "reason": reason,
+        "time": time.time(),
+        "grace": grace,
+        "requeue": requeue,
+        "signaled": local,
+    }
+    store.update(pool, idx, data)
+    if local:
         try:
-            filename = os.path.join(available_dir, res)
-            os.remove(filename)
-            log.debug("Removed symlink %s" % filename)
-            return res
-        except FileNotFoundError:
+            os.kill(data["pid"], signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def enforce(commands, now=None):
+    """Stop the commands running for longer than their timeout.
+
+    The commands are sent SIGTERM when their timeout expires and SIGKILL
+    at the end of the grace period. Their resources are freed when they
+    are reaped. Return the time of the next action or None.
+    """
+    now = time.time() if now is None else now
+    deadlines = []
+    for booked, proc, fd, cmd, idx, pool, store in commands:
+        state, data = store.job(pool, idx)
+        if state != backend.EXECUTING:
             continue
-    return None
-
-
-def free_resource(res, top_dir, pool):
-    path = os.path.join(top_dir, "pool", pool, res)
-    # do not symlink if the resource has been removed during run
-    if os.path.exists(path):
-        symlink = os.path.join(top_dir, "available", pool, res)
-        log.debug("Creating symlink %s from pid %s" % (symlink, os.getpid()))
-        os.symlink(path, symlink)
-
-
-def free_resources(resources, top_dir):
-    log.debug("Freeing resources: %s" % resources)
-    for r, pool in resources:
-        free_resource(r, top_dir, pool)
-
-
-def peek_next_command(args):
-    """Peek at the next command without consuming it from the queue."""
-    seq = lib.Seq(args)
-
-    seq.lock()
-    first, next = seq.get()
-
-    to_exec = None
-    index = None
-    pri = -1
-    # first pass to find the highest priority job
-    for idx in range(first, next):
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(idx))
-        if os.path.exists(cmdfile):
-            log.debug("getting priority for %s" % cmdfile)
-            with open(cmdfile) as cmdfd:
-                data = json.load(cmdfd)
-                priority = data["priority"] if "priority" in data else 0
-                if priority > pri:
-                    log.debug("top priority so far %s => %d" % (cmdfile, priority))
-                    index = idx
-                    pri = priority
-    if index is not None:
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(index))
-        to_exec = cmdfile  # Don't move the file, just return the path
-
-    seq.unlock()
-    log.debug("peek_next_command %s %s" % (to_exec, index))
-    return to_exec, index
-
-
-def has_available_resource(top_dir, pool):
-    """Check if there's at least one available resource in the pool."""
-    available_dir = os.path.join(top_dir, "available", pool)
-    if not os.path.exists(available_dir):
-        return False
+        killed = data.get("killed")
+        if killed:
+            if killed.get("sigkill"):
+                continue
+            if not killed.get("signaled", True):
+                # stop requested from another host
+                log.warning("Stopping command %s.%d" % (pool, idx))
+                proc.terminate()
+                killed.update({"signaled": True, "time": now})
+                store.update(pool, idx, data)
+            deadline = killed["time"] + killed["grace"]
+            if now >= deadline:
+                log.warning("Killing command %s.%d" % (pool, idx))
+                proc.kill()
+                killed["sigkill"] = now
+                store.update(pool, idx, data)
+            else:
+                deadlines.append(deadline)
+        elif data.get("timeout") and "start" in data:
+            deadline = data["start"] + data["timeout"]
+            if now >= deadline:
+                grace = store.config(pool).get("kill_grace", KILL_GRACE)
+                terminate(store, pool, idx, data, "timeout", grace)
+                deadlines.append(now + grace)
+            else:
+                deadlines.append(deadline)
+    return min(deadlines) if deadlines else None
+
 
-    resources = [
-        f
-        for f in os.listdir(available_dir)
-        if os.path.islink(os.path.join(available_dir, f))
-    ]
-    return len(resources) > 0
-
-
-def get_command(args):
-    """Get the next command to execute from the queue."""
-    seq = lib.Seq(args)
-
-    seq.lock()
-    first, next = seq.get()
-
-    to_exec = None
-    index = None
-    pri = -1
-    # first pass to find the highest priority job
-    for idx in range(first, next):
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(idx))
-        if os.path.exists(cmdfile):
-            log.debug("getting priority for %s" % cmdfile)
-            with open(cmdfile) as cmdfd:
-                data = json.load(cmdfd)
-                priority = data["priority"] if "priority" in data else 0
-                if priority > pri:
-                    log.debug("top priority so far %s => %d" % (cmdfile, priority))
-                    index = idx
-                    pri = priority
-    if index is not None:
-        cmdfile = os.path.join(args.top_dir, "queue", args.pool, str(index))
-        movedfile = cmdfile + EXT
-        os.rename(cmdfile, movedfile)
-        to_exec = movedfile
-        if index == first:
-            seq.set(index + 1, next)
-
-    seq.unlock()
-    log.debug("get_command %s %s" % (to_exec, index))
-    return to_exec, index
+def preempt(store, config, wanted, idx, data, selectors=None):
+    """Stop preemptible commands to free the resources wanted by a command.
+
+    Only commands whose priority is at least the preempt_priority setting
+    of the pool can preempt the commands scheduled with --preemptible and
+    a lower priority. The least urgent and most recently started commands
+    are stopped first and requeued. Only the resources matching the
+    selectors of the command are counted. Return True if enough
+    resources are being freed for the command.
+    """
+    threshold = config.get("preempt_priority")
+    priority = data.get("priority", 0)
+    if threshold is None or priority < threshold:
+        return False
+    usable = policy.usable_resources(store, wanted, selectors)
+    missing = {}
+    for pool, count in wanted:
+        missing[pool] = count - len(
+            [res for res in store.available(pool) if usable(res, pool)]
+        )
+    victims = []
+    for job_pool in store.pools():
+        for job_idx, job in store.executing(job_pool):
+            pools = [
+                pool
+                for res, pool in job.get("booked", [])
+                if pool in missing and usable(res, pool)
+            ]
+            if not pools:
+                continue
+            if job.get("killed"):
+                # already being stopped
+                for pool in pools:
+                    missing[pool] -= 1
+            elif job.get("preemptible") and job.get("priority", 0) < priority:
+                victims.append(
+                    (job.get("priority", 0), -job.get("start", 0), job_pool, job_idx)
+                )
+    chosen = []
+    for victim_priority, start, job_pool, job_idx in sorted(victims):
+        if max(missing.values()) <= 0:
+            break
+        state, job = store.job(job_pool, job_idx)
+        if state != backend.EXECUTING or "pid" not in job:
+            continue
+        pools = [
+            pool
+            for res, pool in job["booked"]
+            if missing.get(pool, 0) > 0 and usable(res, pool)
+        ]
+        if not pools:
+            continue
+        for pool in pools:
+            missing[pool] -= 1
+        chosen.append((job_pool, job_idx, job))
+    if max(missing.values()) > 0:
+        return False
+    for job_pool, job_idx, job in chosen:
+        terminate(
+            store,
+            job_pool,
+            job_idx,
+            job,
+            "preempted by %s.%d" % (wanted[0][0], idx),
+            store.config(job_pool).get("kill_grace", KILL_GRACE),
+            requeue=True,
+        )
+    return True
+
+
+def requeue(store, pool, data):
+    """Schedule again a command that was stopped before its end."""
+    entry = {key: value for key, value in data.items() if key not in RUN_KEYS}
+    idx = store.schedule(pool, entry, force=True)
+    log.info("Command %s requeued as %s.%d" % (data["cmd"], pool, idx))
+    return idx
+
+
+def wait_child(commands):
+    """Wait for a child process, renewing the leases and enforcing the timeouts.
+
+    SIGCHLD is blocked while waiting so a child exiting between the
+    check and the wait is not missed. The leases and the timeouts are
+    handled between the waits and their errors are logged so the
+    children are still reaped.
+    """
+    renewed = time.time()
+    previous = signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGCHLD])
+    try:
+        while True:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                return pid, status
+            now = time.time()
+            if now - renewed >= HEARTBEAT_INTERVAL:
+                try:
+                    renew(commands)
+                except Exception:
+                    log.exception("Unable to renew the leases")
+                renewed = now
+            wakeup = renewed + HEARTBEAT_INTERVAL
+            try:
+                deadline = enforce(commands, now)
+            except Exception:
+                log.exception("Unable to enforce the timeouts")
+                deadline = None
+            if deadline is not None:
+                wakeup = min(wakeup, deadline)
+            signal.sigtimedwait([signal.SIGCHLD], max(wakeup - time.time(), 0.01))
+    finally:
+        signal.pthread_sigmask(signal.SIG_SETMASK, previous)
+
+
+def exit_code(status):
+    """Convert a wait status to a shell like exit code."""
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def error_result(error, data=None):
+    """Return the result of a command that didn't run to completion."""
+    data = data or {}
+    return {
+        "rc": None,
+        "error": error,
+        "start": data.get("start"),
+        "end": time.time(),
+        "resource": data.get("resource"),
+        "booked": data.get("booked", []),
+    }
+
+
+def reap(commands, pid, status):
+    """Finish the command whose process pid exited with status.
+
+    Return False if pid doesn't belong to one of the commands.
+    """
+    for command in commands:
+        booked, proc, fd, cmd, idx, pool, store = command
+        if proc and proc.pid == pid:
+            break
+    else:
+        return False
+    commands.remove(command)
+    proc.wait()
+    if fd:
+        fd.close()
+    log.info("%s returned %d" % (cmd, os.WEXITSTATUS(status)))
+    RET_CODE[idx] = os.WEXITSTATUS(status)
+    data = store.job(pool, idx)[1] or {}
+    end = time.time()
+    killed = data.get("killed")
+    if exit_code(status) == 0 and "start" in data and not killed:
+        policy.record_duration(store, pool, data, end - data["start"])
+    result = {
+        "rc": exit_code(status),
+        "start": data.get("start"),
+        "end": end,
+        "resource": data.get("resource"),
+        "booked": booked,
+    }
+    # keep what is needed to replay the history of the pool
+    for key in HISTORY_KEYS:
+        if key in data:
+            result[key] = data[key]
+    if killed:
+        result["error"] = killed["reason"]
+        if killed.get("requeue"):
+            result["requeued"] = requeue(store, pool, data)
+    store.set_result(pool, idx, result)
+    store.finish(pool, idx)
+    if booked != []:
+        store.free_resources(booked)
+    # the results are pruned even when the output goes to the console
+    joblog.prune(store, pool, store.config(pool))
+    return True
 
 
 # run_cmd.py ends here
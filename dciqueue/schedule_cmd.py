@@ -15,16 +15,12 @@
 
 """ """
 
+import argparse
 import json
 import logging
-import os
 import sys
-import time
 
-from dciqueue import lib, run_cmd
-
-if sys.version_info[0] == 2:
-    FileNotFoundError = IOError
+from dciqueue import api, backend, lib, run_cmd
 
 log = logging.getLogger(__name__)
 
@@ -64,84 +60,186 @@ def register_command(subparsers):
         type=int,
         default=0,
     )
+    parser.add_argument(
+        "-n",
+        "--count",
+        help="Number of resources to book from the pool",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        help="Stop the command after this duration (seconds or with a s, m, h or d"
+        " suffix)",
+        type=duration,
+        default=None,
+    )
+    parser.add_argument(
+        "--preemptible",
+        action="store_true",
+        help="Allow the command to be stopped and requeued for an urgent one",
+    )
+    parser.add_argument(
+        "-l",
+        "--selector",
+        help="Labels the resources of the pool must have as key=value[,key=value]"
+        " (can be repeated)",
+        type=labels,
+        action="append",
+        default=[],
+    )
     # add -e <pool> option to store multiple pools in the same command
     parser.add_argument("-e", "--extra-pool", action="append", default=[])
+    parser.add_argument(
+        "--from-file",
+        help="Schedule the commands described in a JSON lines file ('-' for stdin)"
+        " and print their ids",
+    )
     parser.add_argument("pool", help="Name of the pool")
     parser.add_argument("cmd", nargs="*")
     return COMMAND
 
 
+def duration(value):
+    try:
+        return lib.parse_duration(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid duration: %s" % value)
+
+
+def labels(value):
+    try:
+        return lib.parse_labels(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def selector(args):
+    """Merge the labels of the --selector options."""
+    result = {}
+    for labels in args.selector:
+        result.update(labels)
+    return result
+
+
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
-    for c in args.cmd:
-        if "@RESOURCE" in c:
-            break
-    else:
-        sys.stderr.write("no @RESOURCE in command: %s\n" % " ".join(args.cmd))
+    queue = api.Queue(store)
+
+    if args.from_file:
+        return schedule_from_file(args, queue)
+
+    try:
+        idx = queue.schedule(
+            args.pool,
+            args.cmd,
+            force=args.force,
+            remove=args.remove_resource,
+            priority=args.priority,
+            extra_pools=args.extra_pool,
+            count=args.count,
+            timeout=args.timeout,
+            preemptible=args.preemptible,
+            selector=selector(args),
+        )
+    except api.QueueError as e:
+        sys.stderr.write("%s\n" % e)
         return 1
 
-    seq_obj = lib.Seq(args)
-    seq_obj.lock()
-    first, idx = seq_obj.get()
-
-    found = False
-    if not args.force:
-        for cmdfile in [
-            p
-            for p in os.listdir(os.path.join(args.top_dir, "queue", args.pool))
-            if p not in (".seq", ".seq.lck")
-        ]:
-            try:
-                with open(
-                    os.path.join(args.top_dir, "queue", args.pool, cmdfile), "r"
-                ) as f:
-                    data = json.load(f)
-                if data["cmd"] == args.cmd and data["wd"] == os.getcwd():
-                    found = True
-                    break
-            except FileNotFoundError:
-                continue
-
-    if found:
-        log.info("Not scheduling a duplicated command")
-    else:
-        queuefile = os.path.join(args.top_dir, "queue", args.pool, str(idx))
-        cwd = os.getcwd()
-        # validate extra pools exist
-        for pool in args.extra_pool:
-            if not lib.check_pool(args.top_dir, pool):
-                log.error("Pool %s does not exist" % pool)
-                seq_obj.unlock()
-                return 1
-        with open(queuefile, "w") as f:
-            json.dump(
-                {
-                    "cmd": args.cmd,
-                    "wd": cwd,
-                    "remove": args.remove_resource,
-                    "priority": args.priority,
-                    "extra_pools": args.extra_pool,
-                },
-                f,
-            )
-        log.info("Command %s (wd: %s) queued as %s" % (args.cmd, cwd, queuefile))
-        seq_obj.set(first, idx + 1)
-
-    seq_obj.unlock()
+    if idx is None:
+        return 0
 
     if args.block:
         log.info("In block mode, running the queue from pool %s" % args.pool)
-        while True:
-            run_cmd.execute_command(args)
-            if os.path.exists(queuefile):
-                log.debug("Command not executed. Sleeping 10s.")
-                time.sleep(10)
-            else:
+        dirs, names = store.watch([args.pool])
+        watcher = lib.Watcher(dirs, names)
+        # do not keep running the queue once our command is finished
+        run_args = argparse.Namespace(**vars(args))
+        run_args.once = True
+        try:
+            while True:
+                run_cmd.execute_command(run_args)
+                if store.job(args.pool, idx)[0] == backend.QUEUED:
+                    log.debug("Command not executed. Waiting for changes.")
+                    watcher.wait(10)
+                    continue
+                # executed by us or by another dci-queue process
                 log.debug("Command executed")
-                return run_cmd.RET_CODE[idx]
+                result = queue.wait(args.pool, idx)
+                if result is None or result["rc"] is None:
+                    return 1
+                return result["rc"]
+        finally:
+            watcher.close()
+
+    return 0
+
+
+def read_entries(args):
+    """Read the commands to schedule, one JSON object per line.
+
+    Missing keys default to the values of the command line options.
+    """
+    entries = []
+    if args.from_file == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(args.from_file) as f:
+            lines = f.readlines()
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            cmd = record["cmd"]
+        except (ValueError, KeyError, TypeError):
+            sys.stderr.write("invalid entry at line %d: %s" % (lineno, line))
+            return None
+        if not isinstance(cmd, list):
+            sys.stderr.write("cmd must be a list at line %d: %s" % (lineno, line))
+            return None
+        entries.append(
+            api.new_entry(
+                cmd,
+                wd=record.get("wd"),
+                remove=record.get("remove", args.remove_resource),
+                priority=record.get("priority", args.priority),
+                extra_pools=record.get("extra_pools", args.extra_pool),
+                count=record.get("count", args.count),
+                user=record.get("user"),
+                timeout=record.get("timeout", args.timeout),
+                preemptible=record.get("preemptible", args.preemptible),
+                selector=record.get("selector", selector(args)),
+            )
+        )
+    return entries
+
+
+def schedule_from_file(args, queue):
+    if args.cmd or args.block:
+        sys.stderr.write("--from-file cannot be used with a command or --block\n")
+        return 1
+
+    try:
+        entries = read_entries(args)
+    except OSError as e:
+        sys.stderr.write("unable to read %s: %s\n" % (args.from_file, e))
+        return 1
+    if entries is None:
+        return 1
+
+    try:
+        ids = queue.schedule_many(args.pool, entries, args.force)
+    except api.QueueError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
 
+    for idx in ids:
+        print("-" if idx is None else idx)
     return 0
 
 
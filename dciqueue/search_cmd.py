@@ -15,12 +15,9 @@
 
 """ """
 
-import json
 import logging
-import os
 
-from dciqueue import lib
-from dciqueue.run_cmd import EXT
+from dciqueue import api, backend
 
 log = logging.getLogger(__name__)
 
@@ -37,22 +34,12 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
-    first, next = lib.get_seq(args)
-
-    for idx in range(first, next):
-        p = os.path.join(args.top_dir, "queue", args.pool, str(idx))
-        if not os.path.exists(p):
-            p = os.path.join(args.top_dir, "queue", args.pool, str(idx) + EXT)
-            if not os.path.exists(p):
-                p = None
-        if p:
-            with open(p) as f:
-                data = json.load(f)
-                if data["cmd"] == args.cmd:
-                    print(idx)
+    for idx in api.Queue(store).search(args.pool, args.cmd):
+        print(idx)
     return 0
 
 
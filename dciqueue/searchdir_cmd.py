@@ -15,11 +15,9 @@
 
 """ """
 
-import json
 import logging
-import os
 
-from dciqueue import lib
+from dciqueue import api, backend
 
 log = logging.getLogger(__name__)
 
@@ -37,18 +35,15 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
-    for p in os.listdir(os.path.join(args.top_dir, "queue", args.pool)):
-        if p.endswith(".seq") or p.endswith(".seq.lck"):
-            continue
-        with open(os.path.join(args.top_dir, "queue", args.pool, p)) as f:
-            data = json.load(f)
-            if data["wd"] == args.dir:
-                print(os.path.basename(p).split(".")[0])
-                return 0
-    return 1
+    idx = api.Queue(store).searchdir(args.pool, args.dir)
+    if idx is None:
+        return 1
+    print(idx)
+    return 0
 
 
 # searchdir_cmd.py ends here
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import argparse
+import logging
+import os
+import signal
+import time
+
+from dciqueue import backend, lib, run_cmd
+
+log = logging.getLogger(__name__)
+
+COMMAND = "serve"
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND, help="Dispatch commands from pools as soon as possible"
+    )
+    parser.add_argument(
+        "-C",
+        "--command-output",
+        action="store_true",
+        help="Command output to the console",
+    )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        help="Maximum number of seconds between two scans of the pools",
+        type=int,
+        default=60,
+    )
+    parser.add_argument("pools", help="Name of the pools", nargs="+")
+    return COMMAND
+
+
+def execute_command(args):
+    store = backend.get(args)
+    pools = []
+    for pool in args.pools:
+        if not store.check_pool(pool):
+            return 1
+        # restore the commands if the host crashed since the last recovery
+        store.recover_after_boot(pool)
+        pool_args = argparse.Namespace(**vars(args))
+        pool_args.pool = pool
+        pools.append(pool_args)
+
+    dirs, names = store.watch(args.pools)
+    watcher = lib.Watcher(dirs, names)
+
+    # wake up from select() when a child exits or when we are asked to stop
+    rfd, wfd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+    stopping = []
+
+    def stop(signum, frame):
+        log.info("Received signal %d, waiting for running commands" % signum)
+        stopping.append(signum)
+
+    old_wakeup_fd = signal.set_wakeup_fd(wfd)
+    old_handlers = {
+        signal.SIGCHLD: signal.signal(signal.SIGCHLD, lambda signum, frame: None),
+        signal.SIGTERM: signal.signal(signal.SIGTERM, stop),
+        signal.SIGINT: signal.signal(signal.SIGINT, stop),
+    }
+
+    commands = []
+    renewed = time.time()
+    try:
+        log.info("Serving pools %s" % " ".join(args.pools))
+        while True:
+            # an error must not stop the management of the running commands
+            try:
+                reap_children(commands)
+            except Exception:
+                log.exception("Unable to reap the commands")
+            if time.time() - renewed >= run_cmd.HEARTBEAT_INTERVAL:
+                try:
+                    run_cmd.renew(commands)
+                except Exception:
+                    log.exception("Unable to renew the leases")
+                renewed = time.time()
+            try:
+                deadline = run_cmd.enforce(commands)
+            except Exception:
+                log.exception("Unable to enforce the timeouts")
+                deadline = None
+            if stopping:
+                if commands == []:
+                    break
+            else:
+                for pool_args in pools:
+                    try:
+                        run_cmd.dispatch(pool_args, commands)
+                    except Exception:
+                        log.exception("Unable to dispatch pool %s" % pool_args.pool)
+            timeout = min(args.interval, run_cmd.HEARTBEAT_INTERVAL)
+            if deadline is not None:
+                timeout = max(min(timeout, deadline - time.time()), 0)
+            watcher.wait(timeout, (rfd,))
+            try:
+                while os.read(rfd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+    finally:
+        for signum, handler in old_handlers.items():
+            signal.signal(signum, handler)
+        signal.set_wakeup_fd(old_wakeup_fd)
+        os.close(rfd)
+        os.close(wfd)
+        watcher.close()
+    return 0
+
+
+def reap_children(commands):
+    """Finish all the commands whose process has exited."""
+    while commands != []:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            break
+        run_cmd.reap(commands, pid, status)
+
+
+# serve_cmd.py ends here
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Replay a trace of commands on a copy of a pool.
+
+The trace is run on a virtual clock through the selection and booking
+of the run command (run_cmd.select) against an in-memory copy of the
+pools so the real pools are never modified. Each line of a trace is a
+JSON object with:
+
+- submit: time at which the command is queued in seconds
+- duration: run time of the command in seconds
+- priority, count, extra_pools, timeout and selector as with schedule
+- cmd, wd and user: identify the command like when it is scheduled.
+  Commands without cmd and wd are considered as the same command to
+  estimate their durations.
+
+Without a trace file, the trace is recorded from the results of the
+pool. Health checks and preemption are not simulated.
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+
+from dciqueue import api, backend, config_cmd, lib, policy, run_cmd
+from dciqueue import sqlite_backend
+
+log = logging.getLogger(__name__)
+
+COMMAND = "simulate"
+
+PERCENTILES = (50, 90, 99)
+# settings of the pool that are not simulated
+IGNORED_SETTINGS = ("health_check", "preempt_priority")
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND, help="Simulate the scheduling of a trace of commands on a pool"
+    )
+    parser.add_argument(
+        "-r",
+        "--resources",
+        help="Number of resources to add to the pool",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "-s",
+        "--set",
+        help="Setting of the pool to change as name=value (see config)",
+        action="append",
+        default=[],
+        dest="settings",
+    )
+    parser.add_argument(
+        "-j", "--json", action="store_true", help="Display the report as JSON"
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Print the trace recorded from the results of the pool",
+    )
+    parser.add_argument("pool", help="Name of the pool")
+    parser.add_argument(
+        "trace",
+        nargs="?",
+        help="Trace file with a JSON object per line (- for stdin)",
+    )
+    return COMMAND
+
+
+def record_trace(store, pool):
+    """Return the trace of the commands of a pool that have a result."""
+    trace = []
+    d = os.path.dirname(store.result_path(pool, 0))
+    if not os.path.exists(d):
+        return trace
+    for idx in sorted(int(name) for name in os.listdir(d) if name.isdigit()):
+        result = store.result(pool, idx)
+        if not result or result.get("start") is None or result.get("requeued"):
+            continue
+        booked = [p for res, p in result.get("booked") or []]
+        entry = {
+            "submit": result.get("queued_at", result["start"]),
+            "duration": result["end"] - result["start"],
+            "priority": result.get("priority", 0),
+            "count": result.get("count", booked.count(pool) or 1),
+            "extra_pools": result.get("extra_pools", [p for p in booked if p != pool]),
+        }
+        for key in ("cmd", "wd", "timeout", "selector"):
+            if result.get(key):
+                entry[key] = result[key]
+        trace.append(entry)
+    return sorted(trace, key=lambda entry: entry["submit"])
+
+
+def load_trace(lines):
+    """Parse the lines of a trace file.
+
+    Raise ValueError if an entry is invalid.
+    """
+    trace = []
+    for num, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            entry["submit"] = float(entry["submit"])
+            entry["duration"] = float(entry["duration"])
+            if entry.get("timeout") is not None:
+                entry["timeout"] = lib.parse_duration(entry["timeout"])
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError("invalid trace entry at line %d: %s" % (num, e))
+        if entry["duration"] < 0:
+            raise ValueError("negative duration at line %d" % num)
+        trace.append(entry)
+    return sorted(trace, key=lambda entry: entry["submit"])
+
+
+def copy_pools(store, sim, pools, config, resources=0):
+    """Copy the resources and settings of pools from store to sim.
+
+    The first pool gets config as settings and resources more resources.
+    """
+    for pool in pools:
+        sim.add_pool(pool)
+        labels = store.labels(pool)
+        names = store.resources(pool)
+        pool_config = dict(store.config(pool))
+        if pool == pools[0]:
+            names += ["simulated%d" % num for num in range(1, resources + 1)]
+            pool_config = dict(config)
+        for name in names:
+            sim.add_resource(pool, name, labels.get(name))
+        for key in IGNORED_SETTINGS:
+            pool_config.pop(key, None)
+        sim.set_config(pool, pool_config)
+        sim.set_state(pool, "durations", store.state(pool, "durations"))
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of sorted values."""
+    return values[max(int(math.ceil(pct / 100.0 * len(values))) - 1, 0)]
+
+
+def simulate(store, pool, trace):
+    """Replay a trace on a pool of store and return the report as a dict.
+
+    store must be a scratch backend: the commands are queued, started
+    and finished on a virtual clock starting at the first submit time.
+    """
+    config = store.config(pool)
+    backfill = config.get("backfill", False)
+    runs = {}
+    running = []
+    waits = []
+    busy = {}
+    timeouts = 0
+    pos = 0
+    start = now = trace[0]["submit"] if trace else 0
+    end = start
+    while True:
+        # finish the commands ending now
+        while running and running[0][0] <= now:
+            job_end, idx, killed = heapq.heappop(running)
+            data = store.job(pool, idx)[1]
+            if not killed:
+                policy.record_duration(store, pool, data, job_end - data["start"])
+            store.finish(pool, idx)
+            store.free_resources(data["booked"])
+            end = max(end, job_end)
+        # queue the commands submitted now
+        while pos < len(trace) and trace[pos]["submit"] <= now:
+            entry = trace[pos]
+            pos += 1
+            data = api.new_entry(
+                entry.get("cmd", ["@RESOURCE"]),
+                entry.get("wd", "/"),
+                entry.get("priority", 0),
+                entry.get("extra_pools", []),
+                entry.get("count", 1),
+                user=entry.get("user", "simulate"),
+                timeout=entry.get("timeout"),
+                selector=entry.get("selector"),
+            )
+            data["queued_at"] = entry["submit"]
+            runs[store.schedule(pool, data, force=True)] = entry
+        # start the commands that can run now
+        jobs = run_cmd.candidates(store, pool, config, backfill, now)
+        for idx, data, booked in run_cmd.select(
+            store, pool, config, jobs, backfill, [], now
+        ):
+            run_cmd.start(store, pool, idx, data, booked, now)
+            entry = runs.pop(idx)
+            duration = entry["duration"]
+            killed = data["timeout"] is not None and duration > data["timeout"]
+            if killed:
+                duration = data["timeout"]
+                timeouts += 1
+            waits.append(now - data["queued_at"])
+            for res, p in booked:
+                busy[p] = busy.get(p, 0) + duration
+            heapq.heappush(running, (now + duration, idx, killed))
+        events = [running[0][0]] if running else []
+        if pos < len(trace):
+            events.append(trace[pos]["submit"])
+        if not events:
+            break
+        now = min(events)
+
+    makespan = end - start
+    waits.sort()
+    report = {
+        "pool": pool,
+        "commands": len(trace),
+        "not_started": len(runs),
+        "timeouts": timeouts,
+        "makespan": makespan,
+        "wait": {},
+        "utilization": {},
+    }
+    if waits:
+        for pct in PERCENTILES:
+            report["wait"]["p%d" % pct] = percentile(waits, pct)
+        report["wait"]["max"] = waits[-1]
+    for p in sorted(busy):
+        capacity = len(store.resources(p)) * makespan
+        report["utilization"][p] = busy[p] / capacity if capacity else 0
+    return report
+
+
+def display_report(report):
+    print("Simulated %d commands on the %s pool" % (report["commands"], report["pool"]))
+    if report["not_started"]:
+        print("Commands never started: %d" % report["not_started"])
+    if report["timeouts"]:
+        print("Commands stopped by their timeout: %d" % report["timeouts"])
+    if report["wait"]:
+        print(
+            "Wait: %s"
+            % ", ".join(
+                "%s %s" % (name, lib.format_duration(value))
+                for name, value in report["wait"].items()
+            )
+        )
+    for p, value in report["utilization"].items():
+        print("Utilization of the %s pool: %.1f%%" % (p, value * 100))
+    print("Makespan: %s" % lib.format_duration(report["makespan"]))
+
+
+def execute_command(args):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
+        return 1
+
+    if args.record:
+        for entry in record_trace(store, args.pool):
+            print(json.dumps(entry, sort_keys=True))
+        return 0
+
+    try:
+        if args.trace is None:
+            trace = record_trace(store, args.pool)
+        elif args.trace == "-":
+            trace = load_trace(sys.stdin)
+        else:
+            with open(args.trace) as f:
+                trace = load_trace(f)
+        config = dict(store.config(args.pool))
+        for setting in args.settings:
+            config_cmd.apply_setting(config, setting)
+    except (ValueError, OSError) as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+
+    pools = [args.pool]
+    for entry in trace:
+        for extra in entry.get("extra_pools", []):
+            if extra not in pools:
+                if not store.check_pool(extra):
+                    return 1
+                pools.append(extra)
+
+    log.info("Simulating %d commands on %s" % (len(trace), args.pool))
+    with tempfile.TemporaryDirectory(prefix="dci-queue-simulate-") as top_dir:
+        sim = sqlite_backend.SqliteBackend(top_dir, ":memory:")
+        copy_pools(store, sim, pools, config, args.resources)
+        # the scheduling decisions of the simulation are not logged
+        logging.disable(logging.INFO)
+        try:
+            report = simulate(sim, args.pool, trace)
+        finally:
+            logging.disable(logging.NOTSET)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        display_report(report)
+    return 0
+
+
+# simulate_cmd.py ends here
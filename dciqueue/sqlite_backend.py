@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""SQLite storage backend.
+
+All the pools of a top directory are stored in one database. Every
+operation is a single transaction so concurrent dci-queue processes
+don't need the lock files used by the dir backend.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+
+from dciqueue.backend import DB_NAME, EXECUTING, QUEUED, Backend
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pools (
+    name TEXT PRIMARY KEY,
+    next INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS resources (
+    pool TEXT NOT NULL REFERENCES pools(name) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    available INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (pool, name)
+);
+CREATE INDEX IF NOT EXISTS resources_available ON resources (pool, available);
+CREATE TABLE IF NOT EXISTS labels (
+    pool TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (pool, resource, key),
+    FOREIGN KEY (pool, resource) REFERENCES resources(pool, name) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS labels_value ON labels (pool, key, value);
+CREATE TABLE IF NOT EXISTS reasons (
+    pool TEXT NOT NULL REFERENCES pools(name) ON DELETE CASCADE,
+    resource TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (pool, resource)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    pool TEXT NOT NULL REFERENCES pools(name) ON DELETE CASCADE,
+    id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    wd TEXT NOT NULL,
+    cmd TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (pool, id)
+);
+CREATE INDEX IF NOT EXISTS jobs_priority ON jobs (pool, state, priority DESC, id);
+CREATE INDEX IF NOT EXISTS jobs_wd ON jobs (pool, wd);
+CREATE INDEX IF NOT EXISTS jobs_cmd ON jobs (pool, cmd, wd);
+CREATE TABLE IF NOT EXISTS state (
+    pool TEXT NOT NULL REFERENCES pools(name) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (pool, name)
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    pool TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    job_pool TEXT NOT NULL,
+    job_id INTEGER NOT NULL,
+    PRIMARY KEY (pool, resource)
+);
+"""
+
+
+def encode_cmd(cmd):
+    return json.dumps(cmd, separators=(",", ":"))
+
+
+class SqliteBackend(Backend):
+    name = "sqlite"
+
+    def __init__(self, top_dir, path=None):
+        super(SqliteBackend, self).__init__(top_dir)
+        self.path = path or os.path.join(top_dir, DB_NAME)
+        # autocommit mode: transactions are started explicitly
+        self.conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        if self.path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Run the enclosed statements in a write transaction."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def query(self, sql, *params):
+        return self.conn.execute(sql, params).fetchall()
+
+    def watch(self, pools):
+        # writes to the database are appended to the WAL file
+        return [os.path.dirname(os.path.abspath(self.path))], (
+            os.path.basename(self.path) + "-wal",
+        )
+
+    # pools
+
+    def pools(self):
+        return [row[0] for row in self.query("SELECT name FROM pools ORDER BY name")]
+
+    def missing_pool(self, pool):
+        if not self.query("SELECT 1 FROM pools WHERE name = ?", pool):
+            return "Pool %s doesn't exist. Use add-pool to create it." % (pool,)
+        return None
+
+    def add_pool(self, pool):
+        super(SqliteBackend, self).add_pool(pool)
+        with self.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO pools (name) VALUES (?)", (pool,))
+
+    def remove_pool(self, pool):
+        super(SqliteBackend, self).remove_pool(pool)
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM bookings WHERE job_pool = ?", (pool,))
+            conn.execute("DELETE FROM pools WHERE name = ?", (pool,))
+
+    def state(self, pool, name):
+        rows = self.query(
+            "SELECT data FROM state WHERE pool = ? AND name = ?", pool, name
+        )
+        return json.loads(rows[0][0]) if rows else {}
+
+    def set_state(self, pool, name, value):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO state (pool, name, data) VALUES (?, ?, ?)",
+                (pool, name, json.dumps(value)),
+            )
+
+    def update_state(self, pool, name, func):
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM state WHERE pool = ? AND name = ?", (pool, name)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO state (pool, name, data) VALUES (?, ?, ?)",
+                (pool, name, json.dumps(func(json.loads(row[0]) if row else {}))),
+            )
+
+    # resources
+
+    def resources(self, pool):
+        return [
+            row[0]
+            for row in self.query(
+                "SELECT name FROM resources WHERE pool = ? ORDER BY name", pool
+            )
+        ]
+
+    def has_resource(self, pool, name):
+        return (
+            self.query(
+                "SELECT 1 FROM resources WHERE pool = ? AND name = ?", pool, name
+            )
+            != []
+        )
+
+    def labels(self, pool):
+        labels = {name: {} for name in self.resources(pool)}
+        for res, key, value in self.query(
+            "SELECT resource, key, value FROM labels WHERE pool = ?", pool
+        ):
+            labels[res][key] = value
+        return labels
+
+    def available(self, pool):
+        return [
+            row[0]
+            for row in self.query(
+                "SELECT name FROM resources WHERE pool = ? AND available = 1"
+                " ORDER BY name",
+                pool,
+            )
+        ]
+
+    def has_available(self, pool):
+        return (
+            self.query(
+                "SELECT 1 FROM resources WHERE pool = ? AND available = 1 LIMIT 1",
+                pool,
+            )
+            != []
+        )
+
+    def add_resource(self, pool, name, labels=None):
+        with self.transaction() as conn:
+            # an existing resource keeps its state: unavailable means booked
+            if not conn.execute(
+                "SELECT 1 FROM resources WHERE pool = ? AND name = ?", (pool, name)
+            ).fetchall():
+                booked = conn.execute(
+                    "SELECT 1 FROM bookings WHERE pool = ? AND resource = ?",
+                    (pool, name),
+                ).fetchall()
+                conn.execute(
+                    "INSERT INTO resources (pool, name, available) VALUES (?, ?, ?)",
+                    (pool, name, 0 if booked else 1),
+                )
+            conn.execute(
+                "DELETE FROM reasons WHERE pool = ? AND resource = ?", (pool, name)
+            )
+            if labels is not None:
+                conn.execute(
+                    "DELETE FROM labels WHERE pool = ? AND resource = ?", (pool, name)
+                )
+                conn.executemany(
+                    "INSERT INTO labels (pool, resource, key, value)"
+                    " VALUES (?, ?, ?, ?)",
+                    [(pool, name, key, value) for key, value in labels.items()],
+                )
+
+    def remove_resource(self, pool, name, reason=None):
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM resources WHERE pool = ? AND name = ?", (pool, name)
+            )
+            if reason is None:
+                conn.execute(
+                    "DELETE FROM reasons WHERE pool = ? AND resource = ?",
+                    (pool, name),
+                )
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO reasons (pool, resource, data)"
+                    " VALUES (?, ?, ?)",
+                    (pool, name, json.dumps(reason)),
+                )
+
+    def reasons(self, pool):
+        return [
+            json.loads(row[0])
+            for row in self.query(
+                "SELECT data FROM reasons WHERE pool = ? ORDER BY resource", pool
+            )
+        ]
+
+    def book_set(self, wanted, prefer=None, selectors=None):
+        prefer = prefer or {}
+        selectors = selectors or {}
+        booked = []
+        with self.transaction() as conn:
+            # check everything before updating anything
+            for pool, count in wanted:
+                sql = "SELECT name FROM resources WHERE pool = ? AND available = 1"
+                params = [pool]
+                # the labels table is the index from the labels to the resources
+                for key, value in sorted(selectors.get(pool, {}).items()):
+                    sql += (
+                        " AND name IN (SELECT resource FROM labels"
+                        " WHERE pool = ? AND key = ? AND value = ?)"
+                    )
+                    params += [pool, key, value]
+                names = [row[0] for row in conn.execute(sql + " ORDER BY name", params)]
+                preferred = [name for name in prefer.get(pool, ()) if name in names]
+                names = preferred + [name for name in names if name not in preferred]
+                if len(names) < count:
+                    return None
+                booked += [(name, pool) for name in names[:count]]
+            conn.executemany(
+                "UPDATE resources SET available = 0 WHERE pool = ? AND name = ?",
+                [(pool, res) for res, pool in booked],
+            )
+        log.debug("Booked %s" % booked)
+        return booked
+
+    def free(self, pool, res):
+        with self.transaction() as conn:
+            # the resource stays unavailable if it has been removed during run
+            conn.execute(
+                "UPDATE resources SET available = 1 WHERE pool = ? AND name = ?",
+                (pool, res),
+            )
+            conn.execute(
+                "DELETE FROM bookings WHERE pool = ? AND resource = ?", (pool, res)
+            )
+        log.debug("Freed %s in pool %s" % (res, pool))
+
+    # commands
+
+    def seq(self, pool):
+        row = self.query(
+            "SELECT MIN(id) FROM jobs WHERE pool = ? AND state = ?", pool, QUEUED
+        )
+        next = self.query("SELECT next FROM pools WHERE name = ?", pool)[0][0]
+        return row[0][0] or next, next
+
+    def schedule_many(self, pool, entries, force=False):
+        ids = []
+        with self.transaction() as conn:
+            idx = conn.execute(
+                "SELECT next FROM pools WHERE name = ?", (pool,)
+            ).fetchone()[0]
+            for data in entries:
+                if (
+                    not force
+                    and conn.execute(
+                        "SELECT 1 FROM jobs WHERE pool = ? AND cmd = ? AND wd = ?",
+                        (pool, encode_cmd(data["cmd"]), data["wd"]),
+                    ).fetchall()
+                ):
+                    ids.append(None)
+                    continue
+                self.insert_job(conn, pool, idx, QUEUED, data)
+                ids.append(idx)
+                idx += 1
+        return ids
+
+    def insert_job(self, conn, pool, idx, state, data):
+        conn.execute(
+            "INSERT INTO jobs (pool, id, state, priority, wd, cmd, data)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                pool,
+                idx,
+                state,
+                data.get("priority", 0),
+                data["wd"],
+                encode_cmd(data["cmd"]),
+                json.dumps(data),
+            ),
+        )
+        conn.execute(
+            "UPDATE pools SET next = MAX(next, ?) WHERE name = ?", (idx + 1, pool)
+        )
+
+    def jobs(self, pool):
+        return [
+            (row[0], row[1], json.loads(row[2]))
+            for row in self.query(
+                "SELECT id, state, data FROM jobs WHERE pool = ? ORDER BY id", pool
+            )
+        ]
+
+    def job(self, pool, idx):
+        rows = self.query(
+            "SELECT state, data FROM jobs WHERE pool = ? AND id = ?", pool, idx
+        )
+        if not rows:
+            return None, None
+        return rows[0][0], json.loads(rows[0][1])
+
+    def search(self, pool, cmd):
+        return [
+            row[0]
+            for row in self.query(
+                "SELECT id FROM jobs WHERE pool = ? AND cmd = ? ORDER BY id",
+                pool,
+                encode_cmd(cmd),
+            )
+        ]
+
+    def searchdir(self, pool, wd):
+        rows = self.query(
+            "SELECT id FROM jobs WHERE pool = ? AND wd = ? ORDER BY id LIMIT 1",
+            pool,
+            wd,
+        )
+        return rows[0][0] if rows else None
+
+    def queued(self, pool):
+        return [
+            (row[0], json.loads(row[1]))
+            for row in self.query(
+                "SELECT id, data FROM jobs WHERE pool = ? AND state = ?"
+                " ORDER BY priority DESC, id",
+                pool,
+                QUEUED,
+            )
+        ]
+
+    def executing(self, pool):
+        return [
+            (row[0], json.loads(row[1]))
+            for row in self.query(
+                "SELECT id, data FROM jobs WHERE pool = ? AND state = ? ORDER BY id",
+                pool,
+                EXECUTING,
+            )
+        ]
+
+    def peek(self, pool):
+        rows = self.query(
+            "SELECT id, data FROM jobs WHERE pool = ? AND state = ?"
+            " ORDER BY priority DESC, id LIMIT 1",
+            pool,
+            QUEUED,
+        )
+        if not rows:
+            return None, None
+        return rows[0][0], json.loads(rows[0][1])
+
+    def take(self, pool, idx=None):
+        with self.transaction() as conn:
+            if idx is None:
+                row = conn.execute(
+                    "SELECT id, data FROM jobs WHERE pool = ? AND state = ?"
+                    " ORDER BY priority DESC, id LIMIT 1",
+                    (pool, QUEUED),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT id, data FROM jobs WHERE pool = ? AND state = ? AND id = ?",
+                    (pool, QUEUED, idx),
+                ).fetchone()
+            if row is None:
+                return None, None
+            conn.execute(
+                "UPDATE jobs SET state = ? WHERE pool = ? AND id = ?",
+                (EXECUTING, pool, row[0]),
+            )
+        return row[0], json.loads(row[1])
+
+    def update(self, pool, idx, data):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET data = ? WHERE pool = ? AND id = ?",
+                (json.dumps(data), pool, idx),
+            )
+            for res, res_pool in data.get("booked", []):
+                conn.execute(
+                    "INSERT OR REPLACE INTO bookings"
+                    " (pool, resource, job_pool, job_id) VALUES (?, ?, ?, ?)",
+                    (res_pool, res, pool, idx),
+                )
+
+    def heartbeat(self, pool, idx, now):
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM jobs WHERE pool = ? AND id = ? AND state = ?",
+                (pool, idx, EXECUTING),
+            ).fetchone()
+            data = json.loads(row[0]) if row else {}
+            if "lease" not in data:
+                return False
+            data["lease"]["heartbeat"] = now
+            conn.execute(
+                "UPDATE jobs SET data = ? WHERE pool = ? AND id = ?",
+                (json.dumps(data), pool, idx),
+            )
+        return True
+
+    def finish(self, pool, idx):
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE pool = ? AND id = ? AND state = ?",
+                (pool, idx, EXECUTING),
+            )
+
+    def unschedule(self, pool, idx):
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT state, data FROM jobs WHERE pool = ? AND id = ?", (pool, idx)
+            ).fetchone()
+            if row is None:
+                return None, None
+            if row[0] == QUEUED:
+                conn.execute("DELETE FROM jobs WHERE pool = ? AND id = ?", (pool, idx))
+        return row[0], json.loads(row[1])
+
+    def import_seq(self, pool, next):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE pools SET next = MAX(next, ?) WHERE name = ?", (next, pool)
+            )
+
+    def import_job(self, pool, idx, state, data):
+        with self.transaction() as conn:
+            self.insert_job(conn, pool, idx, state, data)
+            for res, res_pool in data.get("booked", []):
+                conn.execute(
+                    "INSERT OR REPLACE INTO bookings"
+                    " (pool, resource, job_pool, job_id) VALUES (?, ?, ?, ?)",
+                    (res_pool, res, pool, idx),
+                )
+
+
+# sqlite_backend.py ends here
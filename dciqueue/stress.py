@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+"""Stress test of dci-queue with concurrent processes.
+
+Run with python -m dciqueue.stress. Schedulers, runners and
+unschedulers are started as separate processes on one pool of a
+temporary top directory. Each command claims its resource by creating
+a directory named after it, so a resource given to two commands at the
+same time is detected, and records its run. Once all the commands are
+finished, the following invariants are checked:
+
+- no resource was used by two commands at the same time
+- every command ran exactly once or was unscheduled
+- all the resources are available again and the queue is empty
+
+The report is printed as JSON with the lock waits, the latencies of
+the operations and the throughput. The exit code is 1 if an invariant
+is broken, and the top directory is then kept for inspection.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import time
+
+from dciqueue import api, backend, lib, run_cmd
+
+POOL = "pool"
+# a command claims its resource for duration seconds and records its run
+SCRIPT = (
+    "mkdir claims/@RESOURCE 2>/dev/null || echo @RESOURCE >> doubles; "
+    "echo %s >> runs; sleep %s; rmdir claims/@RESOURCE 2>/dev/null; true"
+)
+
+
+def instrument(stats):
+    """Record the time spent waiting for the locks of the dir backend."""
+    for cls in (lib.Seq, lib.Availability):
+
+        def lock(self, original=cls.lock, name="%s.lock" % cls.__name__):
+            start = time.perf_counter()
+            original(self)
+            stats.setdefault(name, []).append(time.perf_counter() - start)
+
+        cls.lock = lock
+
+
+def timed(stats, name, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    stats.setdefault(name, []).append(time.perf_counter() - start)
+    return result
+
+
+def connect(opts):
+    return api.Queue(
+        backend.get(argparse.Namespace(top_dir=opts.top_dir, backend=opts.backend))
+    )
+
+
+def scheduler(opts, num, results):
+    stats = {}
+    instrument(stats)
+    queue = connect(opts)
+    ids = []
+    for count in range(opts.jobs):
+        token = "s%d-%d" % (num, count)
+        cmd = ["sh", "-c", SCRIPT % (token, opts.duration)]
+        idx = timed(stats, "schedule", queue.schedule, POOL, cmd, wd=opts.work_dir)
+        ids.append((idx, token))
+    results.put(("scheduler", stats, ids))
+
+
+def runner(opts, num, done, results):
+    """Dispatch the commands like overlapping dci-queue run processes."""
+    stats = {}
+    instrument(stats)
+    args = argparse.Namespace(
+        top_dir=opts.top_dir,
+        backend=opts.backend,
+        coordinator=None,
+        pool=POOL,
+        command_output=False,
+    )
+    store = connect(opts).store
+    commands = []
+    while True:
+        timed(stats, "dispatch", run_cmd.dispatch, args, commands)
+        if commands:
+            pid, status = run_cmd.wait_child(commands)
+            run_cmd.reap(commands, pid, status)
+        elif done.is_set() and not store.queued(POOL):
+            break
+        else:
+            time.sleep(0.01)
+    results.put(("runner", stats, []))
+
+
+def unscheduler(opts, num, done, results):
+    stats = {}
+    instrument(stats)
+    queue = connect(opts)
+    rand = random.Random(num)
+    while not done.is_set():
+        queued = queue.store.queued(POOL)
+        if queued and rand.random() < opts.unschedule_ratio:
+            idx = rand.choice(queued)[0]
+            timed(stats, "unschedule", queue.unschedule, POOL, idx)
+        time.sleep(0.01)
+    results.put(("unscheduler", stats, []))
+
+
+def summary(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "median_ms": round(statistics.median(values) * 1000, 3),
+        "p99_ms": round(values[int(0.99 * (len(values) - 1))] * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+        "total_s": round(sum(values), 3),
+    }
+
+
+def read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return f.read().split()
+
+
+def check(opts, ids):
+    """Return the outcome of the commands and the broken invariants."""
+    store = connect(opts).store
+    runs = read_lines(os.path.join(opts.work_dir, "runs"))
+    outcome = {"ran": 0, "unscheduled": 0}
+    errors = []
+    for resource in sorted(set(read_lines(os.path.join(opts.work_dir, "doubles")))):
+        errors.append("resource %s used by two commands" % resource)
+    for idx, token in ids:
+        result = store.result(POOL, idx)
+        count = runs.count(token)
+        if result is None:
+            errors.append("command %d lost" % idx)
+        elif result.get("error") == "unscheduled" or result.get("rc") == (
+            128 + signal.SIGTERM
+        ):
+            outcome["unscheduled"] += 1
+        elif result.get("rc") != 0:
+            errors.append("command %d failed: %s" % (idx, result))
+        elif count != 1:
+            errors.append("command %d ran %d times" % (idx, count))
+        else:
+            outcome["ran"] += 1
+    if store.queued(POOL) or store.executing(POOL):
+        errors.append("commands left in the pool")
+    missing = set(store.resources(POOL)) - set(store.available(POOL))
+    if missing:
+        errors.append("resources not freed: %s" % " ".join(sorted(missing)))
+    return outcome, errors
+
+
+def stress(opts):
+    """Run the workers and return the report."""
+    store = connect(opts).store
+    store.add_pool(POOL)
+    for num in range(opts.resources):
+        store.add_resource(POOL, "res%d" % num)
+    os.makedirs(os.path.join(opts.work_dir, "claims"))
+
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    done = ctx.Event()
+    schedulers = [
+        ctx.Process(target=scheduler, args=(opts, num, results))
+        for num in range(opts.schedulers)
+    ]
+    others = [
+        ctx.Process(target=runner, args=(opts, num, done, results))
+        for num in range(opts.runners)
+    ] + [
+        ctx.Process(target=unscheduler, args=(opts, num, done, results))
+        for num in range(opts.unschedulers)
+    ]
+    start = time.perf_counter()
+    for proc in schedulers + others:
+        proc.start()
+    reports = []
+    for _ in schedulers:
+        reports.append(results.get())
+    done.set()
+    for _ in others:
+        reports.append(results.get())
+    for proc in schedulers + others:
+        proc.join()
+    elapsed = time.perf_counter() - start
+
+    stats = {}
+    ids = []
+    for role, worker_stats, worker_ids in reports:
+        for name, values in worker_stats.items():
+            stats.setdefault(name, []).extend(values)
+        ids.extend(worker_ids)
+    outcome, errors = check(opts, ids)
+    return {
+        "params": {
+            "backend": opts.backend or backend.get_default_backend(opts.top_dir),
+            "schedulers": opts.schedulers,
+            "runners": opts.runners,
+            "unschedulers": opts.unschedulers,
+            "jobs": opts.jobs,
+            "resources": opts.resources,
+            "duration": opts.duration,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "throughput": round(outcome["ran"] / elapsed, 3),
+        "commands": outcome,
+        "operations": {name: summary(values) for name, values in sorted(stats.items())},
+        "errors": errors,
+    }
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        prog="python -m dciqueue.stress",
+        description="Stress test of dci-queue with concurrent processes",
+    )
+    parser.add_argument("-s", "--schedulers", type=int, default=4)
+    parser.add_argument("-r", "--runners", type=int, default=2)
+    parser.add_argument("-u", "--unschedulers", type=int, default=1)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=50, help="Commands per scheduler"
+    )
+    parser.add_argument(
+        "-R", "--resources", type=int, default=4, help="Resources of the pool"
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        default=0.05,
+        help="Duration of the commands in seconds",
+    )
+    parser.add_argument(
+        "--unschedule-ratio",
+        type=float,
+        default=0.2,
+        help="Probability for an unscheduler to remove a command when it looks",
+    )
+    parser.add_argument("-b", "--backend", choices=backend.LOCAL_BACKENDS)
+    parser.add_argument(
+        "-k", "--keep", action="store_true", help="Keep the top directory"
+    )
+    opts = parser.parse_args(argv)
+
+    opts.top_dir = tempfile.mkdtemp(prefix="dci-queue-stress-")
+    opts.work_dir = os.path.join(opts.top_dir, "work")
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(process)s - %(name)s - %(levelname)s - %(message)s",
+        filename=os.path.join(opts.top_dir, "dci-queue.log"),
+    )
+    report = stress(opts)
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if opts.keep or report["errors"]:
+        sys.stderr.write("Top directory kept in %s\n" % opts.top_dir)
+    else:
+        shutil.rmtree(opts.top_dir)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# stress.py ends here
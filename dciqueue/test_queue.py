@@ -13,18 +13,26 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 
+import argparse
+import gzip
 import io
 import json
 import os
 import shutil
+import signal
+import subprocess
+import sys
 import tempfile
+import threading
 import time
 import unittest
 import uuid
 from contextlib import redirect_stdout
 from unittest.mock import patch
 
-from dciqueue import lib, main, run_cmd
+from dciqueue import affinity, api, backend, benchmark, coordinator_cmd, health, lib
+from dciqueue import http_backend, joblog, main, policy, run_cmd, sqlite_backend
+from dciqueue import stress
 
 
 class TestQueue(unittest.TestCase):
@@ -80,6 +88,69 @@ class TestQueue(unittest.TestCase):
             main.set_umask()
             patched_umask.assert_not_called()
 
+    def test_lazy_commands(self):
+        modules = set(
+            name[:-3]
+            for name in os.listdir(os.path.dirname(main.__file__))
+            if name.endswith("_cmd.py")
+        )
+        self.assertEqual(set(main.COMMANDS.values()), modules)
+        self.assertEqual(main.find_command(["-t", "/tmp", "list", "8nodes"]), "list")
+        self.assertEqual(main.find_command(["--backend", "sqlite", "run"]), "run")
+        self.assertIsNone(main.find_command(["-h"]))
+        self.assertIsNone(main.find_command(["unknown"]))
+        # only the modules imported by list_cmd itself are loaded
+        script = (
+            "import sys; from dciqueue import %s; "
+            "%s; "
+            "print(sorted(m for m in sys.modules if m.endswith('_cmd')))"
+        )
+        outputs = [
+            subprocess.check_output(
+                [sys.executable, "-c", script % (module, call), self.queue_dir]
+            )
+            .decode("utf-8")
+            .splitlines()[-1]
+            for module, call in (
+                ("list_cmd", "pass"),
+                ("main", "main.main(['dci-queue', '-t', sys.argv[1], 'list'])"),
+            )
+        ]
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertNotIn("coordinator_cmd", outputs[1])
+
+    def test_benchmark(self):
+        argv = ["-n", "2", "-q", "3", "-r", "2", "-b", "dir", "commands"]
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(benchmark.main(argv), 0)
+            output = buf.getvalue()
+        records = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(
+            [record["benchmark"] for record in records],
+            ["list", "search", "searchdir", "schedule", "run"],
+        )
+        self.assertEqual(
+            records[0]["params"], {"backend": "dir", "queued": 3, "resources": 2}
+        )
+        path = os.path.join(self.queue_dir, "baseline.jsonl")
+        with open(path, "w") as f:
+            f.write(output)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(benchmark.main(["-c", path] + argv), 0)
+            records = [json.loads(line) for line in buf.getvalue().splitlines()]
+        self.assertIn("change_pct", records[0])
+        benchmark.baseline.clear()
+
+    def test_stress(self):
+        argv = ["-s", "2", "-j", "5", "-r", "2", "-u", "1", "-d", "0.01"]
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(stress.main(argv), 0)
+            report = json.loads(buf.getvalue())
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(sum(report["commands"].values()), 10)
+        self.assertEqual(report["operations"]["schedule"]["count"], 10)
+        self.assertIn("Seq.lock", report["operations"])
+
     def test_add_pool(self):
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
@@ -279,6 +350,49 @@ class TestQueue(unittest.TestCase):
         for seq in ("1", "2"):
             self.file_exists("queue", "8nodes", seq)
 
+    def test_schedule_from_file(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "4nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE"]), 0
+        )
+        path = os.path.join(self.queue_dir, "cmds.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps({"cmd": ["echo", "@RESOURCE"]}) + "\n")
+            f.write(json.dumps({"cmd": ["ls", "@RESOURCE"], "priority": 2}) + "\n")
+            f.write("\n")
+            f.write(
+                json.dumps(
+                    {
+                        "cmd": ["ls", "@RESOURCE"],
+                        "wd": "/tmp",
+                        "extra_pools": ["4nodes"],
+                    }
+                )
+                + "\n"
+            )
+            f.write(json.dumps({"cmd": ["ls", "@RESOURCE"]}) + "\n")
+        out = io.StringIO()
+        with redirect_stdout(out):
+            rc = main.main(["dci-queue", "schedule", "--from-file", path, "8nodes"])
+        self.assertEqual(rc, 0)
+        self.assertEqual(out.getvalue().split(), ["-", "2", "3", "-"])
+        data = json.load(open(os.path.join(self.queue_dir, "queue", "8nodes", "2")))
+        self.assertEqual(data["priority"], 2)
+        self.assertEqual(data["wd"], os.getcwd())
+        data = json.load(open(os.path.join(self.queue_dir, "queue", "8nodes", "3")))
+        self.assertEqual(data["wd"], "/tmp")
+        self.assertEqual(data["extra_pools"], ["4nodes"])
+        self.assertEqual(backend.DirBackend(self.queue_dir).peek("8nodes")[0], 2)
+        # nothing is queued when an entry is invalid
+        with open(path, "w") as f:
+            f.write(json.dumps({"cmd": ["uptime"]}) + "\n")
+            f.write(json.dumps({"cmd": ["echo", "@RESOURCE"], "wd": "/"}) + "\n")
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "--from-file", path, "8nodes"]), 1
+        )
+        self.doesnt_exist("queue", "8nodes", "4")
+
     def test_schedule_remove(self):
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
         self.assertEqual(
@@ -309,6 +423,48 @@ class TestQueue(unittest.TestCase):
             1,
         )
 
+    def test_wait(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "wait", "8nodes", "1"]), 1)
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "exit 3 # @RESOURCE",
+                ]
+            ),
+            0,
+        )
+        # the command is executed by another process
+        proc = subprocess.Popen(
+            ["bash", "-c", "sleep 1; exec dci-queue run 8nodes"],
+        )
+        start = time.time()
+        self.assertEqual(main.main(["dci-queue", "wait", "8nodes", "1"]), 3)
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(proc.wait(), 0)
+        with open(os.path.join(self.queue_dir, "result", "8nodes", "1")) as f:
+            result = json.load(f)
+        self.assertEqual(result["rc"], 3)
+        self.assertEqual(result["resource"], "cluster4")
+        self.assertLessEqual(result["start"], result["end"])
+        # results are kept once the command is finished
+        self.assertEqual(main.main(["dci-queue", "wait", "8nodes", "1"]), 3)
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "wait", "-t", "1", "8nodes", "2"]), 1)
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "2"]), 0)
+        self.assertEqual(main.main(["dci-queue", "wait", "8nodes", "2"]), 1)
+
     def test_run(self):
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
         self.assertEqual(
@@ -347,13 +503,511 @@ class TestQueue(unittest.TestCase):
             ),
             0,
         )
-        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "--once", "8nodes"]), 0)
         self.file_exists("queue", "8nodes", "1")
         self.doesnt_exist("queue", "8nodes", "2")
         self.file_exists("queue", "8nodes", "3")
         self.file_exists("available", "8nodes", "cluster4")
-        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "run", "--once", "8nodes"]), 0)
         self.doesnt_exist("queue", "8nodes", "3")
+        self.file_exists("queue", "8nodes", "1")
+
+    def test_run_redispatch(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        for name in ("first", "second", "third"):
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE", name]
+                ),
+                0,
+            )
+        # the commands are started one after the other by the same process
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        for idx in (1, 2, 3):
+            self.doesnt_exist("queue", "8nodes", str(idx))
+            self.file_exists("result", "8nodes", str(idx))
+        self.file_exists("available", "8nodes", "cluster4")
+
+    def test_priority_index(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for pri, arg in (("0", "low"), ("3", "high"), ("1", "medium")):
+            self.assertEqual(
+                main.main(
+                    [
+                        "dci-queue",
+                        "schedule",
+                        "-p",
+                        pri,
+                        "8nodes",
+                        "echo",
+                        "@RESOURCE",
+                        arg,
+                    ]
+                ),
+                0,
+            )
+        self.file_exists("queue", "8nodes", ".idx")
+        store = backend.DirBackend(self.queue_dir)
+        self.assertEqual(store.peek("8nodes")[0], 2)
+        # the index is rebuilt when missing
+        os.unlink(os.path.join(self.queue_dir, "queue", "8nodes", ".idx"))
+        self.assertEqual(store.peek("8nodes")[0], 2)
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "2"]), 0)
+        self.assertEqual(store.peek("8nodes")[0], 3)
+        # entries removed behind the index back are skipped
+        os.unlink(os.path.join(self.queue_dir, "queue", "8nodes", "3"))
+        self.assertEqual(store.take("8nodes")[0], 1)
+        self.assertEqual(store.peek("8nodes"), (None, None))
+
+    def test_hash_index(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        store = backend.DirBackend(self.queue_dir)
+        data = {"cmd": ["echo", "@RESOURCE"], "wd": "/tmp"}
+        self.assertEqual(store.schedule("8nodes", dict(data)), 1)
+        self.file_exists("queue", "8nodes", ".hash")
+        self.assertIsNone(store.schedule("8nodes", dict(data)))
+        # the index is rebuilt when missing
+        os.unlink(os.path.join(self.queue_dir, "queue", "8nodes", ".hash"))
+        self.assertIsNone(store.schedule("8nodes", dict(data)))
+        # executing commands are still duplicates until they finish
+        self.assertEqual(store.take("8nodes")[0], 1)
+        self.assertIsNone(store.schedule("8nodes", dict(data)))
+        store.finish("8nodes", 1)
+        self.assertEqual(store.schedule("8nodes", dict(data)), 2)
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "2"]), 0)
+        self.assertEqual(store.schedule("8nodes", dict(data)), 3)
+        # entries removed behind the index back are ignored
+        os.unlink(os.path.join(self.queue_dir, "queue", "8nodes", "3"))
+        self.assertEqual(store.schedule("8nodes", dict(data)), 4)
+
+    def test_availability_cache(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster1", "cluster2"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        store = backend.DirBackend(self.queue_dir)
+        self.assertTrue(store.has_available("8nodes"))
+        self.file_exists("queue", "8nodes", ".avail")
+        self.assertEqual(store.book("8nodes"), "cluster1")
+        # symlinks removed behind the cache back are skipped
+        os.unlink(os.path.join(self.queue_dir, "available", "8nodes", "cluster2"))
+        self.assertEqual(store.book("8nodes"), None)
+        self.assertFalse(store.has_available("8nodes"))
+        # symlinks created behind the cache back are detected
+        os.symlink(
+            os.path.join(self.queue_dir, "pool", "8nodes", "cluster2"),
+            os.path.join(self.queue_dir, "available", "8nodes", "cluster2"),
+        )
+        self.assertTrue(store.has_available("8nodes"))
+        self.assertEqual(store.book("8nodes"), "cluster2")
+        store.free("8nodes", "cluster1")
+        self.assertEqual(store.available("8nodes"), ["cluster1"])
+        self.assertEqual(store.book("8nodes"), "cluster1")
+
+    def test_gang_booking(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "poolA"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "poolB"]), 0)
+        for res in ("resA1", "resA2", "resA3"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "poolA", res]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "poolB", "resB"]), 0)
+        store = backend.DirBackend(self.queue_dir)
+        self.assertEqual(
+            backend.requirements("poolA", {"count": 2, "extra_pools": ["poolB"]}),
+            [("poolA", 2), ("poolB", 1)],
+        )
+        # nothing is booked when one of the pools is short
+        self.assertIsNone(store.book_set([("poolA", 2), ("poolB", 2)]))
+        self.assertEqual(len(store.available("poolA")), 3)
+        self.assertEqual(store.available("poolB"), ["resB"])
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "-n",
+                    "2",
+                    "-e",
+                    "poolB",
+                    "poolA",
+                    "--",
+                    "bash",
+                    "-c",
+                    "echo @RESOURCE $DCI_QUEUE_RES1 $DCI_QUEUE_RES2 $DCI_QUEUE_RES3",
+                ]
+            ),
+            0,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "poolA"]), 0)
+        with open(os.path.join(self.queue_dir, "log", "poolA", "1")) as f:
+            self.assertIn("resA1 resA1 resA2 resB\n", f.read())
+        self.assertEqual(len(store.available("poolA")), 3)
+        self.assertEqual(store.available("poolB"), ["resB"])
+
+    def test_affinity(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("res1", "res2", "res3"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        store = backend.DirBackend(self.queue_dir)
+        jobs = [
+            {"cmd": ["echo", "a"], "wd": "/"},
+            {"cmd": ["echo", "b"], "wd": "/tmp"},
+        ]
+        for data in jobs:
+            data["extra_pools"] = []
+            store.schedule("8nodes", dict(data))
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(store.result("8nodes", 2)["resource"], "res2")
+        self.assertEqual(
+            store.state("8nodes", "affinity")["res2"]["key"],
+            policy.duration_key(jobs[1]),
+        )
+        # same command, then same working directory
+        self.assertEqual(store.schedule("8nodes", dict(jobs[1])), 3)
+        self.assertEqual(
+            store.schedule("8nodes", {"cmd": ["true"], "wd": "/", "extra_pools": []}),
+            4,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(store.result("8nodes", 3)["resource"], "res2")
+        self.assertEqual(store.result("8nodes", 4)["resource"], "res1")
+        # fallback on any free resource
+        self.assertEqual(
+            affinity.Affinity(store).prefer([("8nodes", 1)], {"cmd": [], "wd": "/x"}),
+            {},
+        )
+        self.assertEqual(
+            store.book_set([("8nodes", 2)], {"8nodes": ["res3"]})[0][0], "res3"
+        )
+
+    def test_policies(self):
+        queued = [
+            (1, {"priority": 0, "user": "nightly", "queued_at": 0}),
+            (2, {"priority": 1, "user": "nightly", "queued_at": 7000}),
+            (3, {"priority": 1, "user": "nightly", "queued_at": 7000}),
+            (4, {"priority": 0, "user": "pr", "queued_at": 7000}),
+        ]
+        executing = [(0, {"user": "nightly"})]
+        snapshot = policy.Snapshot(queued, executing, now=7200)
+
+        def order(config):
+            return [idx for idx, data in policy.get(config).order(snapshot)]
+
+        self.assertEqual(order({}), [2, 3, 1, 4])
+        self.assertEqual(order({"policy": "unknown"}), [2, 3, 1, 4])
+        self.assertEqual(order({"policy": "aging"}), [1, 2, 3, 4])
+        self.assertEqual(
+            order({"policy": "aging", "aging_interval": 36000}), [2, 3, 1, 4]
+        )
+        self.assertEqual(order({"policy": "fair-share"}), [4, 2, 3, 1])
+
+    def test_reservation(self):
+        # 1 free resource, 2 executing commands ending in 100s and 200s
+        reservation = policy.Reservation(
+            [("8nodes", 2)], {"8nodes": 1}, {"8nodes": [1100, 1200]}, 1000
+        )
+        self.assertEqual(reservation.shadow, 1100)
+        self.assertTrue(reservation.allows([("8nodes", 1)], 50))
+        self.assertFalse(reservation.allows([("8nodes", 1)], 150))
+        self.assertFalse(reservation.allows([("8nodes", 1)], None))
+        self.assertTrue(reservation.allows([("4nodes", 1)], None))
+        # not enough resources even when everything is finished
+        reservation = policy.Reservation([("8nodes", 4)], {"8nodes": 1}, {}, 1000)
+        self.assertTrue(reservation.allows([("8nodes", 1)], 3600))
+        # resources not needed by the blocked command can be used
+        reservation = policy.Reservation([("8nodes", 1)], {"8nodes": 0}, {}, 1000)
+        self.assertEqual(reservation.spare, {"8nodes": 0})
+        reservation = policy.Reservation(
+            [("8nodes", 2)], {"8nodes": 2}, {"8nodes": [1000]}, 1000
+        )
+        self.assertEqual(reservation.spare, {"8nodes": 1})
+        self.assertTrue(reservation.allows([("8nodes", 1)], None))
+        reservation.consume([("8nodes", 1)], None)
+        self.assertFalse(reservation.allows([("8nodes", 1)], None))
+
+    def test_backfill(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("res1", "res2"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "backfill=true"]), 0
+        )
+        store = backend.DirBackend(self.queue_dir)
+        jobs = {
+            "running": {"cmd": ["sleep", "@RESOURCE"], "priority": 3},
+            "big": {"cmd": ["true", "@RESOURCE", "big"], "priority": 2, "count": 2},
+            "short": {"cmd": ["true", "@RESOURCE", "short"]},
+            "unknown": {"cmd": ["true", "@RESOURCE", "unknown"]},
+        }
+        for data in jobs.values():
+            data.update({"wd": "/", "extra_pools": []})
+            store.schedule("8nodes", data)
+        durations = {}
+        for name, duration in (("running", 100), ("short", 10)):
+            durations[policy.duration_key(jobs[name])] = [duration, time.time()]
+        store.set_state("8nodes", "durations", durations)
+        # simulate a running command using res1 for 100s
+        booked = store.book_set([("8nodes", 1)])
+        idx, data = store.take("8nodes")
+        data.update({"start": time.time(), "booked": booked, "pid": os.getpid()})
+        store.update("8nodes", idx, data)
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(store.result("8nodes", 3)["rc"], 0)
+        self.assertEqual(store.job("8nodes", 2)[0], backend.QUEUED)
+        self.assertEqual(store.job("8nodes", 4)[0], backend.QUEUED)
+        # the duration of the short command has been updated
+        self.assertLess(
+            store.state("8nodes", "durations")[policy.duration_key(jobs["short"])][0],
+            10,
+        )
+
+    def test_health_check(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("res1", "res2"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "config",
+                    "8nodes",
+                    "health_check=test @RESOURCE != res1",
+                    "health_failures=2",
+                ]
+            ),
+            0,
+        )
+        store = backend.DirBackend(self.queue_dir)
+        config = store.config("8nodes")
+        self.assertFalse(health.check(store, "8nodes", "res1", config))
+        self.assertEqual(store.state("8nodes", "health")["res1"]["failures"], 1)
+        # cached result
+        self.assertFalse(health.check(store, "8nodes", "res1", config))
+        self.assertEqual(store.state("8nodes", "health")["res1"]["failures"], 1)
+        # expired cache
+        self.assertFalse(
+            health.check(store, "8nodes", "res1", config, time.time() + 1000)
+        )
+        self.assertNotIn("res1", store.state("8nodes", "health"))
+        self.assertFalse(store.has_resource("8nodes", "res1"))
+        self.assertEqual(store.reasons("8nodes")[0]["resource"], "res1")
+        self.assertIn("health check", store.reasons("8nodes")[0]["reason"])
+
+        # the command runs on the healthy resource
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res1"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "health_failures="]), 0
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(store.result("8nodes", 1)["resource"], "res2")
+        self.assertEqual(sorted(store.available("8nodes")), ["res1", "res2"])
+        self.assertTrue(store.state("8nodes", "health")["res2"]["ok"])
+
+    def test_health_check_coordinator(self):
+        url = self.coordinator()
+        client_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, client_dir)
+
+        def client(*args):
+            return main.main(
+                ["dci-queue", "-t", client_dir, "--coordinator", url] + list(args)
+            )
+
+        self.assertEqual(client("add-pool", "-n", "8nodes"), 0)
+        for res in ("res1", "res2"):
+            self.assertEqual(client("add-resource", "8nodes", res), 0)
+        self.assertEqual(client("config", "8nodes", "health_check=false @RESOURCE"), 0)
+        self.assertEqual(client("schedule", "8nodes", "echo", "@RESOURCE"), 0)
+        # the unhealthy resources stay booked until the end of the pass
+        self.assertEqual(client("run", "8nodes"), 0)
+        store = backend.DirBackend(self.queue_dir)
+        self.assertEqual(store.job("8nodes", 1)[0], backend.QUEUED)
+        self.assertEqual(sorted(store.available("8nodes")), ["res1", "res2"])
+        self.assertEqual(client("config", "8nodes", "health_check=true @RESOURCE"), 0)
+        # forget the cached failed checks
+        store.set_state("8nodes", "health", {})
+        self.assertEqual(client("run", "8nodes"), 0)
+        self.assertEqual(store.result("8nodes", 1)["rc"], 0)
+
+    def test_forecast(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("res1", "res2"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        store = backend.DirBackend(self.queue_dir)
+        jobs = [
+            {"cmd": ["a", "@RESOURCE"]},
+            {"cmd": ["a", "@RESOURCE"]},
+            {"cmd": ["b", "@RESOURCE"]},
+            {"cmd": ["c", "@RESOURCE"], "count": 2},
+        ]
+        for data in jobs:
+            data.update({"wd": "/", "extra_pools": []})
+            store.schedule("8nodes", data, force=True)
+        now = time.time()
+        store.set_state(
+            "8nodes",
+            "durations",
+            {
+                policy.duration_key(jobs[0]): [100, now],
+                policy.duration_key(jobs[2]): [50, now],
+            },
+        )
+        booked = store.book_set([("8nodes", 1)])
+        idx, data = store.take("8nodes")
+        data.update({"start": now - 20, "booked": booked})
+        store.update("8nodes", idx, data)
+        self.assertEqual(
+            policy.forecast(store, "8nodes", now),
+            {
+                1: (now - 20, now + 80),
+                2: (now, now + 100),
+                3: (now + 80, now + 130),
+                4: (now + 130, now + 205),
+            },
+        )
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(main.main(["dci-queue", "list", "-j", "8nodes"]), 0)
+            info = json.loads(buf.getvalue())
+        self.assertEqual(info["executing"][0]["resources"], ["res1"])
+        self.assertEqual([job["id"] for job in info["queued"]], [2, 3, 4])
+        self.assertAlmostEqual(info["queued"][2]["estimated_start"], now + 130, 0)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(main.main(["dci-queue", "list", "8nodes"]), 0)
+            self.assertIn("(start: ", buf.getvalue())
+        # the durations are also kept per resource
+        data = dict(jobs[0], resource="res2")
+        policy.record_duration(store, "8nodes", data, 40)
+        durations = store.state("8nodes", "durations")
+        self.assertEqual(policy.estimate(durations, data), 40)
+        self.assertEqual(policy.estimate(durations, dict(data, resource="res1")), 70)
+        self.assertEqual(policy.estimate(durations, jobs[1]), 70)
+
+    def simulate(self, *args):
+        with io.StringIO() as buf, redirect_stdout(buf):
+            rc = main.main(["dci-queue", "simulate", "-j"] + list(args))
+            return rc, json.loads(buf.getvalue()) if rc == 0 else None
+
+    def test_simulate(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("res1", "res2"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        path = os.path.join(self.queue_dir, "trace.jsonl")
+        with open(path, "w") as f:
+            for entry in (
+                {"submit": 0, "duration": 3600},
+                {"submit": 0, "duration": 3600},
+                {"submit": 10, "duration": 600, "priority": 5},
+                {"submit": 20, "duration": 60, "count": 3},
+            ):
+                f.write(json.dumps(entry) + "\n")
+        rc, report = self.simulate("8nodes", path)
+        self.assertEqual(rc, 0)
+        self.assertEqual(report["not_started"], 1)
+        self.assertEqual(report["makespan"], 4200)
+        self.assertEqual(report["wait"]["max"], 3590)
+        self.assertAlmostEqual(report["utilization"]["8nodes"], 7800 / 8400.0)
+        # one more resource lets the 3 resources command run
+        rc, report = self.simulate("-r", "1", "8nodes", path)
+        self.assertEqual(report["not_started"], 0)
+        self.assertEqual(report["makespan"], 3660)
+        rc, report = self.simulate("-s", "policy=x", "8nodes", path)
+        self.assertEqual(rc, 1)
+        # the real pool is not modified
+        self.assertEqual(
+            lib.get_seq(argparse.Namespace(top_dir=self.queue_dir, pool="8nodes")),
+            (1, 1),
+        )
+        self.assertEqual(
+            sorted(backend.DirBackend(self.queue_dir).available("8nodes")),
+            ["res1", "res2"],
+        )
+
+        # trace recorded from the results of the pool
+        store = backend.DirBackend(self.queue_dir)
+        for idx, (queued_at, start, end) in enumerate(
+            ((100, 100, 200), (100, 100, 300), (150, 200, 260)), 1
+        ):
+            store.set_result(
+                "8nodes",
+                idx,
+                {
+                    "rc": 0,
+                    "start": start,
+                    "end": end,
+                    "booked": [["res1", "8nodes"]],
+                    "queued_at": queued_at,
+                    "cmd": ["echo", str(idx), "@RESOURCE"],
+                    "wd": "/",
+                },
+            )
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(
+                main.main(["dci-queue", "simulate", "--record", "8nodes"]), 0
+            )
+            trace = [json.loads(line) for line in buf.getvalue().splitlines()]
+        self.assertEqual([entry["duration"] for entry in trace], [100, 200, 60])
+        self.assertEqual(trace[2]["cmd"], ["echo", "3", "@RESOURCE"])
+        rc, report = self.simulate("8nodes")
+        self.assertEqual(report["commands"], 3)
+        self.assertEqual(report["wait"]["max"], 50)
+        self.assertEqual(report["makespan"], 200)
+
+    def test_config(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "policy=fair-share"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "config", "8nodes", "policy=x"]), 1)
+        self.assertEqual(main.main(["dci-queue", "config", "8nodes", "policy"]), 1)
+        for setting in ("aging_interval=0", "lease_ttl=abc", "kill_grace=true"):
+            self.assertEqual(main.main(["dci-queue", "config", "8nodes", setting]), 1)
+        # an invalid interval stored by hand falls back to the default
+        self.assertEqual(
+            policy.Aging({"aging_interval": 0}).interval, policy.DEFAULT_AGING_INTERVAL
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "fair_share_key=wd"]), 0
+        )
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(main.main(["dci-queue", "config", "8nodes"]), 0)
+            self.assertEqual(buf.getvalue(), "fair_share_key=wd\npolicy=fair-share\n")
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res"]), 0)
+        self.addCleanup(os.chdir, os.getcwd())
+        for wd, pri in (("/", "2"), ("/", "1"), ("/tmp", "0")):
+            os.chdir(wd)
+            self.assertEqual(
+                main.main(
+                    [
+                        "dci-queue",
+                        "schedule",
+                        "-p",
+                        pri,
+                        "8nodes",
+                        "--",
+                        "bash",
+                        "-c",
+                        "echo $DCI_QUEUE_ID >> %s/order # @RESOURCE %s"
+                        % (self.queue_dir, pri),
+                    ]
+                ),
+                0,
+            )
+        store = backend.DirBackend(self.queue_dir)
+        self.assertEqual(
+            [idx for idx, data in run_cmd.candidates(store, "8nodes")], [1, 3, 2]
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "--once", "8nodes"]), 0)
+        with open(os.path.join(self.queue_dir, "order")) as f:
+            self.assertEqual(f.read().split(), ["1"])
+        self.assertEqual(main.main(["dci-queue", "config", "8nodes", "policy="]), 0)
+        self.assertEqual(
+            backend.DirBackend(self.queue_dir).config("8nodes"),
+            {"fair_share_key": "wd"},
+        )
 
     def test_run_available(self):
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
@@ -652,6 +1306,118 @@ class TestQueue(unittest.TestCase):
         self.assertEqual(self.arg, "less")
         os.execlp = saved
 
+    def test_log_compressed(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "log_max_size=foo"]), 1
+        )
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "config",
+                    "8nodes",
+                    "log_compress=true",
+                    "log_max_size=1k",
+                ]
+            ),
+            0,
+        )
+        with open(os.path.join(self.queue_dir, "res"), "w") as f:
+            f.write(
+                'changed: [jumphost] => {"changed": true, "job": {"name": "job","id": "1"}}\n'
+            )
+        cmd = "cat %s; seq 10000; echo @RESOURCE" % os.path.join(
+            self.queue_dir, "@RESOURCE"
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "--", "sh", "-c", cmd]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.doesnt_exist("log", "8nodes", "1")
+        with gzip.open(os.path.join(self.queue_dir, "log", "8nodes", "1.gz")) as f:
+            content = f.read().decode()
+        # the head and the tail of the output are kept
+        self.assertTrue(content.startswith("+ DCI_QUEUE=8nodes\n"))
+        self.assertTrue(content.endswith("\n9999\n10000\nres\n"))
+        self.assertIn(" bytes truncated]\n", content)
+        self.assertLess(len(content), 1100)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(
+                main.main(["dci-queue", "log", "-n", "2", "8nodes", "1"]), 0
+            )
+            self.assertEqual(buf.getvalue(), "10000\nres\n")
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(main.main(["dci-queue", "log", "-f", "8nodes", "1"]), 0)
+            self.assertEqual(buf.getvalue().splitlines()[-1], "res")
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(main.main(["dci-queue", "dci-job", "8nodes", "1"]), 0)
+            self.assertEqual(buf.getvalue(), "job:1\n")
+
+    def test_log_reader(self):
+        path = os.path.join(self.queue_dir, "1.gz")
+        with open(path, "wb") as out:
+            writer = joblog.Writer(out)
+            writer.write(b"line 1\nline 2\nli\xc3")
+            writer.flush()
+            # a log being written is read up to the last flush
+            with joblog.Reader(path) as reader:
+                self.assertEqual(list(reader.lines()), ["line 1\n", "line 2\n", "li"])
+                self.assertFalse(reader.eof)
+                writer.write(b"\xa9ne 3\n")
+                writer.close()
+                self.assertEqual(reader.read(), "\u00e9ne 3\n")
+                self.assertTrue(reader.eof)
+
+    def test_log_retention(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for idx in range(1, 4):
+            self.assertEqual(
+                main.main(["dci-queue", "add-resource", "8nodes", "res%d" % idx]), 0
+            )
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE", str(idx)]
+                ),
+                0,
+            )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        store = backend.DirBackend(self.queue_dir)
+        now = time.time()
+        for idx in range(1, 4):
+            os.utime(store.log_path("8nodes", idx), (now - idx * 86400,) * 2)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "log_max_age=60h"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "clean", "8nodes"]), 0)
+        self.doesnt_exist("log", "8nodes", "3")
+        self.doesnt_exist("result", "8nodes", "3")
+        self.file_exists("log", "8nodes", "2")
+        self.file_exists("result", "8nodes", "2")
+        size = os.path.getsize(store.log_path("8nodes", 1))
+        config = {"log_max_total": size}
+        self.assertEqual(
+            joblog.prune(store, "8nodes", config),
+            [store.log_path("8nodes", 2), store.result_path("8nodes", 2)],
+        )
+        self.file_exists("log", "8nodes", "1")
+        self.file_exists("result", "8nodes", "1")
+        # results are also deleted when older than log_max_age
+        os.utime(store.result_path("8nodes", 1), (now - 2 * 86400,) * 2)
+        self.assertEqual(
+            joblog.prune(store, "8nodes", {"log_max_age": "36h"}),
+            [store.result_path("8nodes", 1)],
+        )
+        # the commands with their output on the console prune too
+        os.utime(store.log_path("8nodes", 1), (now - 3 * 86400,) * 2)
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE"]), 0
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "-C", "8nodes"]), 0)
+        self.doesnt_exist("log", "8nodes", "1")
+        self.file_exists("result", "8nodes", "4")
+
     def test_search(self):
         self.assertEqual(main.main(["dci-queue", "log", "8nodes", "1"]), 1)
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
@@ -757,6 +1523,61 @@ class TestQueue(unittest.TestCase):
             contab_content = f.read()
             self.assertEqual(contab_content, "\n")
 
+    def test_add_crontab_serve(self):
+        crontab_file = os.path.join(self.queue_dir, "crontab")
+        with open(crontab_file, "w"):
+            pass
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-crontab", "-s", "8nodes", crontab_file]), 0
+        )
+        with open(crontab_file, "r") as f:
+            contab_content = f.read()
+            self.assertIn("serve 8nodes", contab_content)
+            self.assertNotIn("run 8nodes", contab_content)
+        self.assertEqual(
+            main.main(["dci-queue", "remove-crontab", "8nodes", crontab_file]), 0
+        )
+        with open(crontab_file, "r") as f:
+            contab_content = f.read()
+            self.assertEqual(contab_content, "\n")
+
+    def test_serve(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        # a broken pool must not stop the dispatch of the others
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "broken"]), 0)
+        backend.DirBackend(self.queue_dir).set_config("broken", ["invalid"])
+        proc = subprocess.Popen(["dci-queue", "serve", "broken", "8nodes"])
+        # let the daemon start watching the directories
+        time.sleep(2)
+        for name in ("first", "second"):
+            self.assertEqual(
+                main.main(
+                    [
+                        "dci-queue",
+                        "schedule",
+                        "8nodes",
+                        "--",
+                        "bash",
+                        "-c",
+                        "sleep 1; touch ${DCI_QUEUE_DIR}/@RESOURCE-%s" % name,
+                    ]
+                ),
+                0,
+            )
+        for _ in range(20):
+            if os.path.exists(os.path.join(self.queue_dir, "cluster4-second")):
+                break
+            time.sleep(0.5)
+        proc.terminate()
+        self.assertEqual(proc.wait(), 0)
+        self.file_exists(".", ".", "cluster4-first")
+        self.file_exists(".", ".", "cluster4-second")
+        self.file_exists("available", "8nodes", "cluster4")
+
     def test_clean(self):
         self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
         self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res"]), 0)
@@ -769,6 +1590,565 @@ class TestQueue(unittest.TestCase):
         self.doesnt_exist("queue", "8nodes", "1234" + run_cmd.EXT)
         self.file_exists("available", "8nodes", "res")
 
+    def test_journal(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        store = backend.DirBackend(self.queue_dir)
+        entries = [{"cmd": ["echo", str(i), "@RESOURCE"], "wd": "/"} for i in range(3)]
+        # duplicates in the same batch are detected before the files exist
+        self.assertEqual(
+            store.schedule_many("8nodes", entries + entries[:1]), [1, 2, 3, None]
+        )
+        self.assertEqual(store.take("8nodes", 1)[0], 1)
+        store.update("8nodes", 1, {"cmd": ["echo", "@RESOURCE"], "wd": "/", "pid": 1})
+        self.assertEqual(store.unschedule("8nodes", 3)[0], backend.QUEUED)
+        journal = lib.Journal(store.args("8nodes"))
+        self.assertEqual(
+            [record[:2] for record in journal.read()],
+            [
+                ["queue", 1],
+                ["queue", 2],
+                ["queue", 3],
+                ["take", 1],
+                ["update", 1],
+                ["unschedule", 3],
+            ],
+        )
+
+        # lose the files not synced to disk and tear the last record
+        queue_dir = os.path.join(self.queue_dir, "queue", "8nodes")
+        for name in ("1" + lib.EXT, "2", ".idx", ".hash"):
+            os.unlink(os.path.join(queue_dir, name))
+        with open(os.path.join(queue_dir, ".seq"), "w") as f:
+            f.write('{"first"')
+        with open(os.path.join(queue_dir, ".journal"), "ab") as f:
+            f.write(b'12345678 ["finish", 2')
+        self.assertEqual(main.main(["dci-queue", "clean", "8nodes"]), 0)
+        self.assertEqual(lib.get_seq(store.args("8nodes")), (1, 4))
+        self.assertEqual(store.job("8nodes", 1)[1]["pid"], 1)
+        self.assertEqual(store.job("8nodes", 2)[0], backend.QUEUED)
+        self.assertEqual(store.job("8nodes", 3)[0], None)
+        self.assertEqual(store.peek("8nodes")[0], 2)
+        self.assertEqual(store.search("8nodes", entries[1]["cmd"]), [2])
+        # the recovered files are synced so the journal is truncated
+        self.assertEqual(journal.read(), [])
+        # run recovers the pool once per boot
+        with patch("dciqueue.lib.boot_id", return_value="boot1"):
+            self.assertTrue(store.recover_after_boot("8nodes"))
+            self.assertFalse(store.recover_after_boot("8nodes"))
+        with patch("dciqueue.lib.boot_id", return_value="boot2"):
+            os.unlink(os.path.join(queue_dir, ".seq"))
+            self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+            self.assertFalse(store.recover_after_boot("8nodes"))
+        self.assertTrue(os.path.exists(os.path.join(queue_dir, ".seq")))
+
+        with patch("dciqueue.lib.JOURNAL_SIZE", 0):
+            store.finish("8nodes", 1)
+        self.assertEqual(store.job("8nodes", 1)[0], None)
+        self.assertEqual(journal.read(), [])
+
+    def test_wait_child(self):
+        proc = subprocess.Popen(["sleep", "0.5"])
+        # the errors of the leases and timeouts don't stop the wait
+        with patch("dciqueue.run_cmd.HEARTBEAT_INTERVAL", 0.1), patch(
+            "dciqueue.run_cmd.renew", side_effect=OSError("renew")
+        ) as renew, patch(
+            "dciqueue.run_cmd.enforce", side_effect=OSError("enforce")
+        ) as enforce:
+            pid, status = run_cmd.wait_child([])
+        self.assertEqual(pid, proc.pid)
+        self.assertEqual(status, 0)
+        self.assertTrue(renew.called)
+        self.assertTrue(enforce.called)
+
+    def test_leases(self):
+        start = lib.process_start_time(os.getpid())
+        self.assertTrue(lib.process_alive(os.getpid(), start))
+        self.assertTrue(lib.process_alive(os.getpid()))
+        # recycled pid
+        self.assertFalse(lib.process_alive(os.getpid(), start + 1))
+        proc = subprocess.Popen(["true"])
+        proc.wait()
+        lease = run_cmd.new_lease(proc.pid)
+        self.assertFalse(run_cmd.lease_expired(lease, 300))
+        # the owner (this process) is still alive
+        self.assertFalse(run_cmd.lease_expired(lease, 300, time.time() + 600))
+        lease["owner"] = proc.pid
+        self.assertTrue(run_cmd.lease_expired(lease, 300, time.time() + 600))
+
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res"]), 0)
+        store = backend.DirBackend(self.queue_dir)
+        for name in ("lost", "next"):
+            self.assertEqual(
+                main.main(
+                    ["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE", name]
+                ),
+                0,
+            )
+        # a runner that crashed without freeing the resource
+        booked = store.book_set([("8nodes", 1)])
+        idx, data = store.take("8nodes")
+        lease["heartbeat"] = time.time() - 600
+        data.update({"resource": "res", "booked": booked, "lease": lease})
+        store.update("8nodes", idx, data)
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(store.result("8nodes", 1)["error"], "lease expired")
+        self.assertEqual(store.result("8nodes", 2)["rc"], 0)
+        self.assertEqual(store.available("8nodes"), ["res"])
+
+    def test_timeout(self):
+        self.assertEqual(lib.parse_duration("90"), 90)
+        self.assertEqual(lib.parse_duration("2h"), 7200)
+        self.assertRaises(ValueError, lib.parse_duration, "2x")
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "kill_grace=1"]), 0
+        )
+        for cmd in ("sleep 30", "trap '' TERM; sleep 5"):
+            self.assertEqual(
+                main.main(
+                    [
+                        "dci-queue",
+                        "schedule",
+                        "-t",
+                        "1s",
+                        "8nodes",
+                        "--",
+                        "bash",
+                        "-c",
+                        cmd + " # @RESOURCE",
+                    ]
+                ),
+                0,
+            )
+        start = time.time()
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertLess(time.time() - start, 10)
+        store = backend.DirBackend(self.queue_dir)
+        self.assertEqual(store.result("8nodes", 1)["error"], "timeout")
+        self.assertEqual(store.result("8nodes", 1)["rc"], 128 + signal.SIGTERM)
+        self.assertEqual(store.result("8nodes", 2)["rc"], 128 + signal.SIGKILL)
+        self.assertEqual(store.available("8nodes"), ["res"])
+
+    def test_preemption(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", "res"]), 0)
+        self.assertEqual(
+            main.main(["dci-queue", "config", "8nodes", "preempt_priority=10"]), 0
+        )
+        store = backend.DirBackend(self.queue_dir)
+        # sleeps only the first time
+        self.assertEqual(
+            main.main(
+                [
+                    "dci-queue",
+                    "schedule",
+                    "--preemptible",
+                    "8nodes",
+                    "--",
+                    "bash",
+                    "-c",
+                    "[ -e ${DCI_QUEUE_DIR}/ran ] && exit 0; touch ${DCI_QUEUE_DIR}/ran;"
+                    " sleep 30 # @RESOURCE",
+                ]
+            ),
+            0,
+        )
+        os.system("dci-queue run 8nodes &")
+        for _ in range(100):
+            if "lease" in (store.job("8nodes", 1)[1] or {}):
+                break
+            time.sleep(0.1)
+        lease = store.job("8nodes", 1)[1]["lease"]
+        owner, owner_start = lease["owner"], lease["owner_start"]
+        # not urgent enough
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-p", "9", "8nodes", "echo", "@RESOURCE"]
+            ),
+            0,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertNotIn("killed", store.job("8nodes", 1)[1])
+        self.assertEqual(main.main(["dci-queue", "unschedule", "8nodes", "2"]), 0)
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-p", "10", "8nodes", "echo", "@RESOURCE"]
+            ),
+            0,
+        )
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(main.main(["dci-queue", "wait", "-t", "20", "8nodes", "3"]), 0)
+        result = store.result("8nodes", 1)
+        self.assertEqual(result["error"], "preempted by 8nodes.3")
+        self.assertEqual(result["requeued"], 4)
+        # waiting for the preempted command follows it
+        self.assertEqual(main.main(["dci-queue", "wait", "-t", "20", "8nodes", "1"]), 0)
+        # let the background runner exit before removing its files
+        for _ in range(100):
+            if not lib.process_alive(owner, owner_start):
+                break
+            time.sleep(0.1)
+
+    def coordinator(self):
+        """Serve the pools of the test in a thread and return its URL."""
+        server = coordinator_cmd.make_server(
+            backend.DirBackend(self.queue_dir), port=0, token="secret"
+        )
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+        os.environ["DCI_QUEUE_TOKEN"] = "secret"
+        self.addCleanup(os.environ.pop, "DCI_QUEUE_TOKEN", None)
+        return "http://127.0.0.1:%d" % server.server_address[1]
+
+    def test_coordinator(self):
+        url = self.coordinator()
+        client_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, client_dir)
+
+        def client(*args):
+            return main.main(
+                ["dci-queue", "-t", client_dir, "--coordinator", url] + list(args)
+            )
+
+        self.assertEqual(client("add-pool", "-n", "8nodes"), 0)
+        self.assertEqual(client("add-resource", "8nodes", "res"), 0)
+        self.assertEqual(client("schedule", "8nodes", "echo", "@RESOURCE"), 0)
+        store = backend.DirBackend(self.queue_dir)
+        self.assertEqual(store.job("8nodes", 1)[0], backend.QUEUED)
+        self.assertEqual(client("run", "8nodes"), 0)
+        self.assertEqual(client("wait", "8nodes", "1"), 0)
+        self.assertEqual(store.result("8nodes", 1)["resource"], "res")
+        self.assertEqual(store.available("8nodes"), ["res"])
+        # states are updated through the coordinator
+        self.assertEqual(len(store.state("8nodes", "durations")), 1)
+        with open(os.path.join(client_dir, "log", "8nodes", "1")) as f:
+            self.assertIn("res\n", f.read())
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertEqual(client("list", "-j", "8nodes"), 0)
+            self.assertEqual(json.loads(buf.getvalue())["resources"], ["res"])
+        # the results stored by the coordinator are polled
+        self.assertEqual(client("schedule", "8nodes", "true", "@RESOURCE"), 0)
+        idx, data = store.take("8nodes")
+        finisher = threading.Timer(
+            0.5,
+            lambda: (
+                store.set_result("8nodes", idx, {"rc": 0}),
+                store.finish("8nodes", idx),
+            ),
+        )
+        finisher.start()
+        self.addCleanup(finisher.join)
+        start = time.time()
+        queue = api.connect(client_dir, coordinator=url)
+        self.assertEqual(queue.wait("8nodes", idx, interval=10), {"rc": 0})
+        self.assertLess(time.time() - start, 5)
+        os.environ["DCI_QUEUE_TOKEN"] = "wrong"
+        self.assertEqual(client("list", "8nodes"), 1)
+        # a token is needed to listen on other hosts
+        del os.environ["DCI_QUEUE_TOKEN"]
+        self.assertEqual(
+            main.main(["dci-queue", "coordinator", "-a", "0.0.0.0", "-P", "0"]), 1
+        )
+        self.assertTrue(coordinator_cmd.is_loopback("::1"))
+        self.assertFalse(coordinator_cmd.is_loopback("queue.example.com"))
+        os.environ["DCI_QUEUE_TOKEN"] = "secret"
+
+    def test_api(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("res1", "res2"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        queue = api.connect(self.queue_dir)
+        self.assertEqual(queue.pools(), ["8nodes"])
+        self.assertRaises(api.QueueError, queue.schedule, "4nodes", ["@RESOURCE"])
+        self.assertRaises(api.QueueError, queue.schedule, "8nodes", ["echo"])
+        self.assertRaises(
+            api.QueueError, queue.schedule, "8nodes", ["@RESOURCE"], timeout="x"
+        )
+        self.assertEqual(
+            queue.schedule("8nodes", ["echo", "@RESOURCE"], wd="/tmp", timeout="1h"), 1
+        )
+        self.assertIsNone(queue.schedule("8nodes", ["echo", "@RESOURCE"], wd="/tmp"))
+        self.assertEqual(
+            queue.schedule_many(
+                "8nodes",
+                [api.new_entry(["true", "@RESOURCE"], wd="/", priority=1)],
+            ),
+            [2],
+        )
+        self.assertEqual(queue.search("8nodes", ["echo", "@RESOURCE"]), [1])
+        self.assertEqual(queue.searchdir("8nodes", "/"), 2)
+        info = queue.list("8nodes")
+        self.assertEqual([job["id"] for job in info["queued"]], [2, 1])
+        self.assertEqual(queue.store.job("8nodes", 1)[1]["timeout"], 3600)
+        booked = queue.book("8nodes", 2)
+        self.assertEqual(len(booked), 2)
+        self.assertIsNone(queue.book("8nodes"))
+        queue.free(booked)
+        self.assertEqual(len(queue.list("8nodes")["available"]), 2)
+        self.assertEqual(queue.unschedule("8nodes", 2), backend.QUEUED)
+        self.assertEqual(queue.result("8nodes", 2)["error"], "unscheduled")
+        self.assertIsNone(queue.unschedule("8nodes", 2))
+        self.assertEqual(main.main(["dci-queue", "run", "8nodes"]), 0)
+        self.assertEqual(queue.wait("8nodes", 1)["rc"], 0)
+
+    def test_sqlite_backend(self):
+        def output(*args):
+            with io.StringIO() as buf, redirect_stdout(buf):
+                rc = main.main(["dci-queue", "--backend", "sqlite"] + list(args))
+                return rc, buf.getvalue()
+
+        self.assertEqual(output("add-pool", "-n", "8nodes")[0], 0)
+        self.file_exists(".", ".", backend.DB_NAME)
+        # the database is detected without --backend
+        self.assertEqual(
+            main.main(["dci-queue", "add-resource", "8nodes", "cluster4"]), 0
+        )
+        self.doesnt_exist("pool", "8nodes")
+        self.assertEqual(output("add-resource", "8nodes", "cluster5")[0], 0)
+        self.assertEqual(
+            output("remove-resource", "8nodes", "cluster5", "broken")[0], 0
+        )
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.queue_dir)
+        self.assertEqual(
+            output(
+                "schedule",
+                "8nodes",
+                "--",
+                "bash",
+                "-c",
+                'test "$DCI_QUEUE_JOBID" = "8nodes.1" && touch @RESOURCE-ran',
+            )[0],
+            0,
+        )
+        self.assertEqual(
+            output("schedule", "-p", "1", "8nodes", "echo", "@RESOURCE"), (0, "")
+        )
+        # duplicate
+        self.assertEqual(
+            output("schedule", "-p", "1", "8nodes", "echo", "@RESOURCE"), (0, "")
+        )
+        self.assertEqual(output("search", "8nodes", "echo", "@RESOURCE"), (0, "2\n"))
+        self.assertEqual(output("searchdir", "8nodes", self.queue_dir), (0, "1\n"))
+        rc, out = output("list", "8nodes")
+        self.assertEqual(rc, 0)
+        self.assertIn("Resources on the 8nodes pool: cluster4\n", out)
+        self.assertRegex(out, r" cluster5: .*broken \[")
+        self.assertLess(out.index(" 2(p1)"), out.index(" 1 "))
+        self.assertEqual(output("unschedule", "8nodes", "2")[0], 0)
+        self.assertEqual(output("search", "8nodes", "echo", "@RESOURCE"), (0, ""))
+        self.assertEqual(output("run", "8nodes")[0], 0)
+        self.file_exists(".", ".", "cluster4-ran")
+        self.file_exists("log", "8nodes", "1")
+        self.assertEqual(run_cmd.RET_CODE[1], 0)
+        self.assertEqual(output("searchdir", "8nodes", self.queue_dir)[0], 1)
+        store = backend.get(main.argparse.Namespace(top_dir=self.queue_dir))
+        self.assertEqual(store.available("8nodes"), ["cluster4"])
+        self.assertEqual(output("remove-pool", "-n", "8nodes")[0], 0)
+        self.assertEqual(output("list"), (0, "No pool was found on the host.\n"))
+
+    def test_backend_contract(self):
+        url = self.coordinator()
+        stores = {
+            "dir": backend.DirBackend(self.queue_dir),
+            "sqlite": sqlite_backend.SqliteBackend(self.queue_dir, ":memory:"),
+            "http": http_backend.HttpBackend(self.queue_dir, url, "secret"),
+        }
+        outputs = {}
+        for name, store in stores.items():
+            with self.subTest(backend=name):
+                outputs[name] = self.check_contract(store, "pool-" + name)
+        self.assertEqual(outputs["sqlite"], outputs["dir"])
+        self.assertEqual(outputs["http"], outputs["dir"])
+
+    def check_contract(self, store, pool):
+        """Check the types returned by a backend and return its results."""
+        store.add_pool(pool)
+        for res in ("res1", "res2"):
+            store.add_resource(pool, res)
+        entries = [
+            {"cmd": ["echo", "@RESOURCE", str(idx)], "wd": "/", "extra_pools": []}
+            for idx in range(3)
+        ]
+        self.assertEqual(store.schedule_many(pool, entries), [1, 2, 3])
+        outputs = [store.seq(pool), store.peek(pool), store.job(pool, 1)]
+        outputs += [store.jobs(pool), store.queued(pool)]
+        booked = sorted(store.book_set([(pool, 2)]))
+        self.assertEqual(booked, [("res1", pool), ("res2", pool)])
+        idx, data = store.take(pool)
+        data["booked"] = booked
+        store.update(pool, idx, data)
+        outputs += [store.executing(pool), store.job(pool, idx)]
+        # renewing a lease keeps the concurrent updates of the command
+        self.assertFalse(store.heartbeat(pool, idx, 1000))
+        store.update(pool, idx, dict(data, lease={"heartbeat": 0}))
+        store.update(pool, idx, dict(data, lease={"heartbeat": 0}, killed={}))
+        self.assertTrue(store.heartbeat(pool, idx, 1000))
+        renewed = store.job(pool, idx)[1]
+        self.assertEqual(renewed["lease"], {"heartbeat": 1000})
+        self.assertEqual(renewed["killed"], {})
+        self.assertFalse(store.heartbeat(pool, 2, 1000))
+        outputs.append(store.unschedule(pool, 3))
+        store.free_resources(store.executing(pool)[0][1]["booked"])
+        store.finish(pool, idx)
+        self.assertEqual(sorted(store.available(pool)), ["res1", "res2"])
+        outputs += [store.take(pool, 3), store.peek(pool)]
+        for output in outputs:
+            self.assertIsInstance(output, (tuple, list))
+            if isinstance(output, list):
+                for entry in output:
+                    self.assertIsInstance(entry, tuple)
+        self.assertIsNone(store.book_set([(pool, 3)]))
+        # the outputs of the backends must be equal once the pool is renamed
+        return json.loads(json.dumps(outputs, sort_keys=True).replace(pool, "pool"))
+
+    def test_labels(self):
+        for name in backend.LOCAL_BACKENDS:
+            with self.subTest(backend=name):
+                self.check_labels(name, "sno-" + name)
+
+    def check_labels(self, name, pool):
+        def dciqueue(*args):
+            with io.StringIO() as buf, redirect_stdout(buf):
+                rc = main.main(["dci-queue", "--backend", name] + list(args))
+                return rc, buf.getvalue()
+
+        self.assertEqual(dciqueue("add-pool", "-n", pool)[0], 0)
+        self.assertEqual(
+            dciqueue("add-resource", "-l", "gpu=true,ocp=4.16", pool, "sno1")[0], 0
+        )
+        self.assertEqual(dciqueue("add-resource", "-l", "ocp=4.16", pool, "sno2")[0], 0)
+        self.assertEqual(dciqueue("add-resource", pool, "sno3")[0], 0)
+        # adding an existing resource without labels keeps them
+        self.assertEqual(dciqueue("add-resource", pool, "sno2")[0], 0)
+        store = backend.get(argparse.Namespace(top_dir=self.queue_dir, backend=name))
+        self.assertEqual(
+            store.labels(pool),
+            {
+                "sno1": {"gpu": "true", "ocp": "4.16"},
+                "sno2": {"ocp": "4.16"},
+                "sno3": {},
+            },
+        )
+        rc, out = dciqueue("list", pool)
+        self.assertIn(" sno1: gpu=true,ocp=4.16\n sno2: ocp=4.16\n", out)
+
+        # selectors matching too few resources are refused
+        for args in (["-l", "gpu=false"], ["-n", "2", "-l", "gpu=true"]):
+            self.assertEqual(
+                dciqueue("schedule", *args, pool, "echo", "@RESOURCE")[0], 1
+            )
+        self.assertEqual(
+            dciqueue(
+                "schedule",
+                "-l",
+                "ocp=4.16",
+                "-l",
+                "gpu=true",
+                pool,
+                "echo",
+                "@RESOURCE",
+            )[0],
+            0,
+        )
+        self.assertEqual(
+            dciqueue(
+                "schedule", "-n", "2", "-l", "ocp=4.16", pool, "echo", "@RESOURCE", "2"
+            )[0],
+            0,
+        )
+        self.assertEqual(
+            json.loads(dciqueue("list", "-j", pool)[1])["queued"][0]["selector"],
+            {"gpu": "true", "ocp": "4.16"},
+        )
+        self.assertEqual(dciqueue("run", pool)[0], 0)
+        self.assertEqual(store.result(pool, 1)["booked"], [["sno1", pool]])
+        self.assertEqual(
+            sorted(res for res, p in store.result(pool, 2)["booked"]), ["sno1", "sno2"]
+        )
+
+        # the labels of a free resource can be changed
+        self.assertEqual(dciqueue("add-resource", "-l", "gpu=true", pool, "sno3")[0], 0)
+        queue = api.Queue(store)
+        booked = queue.book(pool, 2, selector={"gpu": "true"})
+        self.assertEqual(sorted(res for res, p in booked), ["sno1", "sno3"])
+        self.assertIsNone(queue.book(pool, selector={"gpu": "true"}))
+        queue.free(booked)
+        self.assertEqual(sorted(store.available(pool)), ["sno1", "sno2", "sno3"])
+        self.assertEqual(
+            queue.book(pool, selector={"gpu": "true", "ocp": "4.16"}), [("sno1", pool)]
+        )
+
+    def test_migrate(self):
+        self.assertEqual(main.main(["dci-queue", "add-pool", "-n", "8nodes"]), 0)
+        for res in ("cluster4", "cluster5", "cluster6"):
+            self.assertEqual(main.main(["dci-queue", "add-resource", "8nodes", res]), 0)
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "add-resource", "-l", "gpu=true", "8nodes", "cluster5"]
+            ),
+            0,
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "remove-resource", "8nodes", "cluster6", "broken"]),
+            0,
+        )
+        self.assertEqual(
+            main.main(["dci-queue", "schedule", "8nodes", "echo", "@RESOURCE"]), 0
+        )
+        self.assertEqual(
+            main.main(
+                ["dci-queue", "schedule", "-p", "2", "8nodes", "ls", "@RESOURCE"]
+            ),
+            0,
+        )
+        # simulate a running command
+        store = backend.DirBackend(self.queue_dir)
+        idx, data = store.take("8nodes")
+        self.assertEqual(idx, 2)
+        res = store.book("8nodes")
+        data["resource"] = res
+        data["booked"] = [[res, "8nodes"]]
+        store.update("8nodes", idx, data)
+        self.assertNotIn(res, store.available("8nodes"))
+
+        self.assertEqual(main.main(["dci-queue", "migrate"]), 0)
+        self.assertEqual(main.main(["dci-queue", "migrate"]), 1)
+        for key in ("pool", "queue", "available", "reason"):
+            self.doesnt_exist(key, "8nodes")
+        self.dir_exists("log", "8nodes")
+        sqlite = backend.get(main.argparse.Namespace(top_dir=self.queue_dir))
+        self.assertEqual(sqlite.name, "sqlite")
+        self.assertEqual(sqlite.resources("8nodes"), ["cluster4", "cluster5"])
+        self.assertEqual(
+            sqlite.labels("8nodes"), {"cluster4": {}, "cluster5": {"gpu": "true"}}
+        )
+        self.assertEqual(len(sqlite.available("8nodes")), 1)
+        self.assertNotIn(res, sqlite.available("8nodes"))
+        self.assertEqual(
+            [r["resource"] for r in sqlite.reasons("8nodes")], ["cluster6"]
+        )
+        self.assertEqual([j[0] for j in sqlite.executing("8nodes")], [2])
+        self.assertEqual([j[0] for j in sqlite.queued("8nodes")], [1])
+        self.assertEqual(sqlite.seq("8nodes")[1], 3)
+        # the resource of the running command is released as usual
+        sqlite.finish("8nodes", 2)
+        sqlite.free("8nodes", res)
+        self.assertEqual(len(sqlite.available("8nodes")), 2)
+
+        self.assertEqual(main.main(["dci-queue", "migrate", "--to", "dir"]), 0)
+        self.doesnt_exist(".", ".", backend.DB_NAME)
+        self.file_exists("queue", "8nodes", "1")
+        self.file_exists("reason", "8nodes", "cluster6")
+        self.link_exists("available", "8nodes", "cluster4")
+        self.link_exists("available", "8nodes", "cluster5")
+        self.assertEqual(store.seq("8nodes")[1], 3)
+
     def test_partial_resource_booking_bug(self):
         """Test that demonstrates the bug where jobs launch with partial resource booking.
 
@@ -18,7 +18,7 @@
 import logging
 import os
 
-from dciqueue import lib
+from dciqueue import backend
 
 log = logging.getLogger(__name__)
 
@@ -32,7 +32,8 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
     cmd = "env EDITOR='dci-queue remove-crontab %s' crontab -e" % args.pool
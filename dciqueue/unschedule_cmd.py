@@ -15,19 +15,10 @@
 
 """ """
 
-import json
 import logging
-import os
-import signal
 import sys
-import time
 
-from dciqueue import lib
-from dciqueue.run_cmd import EXT
-
-if sys.version_info[0] == 2:
-    FileNotFoundError = OSError
-    ProcessLookupError = OSError
+from dciqueue import api, backend
 
 log = logging.getLogger(__name__)
 
@@ -42,51 +33,15 @@ def register_command(subparsers):
 
 
 def execute_command(args):
-    if not lib.check_pool(args.top_dir, args.pool):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
         return 1
 
-    queuefile = os.path.join(args.top_dir, "queue", args.pool, str(args.id))
-    log.info("Un-queuing command %s from %s" % (args.id, args.pool))
-
     try:
-        os.unlink(queuefile)
-    except FileNotFoundError:
-        queuefile = os.path.join(args.top_dir, "queue", args.pool, str(args.id) + EXT)
-        if os.path.exists(queuefile):
-            with open(queuefile) as f:
-                data = json.load(f)
-                if "pid" in data:
-                    log.info(
-                        "Un-queuing command %s from %s by killing %d"
-                        % (args.id, args.pool, data["pid"])
-                    )
-                    os.kill(data["pid"], signal.SIGTERM)
-                    # wait for the process to exit
-                    sec = 300
-                    while sec > 0:
-                        try:
-                            log.info("Waiting for process %d to finish" % data["pid"])
-                            os.kill(data["pid"], 0)
-                            time.sleep(1)
-                            sec = sec - 1
-                        except ProcessLookupError:
-                            log.info(
-                                "Process %d is finished, removing %s"
-                                % (data["pid"], queuefile)
-                            )
-                            try:
-                                os.unlink(queuefile)
-                            except FileNotFoundError:
-                                pass
-                            break
-                    if sec <= 0:
-                        sys.stderr.write("Unable to finish command %d\n" % args.id)
-                        return 1
-                else:
-                    sys.stderr.write("Unable to stop command %d\n" % args.id)
-                    return 1
-        else:
-            log.info("File not found %s" % queuefile)
+        api.Queue(store).unschedule(args.pool, int(args.id))
+    except api.QueueError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
     return 0
 
 
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+
+""" """
+
+import logging
+import sys
+
+from dciqueue import api, backend
+
+log = logging.getLogger(__name__)
+
+COMMAND = "wait"
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        COMMAND,
+        help="Wait for a command to finish and exit with its return code",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        help="Maximum number of seconds to wait",
+        type=int,
+        default=None,
+    )
+    parser.add_argument("pool", help="Name of the pool")
+    parser.add_argument("id", help="Command id", type=int)
+    return COMMAND
+
+
+def execute_command(args):
+    store = backend.get(args)
+    if not store.check_pool(args.pool):
+        return 1
+
+    result = api.Queue(store).wait(args.pool, args.id, args.timeout)
+    if result is None:
+        sys.stderr.write("No result for command %s.%d\n" % (args.pool, args.id))
+        return 1
+    if result["rc"] is None:
+        sys.stderr.write(
+            "Command %s.%d did not complete: %s\n"
+            % (args.pool, args.id, result.get("error"))
+        )
+        return 1
+    return result["rc"]
+
+
+# wait_cmd.py ends here